@@ -0,0 +1,67 @@
+import hmac
+import os
+from typing import Optional
+
+from dotenv import load_dotenv
+from fastapi import APIRouter, Depends, HTTPException, Path, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from app.tokens import TOKEN_REVOCATION_BACKEND, token_verifier
+from app.tracing import TracedRoute
+
+load_dotenv()
+
+# Bearer token for the /admin routes. Left empty, they answer 404.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Bearer token for /metrics, which also accepts ADMIN_TOKEN. With neither set it answers 404.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+router = APIRouter(tags=["admin"], route_class=TracedRoute)
+
+admin_security = HTTPBearer(auto_error=False)
+
+
+def _require_bearer(credentials: Optional[HTTPAuthorizationCredentials], *tokens: str) -> None:
+    tokens = tuple(token for token in tokens if token)
+    if not tokens:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    presented = credentials.credentials.encode() if credentials is not None else b""
+    # Compare against every token, so timing does not tell which one matched.
+    matches = [hmac.compare_digest(presented, token.encode()) for token in tokens]
+    if credentials is None or not any(matches):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+async def require_admin(credentials: Optional[HTTPAuthorizationCredentials] = Depends(admin_security)) -> None:
+    """Let the request through only with the ADMIN_TOKEN bearer token."""
+    _require_bearer(credentials, ADMIN_TOKEN)
+
+
+async def require_metrics_scraper(credentials: Optional[HTTPAuthorizationCredentials] = Depends(admin_security)) -> None:
+    """Let the request through with the METRICS_TOKEN or ADMIN_TOKEN bearer token."""
+    _require_bearer(credentials, METRICS_TOKEN, ADMIN_TOKEN)
+
+
+def _revocation_reach() -> str:
+    # Memory revocations only exist in the process that served the request.
+    return "process" if TOKEN_REVOCATION_BACKEND == "memory" else "shared"
+
+
+@router.post("/revocations/users/{user_id}", dependencies=[Depends(require_admin)])
+async def revoke_user_tokens(user_id: str = Path(..., min_length=1)):
+    """Revoke every token issued to a user so far."""
+    await token_verifier.revoke_user(user_id)
+    return {"revoked": "user", "id": user_id, "reach": _revocation_reach()}
+
+
+@router.post("/revocations/kids/{kid}", dependencies=[Depends(require_admin)])
+async def revoke_signing_key(kid: str = Path(..., min_length=1)):
+    """Revoke every token signed with a key, e.g. one that leaked."""
+    if kid not in token_verifier.key_ring.keys:
+        raise HTTPException(status_code=404, detail="Unknown key id")
+    await token_verifier.revoke_kid(kid)
+    return {"revoked": "kid", "id": kid, "reach": _revocation_reach()}
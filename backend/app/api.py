@@ -1,48 +1,243 @@
-from fastapi import APIRouter, HTTPException, Path, Body, Depends
-from typing import List, Optional
-from sqlalchemy.orm import Session
-
-from app.models.diary import DiaryEntry as DiaryEntryModel, FavoriteExpression as FavoriteExpressionModel
-from app.schemas import DiaryEntry, DiaryEntryCreate, FavoriteExpression
-from app.db_config import get_db
-from app.db_service import DatabaseService
-from app.translation import translator
+import os
+
+from fastapi import APIRouter, HTTPException, Path, Body, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, List, Optional
+
+from app.schemas import DiaryEntry, DiaryEntryBatchCreate, DiaryEntryCreate, DiaryEntryImport, DiaryEntryListItem, FavoriteExpression
+from app.db_async import DbSession, get_db_session, get_read_db_session
+from app.db_service_async import service_for
+from app.models.diary import TRANSLATION_COMPLETED, TRANSLATION_FAILED, TRANSLATION_PENDING
+from app.diary_transfer import NDJSON_MEDIA_TYPE, export_stream, read_import_batches
+from app.translation import Segments, has_failed_segments, translator
+from app.translation_jobs import TRANSLATION_ASYNC, job_queue
 from app.auth import get_current_user, User
+from app.fast_json import FAST_JSON_RESPONSES, diary_entries_response
+from app.http_cache import etag_matches, make_etag, not_modified, set_cache_headers
+from app.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from app.tracing import TracedRoute
+
+DIARY_BATCH_MAX_ENTRIES = int(os.getenv("DIARY_BATCH_MAX_ENTRIES", "500"))
+DIARY_PAGE_SIZE = int(os.getenv("DIARY_PAGE_SIZE", "50"))
+DIARY_PAGE_MAX = int(os.getenv("DIARY_PAGE_MAX", "200"))
+SEARCH_PAGE_MAX = int(os.getenv("SEARCH_PAGE_MAX", "100"))
+FAVORITES_PAGE_SIZE = int(os.getenv("FAVORITES_PAGE_SIZE", "100"))
+FAVORITES_PAGE_MAX = int(os.getenv("FAVORITES_PAGE_MAX", "500"))
+DIARY_LIST_FIELDS = ("content", "translated_content", "translation_status", "updated_at", "favorite_expressions")
+
+router = APIRouter(route_class=TracedRoute)
 
-router = APIRouter()
+
+def _translation_status(segments: Segments) -> str:
+    """Status to store for segments translated during the request."""
+    return TRANSLATION_FAILED if has_failed_segments(segments) else TRANSLATION_COMPLETED
 
 
 @router.post("/diary", response_model=DiaryEntry)
 async def create_diary_entry(
     entry: DiaryEntryCreate = Body(...),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: DbSession = Depends(get_db_session)
 ):
     """Create a new diary entry with automatic translation."""
-    db_service = DatabaseService(db)
-    translated_content = translator.translate_japanese_to_english(entry.content)
-    return db_service.create_diary_entry(current_user.id, entry.content, translated_content)
+    db_service = service_for(db)
+
+    if TRANSLATION_ASYNC:
+        db_entry = await db_service.create_diary_entry(
+            current_user.id, entry.content, "", translation_status=TRANSLATION_PENDING
+        )
+        await job_queue.enqueue(db_entry.id)
+        return db_entry
+
+    translated_content, segments = await translator.translate_incremental_async(entry.content)
+    return await db_service.create_diary_entry(
+        current_user.id, entry.content, translated_content, segments, _translation_status(segments)
+    )
+
+
+@router.post("/diary/batch", response_model=List[DiaryEntry])
+async def create_diary_entries_batch(
+    batch: DiaryEntryBatchCreate = Body(...),
+    current_user: User = Depends(get_current_user),
+    db: DbSession = Depends(get_db_session)
+):
+    """Create many diary entries at once, translating them in packed batches."""
+    if len(batch.entries) > DIARY_BATCH_MAX_ENTRIES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"A batch may contain at most {DIARY_BATCH_MAX_ENTRIES} entries"
+        )
+    
+    db_service = service_for(db)
+    contents = [entry.content for entry in batch.entries]
+    
+    if TRANSLATION_ASYNC:
+        db_entries = await db_service.create_diary_entries(
+            current_user.id, [(content, "", None, TRANSLATION_PENDING) for content in contents]
+        )
+        for db_entry in db_entries:
+            await job_queue.enqueue(db_entry.id)
+        return db_entries
+    
+    translations = await translator.translate_many_async(contents)
+    return await db_service.create_diary_entries(
+        current_user.id,
+        [
+            (content, translated_content, segments, _translation_status(segments))
+            for content, (translated_content, segments) in zip(contents, translations)
+        ]
+    )
 
 
-@router.get("/diary", response_model=List[DiaryEntry])
+@router.get("/diary", response_model=List[DiaryEntryListItem], response_model_exclude_unset=True)
 async def get_all_diary_entries(
+    request: Request,
+    response: Response,
+    limit: int = Query(DIARY_PAGE_SIZE, ge=1, le=DIARY_PAGE_MAX),
+    cursor: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to include; id and created_at are always returned"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    current_user: User = Depends(get_current_user),
+    db: DbSession = Depends(get_read_db_session)
+):
+    """Get a page of diary entries for the current user; the next page's cursor is in X-Next-Cursor."""
+    field_list = None
+    if fields is not None:
+        field_list = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in field_list if field not in DIARY_LIST_FIELDS and field not in ("id", "created_at")]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        field_list = [field for field in field_list if field in DIARY_LIST_FIELDS]
+    
+    db_service = service_for(db)
+    
+    # Read the version before the rows, so the ETag is never newer than the data.
+    etag = make_etag(current_user.id, await db_service.get_user_data_version(current_user.id), request)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_cache_headers(response, etag)
+    
+    entries = await db_service.get_user_diary_entries(
+        current_user.id,
+        limit=limit + 1,
+        after=decode_cursor(cursor),
+        fields=field_list,
+        descending=order == "desc"
+    )
+    
+    if len(entries) > limit:
+        entries = entries[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(entries[-1].created_at, entries[-1].id)
+    
+    if FAST_JSON_RESPONSES:
+        return diary_entries_response(entries, response, field_list)
+    
+    if field_list is None:
+        return entries
+    
+    # Build the projection by hand so unloaded columns are never lazy-loaded.
+    return [
+        {field: getattr(entry, field) for field in ("id", "created_at", *field_list)}
+        for entry in entries
+    ]
+
+
+@router.get("/diary/search", response_model=List[DiaryEntry])
+async def search_diary_entries(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=SEARCH_PAGE_MAX),
+    offset: int = Query(0, ge=0),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: DbSession = Depends(get_read_db_session)
 ):
-    """Get all diary entries for the current user."""
-    db_service = DatabaseService(db)
-    return db_service.get_user_diary_entries(current_user.id)
+    """Search the current user's entries in Japanese or English, best matches first."""
+    db_service = service_for(db)
+    entries = await db_service.search_diary_entries(current_user.id, q, limit, offset)
+    
+    if FAST_JSON_RESPONSES:
+        return diary_entries_response(entries, response)
+    return entries
+
+
+@router.get("/diary/export")
+async def export_diary_entries(current_user: User = Depends(get_current_user)):
+    """Stream all of the current user's entries and favorites as NDJSON, oldest first."""
+    return StreamingResponse(
+        export_stream(current_user.id),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"Content-Disposition": 'attachment; filename="diary-export.ndjson"'}
+    )
+
+
+async def _import_values(entries: List[DiaryEntryImport]) -> List[Dict[str, Any]]:
+    """Column values for imported entries, translating those that arrive untranslated."""
+    values = [entry.model_dump() for entry in entries]
+    untranslated = []
+    for value in values:
+        if value["translated_content"] is None or value["translation_status"] == TRANSLATION_PENDING:
+            untranslated.append(value)
+        elif value["translation_status"] is None:
+            value["translation_status"] = TRANSLATION_COMPLETED
+    
+    if TRANSLATION_ASYNC:
+        for value in untranslated:
+            value.update(translated_content=value["translated_content"] or "", translation_status=TRANSLATION_PENDING)
+    elif untranslated:
+        translations = await translator.translate_many_async([value["content"] for value in untranslated])
+        for value, (translated_content, segments) in zip(untranslated, translations):
+            value.update(
+                translated_content=translated_content, translated_segments=segments, translation_status=_translation_status(segments)
+            )
+    
+    return values
+
+
+@router.post("/diary/import")
+async def import_diary_entries(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: DbSession = Depends(get_db_session)
+):
+    """Import NDJSON diary entries, e.g. the output of GET /diary/export, in one transaction."""
+    db_service = service_for(db)
+    pending_ids: List[str] = []
+    imported = 0
+    
+    try:
+        async for batch in read_import_batches(request):
+            values = await _import_values(batch)
+            entry_ids = await db_service.add_imported_entries(current_user.id, values)
+            pending_ids.extend(
+                entry_id for entry_id, value in zip(entry_ids, values)
+                if value["translation_status"] == TRANSLATION_PENDING
+            )
+            imported += len(entry_ids)
+        await db_service.finish_import(current_user.id)
+    except BaseException:
+        await db_service.rollback()
+        raise
+    
+    for entry_id in pending_ids:
+        await job_queue.enqueue(entry_id)
+    
+    return {"imported": imported}
 
 
 @router.get("/diary/{entry_id}", response_model=DiaryEntry)
 async def get_diary_entry(
+    request: Request,
+    response: Response,
     entry_id: str = Path(...),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: DbSession = Depends(get_db_session)
 ):
-    """Get a specific diary entry by ID."""
-    db_service = DatabaseService(db)
-    entry = db_service.get_diary_entry(entry_id)
+    """Get a specific diary entry by ID, honouring If-None-Match."""
+    db_service = service_for(db)
+    
+    # The version is read before the entry, so the ETag is never newer than what is sent.
+    etag = make_etag(current_user.id, await db_service.get_user_data_version(current_user.id), request)
+    entry = await db_service.get_diary_entry(entry_id)
     
     if not entry:
         raise HTTPException(status_code=404, detail="Diary entry not found")
@@ -50,6 +245,34 @@ async def get_diary_entry(
     if entry.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to access this diary entry")
     
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
+    set_cache_headers(response, etag)
+    return entry
+
+
+@router.get("/diary/{entry_id}/translation", response_model=DiaryEntry)
+async def wait_for_translation(
+    entry_id: str = Path(...),
+    wait: float = Query(30.0, ge=0, le=60),
+    current_user: User = Depends(get_current_user),
+    db: DbSession = Depends(get_db_session)
+):
+    """Wait up to `wait` seconds for a pending translation, then return the entry."""
+    db_service = service_for(db)
+    entry = await db_service.get_diary_entry(entry_id)
+    
+    if not entry:
+        raise HTTPException(status_code=404, detail="Diary entry not found")
+    
+    if entry.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to access this diary entry")
+    
+    if entry.translation_status == TRANSLATION_PENDING:
+        await job_queue.wait_for(entry_id, wait)
+        entry = await db_service.refresh_diary_entry(entry)
+    
     return entry
 
 
@@ -58,20 +281,37 @@ async def update_diary_entry(
     entry_id: str = Path(...),
     entry: DiaryEntryCreate = Body(...),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: DbSession = Depends(get_db_session)
 ):
     """Update a diary entry with automatic translation."""
-    db_service = DatabaseService(db)
+    db_service = service_for(db)
     
-    existing_entry = db_service.get_diary_entry(entry_id)
+    existing_entry = await db_service.get_diary_entry(entry_id)
     if not existing_entry:
         raise HTTPException(status_code=404, detail="Diary entry not found")
     
     if existing_entry.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to update this diary entry")
     
-    translated_content = translator.translate_japanese_to_english(entry.content)
-    updated_entry = db_service.update_diary_entry(entry_id, entry.content, translated_content)
+    if TRANSLATION_ASYNC:
+        # Keep the old segments so the worker only re-translates changed sentences.
+        updated_entry = await db_service.update_diary_entry(
+            existing_entry, entry.content, existing_entry.translated_content,
+            existing_entry.translated_segments, TRANSLATION_PENDING
+        )
+        if not updated_entry:
+            raise HTTPException(status_code=404, detail="Diary entry not found")
+        await job_queue.enqueue(entry_id)
+        return updated_entry
+    
+    translated_content, segments = await translator.translate_incremental_async(
+        entry.content, existing_entry.translated_segments
+    )
+    updated_entry = await db_service.update_diary_entry(
+        existing_entry, entry.content, translated_content, segments, _translation_status(segments)
+    )
+    if not updated_entry:
+        raise HTTPException(status_code=404, detail="Diary entry not found")
     
     return updated_entry
 
@@ -80,19 +320,20 @@ async def update_diary_entry(
 async def delete_diary_entry(
     entry_id: str = Path(...),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: DbSession = Depends(get_db_session)
 ):
     """Delete a diary entry."""
-    db_service = DatabaseService(db)
+    db_service = service_for(db)
     
-    existing_entry = db_service.get_diary_entry(entry_id)
+    existing_entry = await db_service.get_diary_entry(entry_id)
     if not existing_entry:
         raise HTTPException(status_code=404, detail="Diary entry not found")
     
     if existing_entry.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to delete this diary entry")
     
-    success = db_service.delete_diary_entry(entry_id)
+    if not await db_service.delete_diary_entry(existing_entry):
+        raise HTTPException(status_code=404, detail="Diary entry not found")
     
     return {"message": "Diary entry deleted successfully"}
 
@@ -104,28 +345,56 @@ async def add_favorite_expression(
     english_text: str = Body(...),
     note: Optional[str] = Body(None),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: DbSession = Depends(get_db_session)
 ):
     """Add a favorite expression from a diary entry."""
-    db_service = DatabaseService(db)
+    db_service = service_for(db)
     
-    existing_entry = db_service.get_diary_entry(entry_id)
+    existing_entry = await db_service.get_diary_entry(entry_id)
     if not existing_entry:
         raise HTTPException(status_code=404, detail="Diary entry not found")
     
     if existing_entry.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to add favorite expressions to this diary entry")
     
-    expression = db_service.add_favorite_expression(entry_id, japanese_text, english_text, note)
+    try:
+        expression = await db_service.add_favorite_expression(existing_entry, japanese_text, english_text, note)
+    except KeyError:
+        # The in-memory store's entry was deleted since it was loaded.
+        raise HTTPException(status_code=404, detail="Diary entry not found")
     
     return expression
 
 
 @router.get("/favorites", response_model=List[FavoriteExpression])
 async def get_all_favorite_expressions(
+    request: Request,
+    response: Response,
+    limit: int = Query(FAVORITES_PAGE_SIZE, ge=1, le=FAVORITES_PAGE_MAX),
+    cursor: Optional[str] = Query(None),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    prefix: Optional[str] = Query(None, min_length=1, max_length=100, description="Only favorites whose Japanese or English text starts with this"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: DbSession = Depends(get_read_db_session)
 ):
-    """Get all favorite expressions for the current user."""
-    db_service = DatabaseService(db)
-    return db_service.get_user_favorite_expressions(current_user.id)
+    """Get a page of the current user's favorite expressions, paginated like GET /diary."""
+    db_service = service_for(db)
+    
+    etag = make_etag(current_user.id, await db_service.get_user_data_version(current_user.id), request)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_cache_headers(response, etag)
+    
+    expressions = await db_service.get_user_favorite_expressions(
+        current_user.id,
+        limit=limit + 1,
+        after=decode_cursor(cursor),
+        descending=order == "desc",
+        prefix=prefix
+    )
+    
+    if len(expressions) > limit:
+        expressions = expressions[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(expressions[-1].created_at, expressions[-1].id)
+    
+    return expressions
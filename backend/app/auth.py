@@ -1,19 +1,27 @@
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer
-from jose import JWTError, jwt
+from jose import JWTError
 from pydantic import BaseModel
+from sqlalchemy import event
 
 import os
 from dotenv import load_dotenv
 
+from app.db_async import DbSession, get_db_session
+from app.models.user import User as UserModel
+from app.tokens import ACCESS_TOKEN_EXPIRE_MINUTES, token_verifier
+from app.tracing import span
+
 load_dotenv()
 
-SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secure-jwt-secret-key")  # Default value for development
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 1 week
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
 
 security = HTTPBearer()
 
@@ -41,19 +49,18 @@ class User(UserBase):
         from_attributes = True
 
 
-from passlib.context import CryptContext
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.passwords import get_pwd_context
 
 def verify_password(plain_password, hashed_password):
     """Verify a password against a hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
     """Generate a password hash."""
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
-    """Create a JWT access token."""
+    """Create a JWT access token, signed with the active key."""
     to_encode = data.copy()
     
     if expires_delta:
@@ -61,11 +68,52 @@ def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta]
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
-
-async def get_current_user(credentials = Depends(security)) -> User:
+    # Sub-second iat, so a "revoke all" cutoff never catches a token issued just after it.
+    to_encode.update({"exp": expire, "iat": time.time()})
+    return token_verifier.encode(to_encode)
+
+class UserCache:
+    """Short-lived cache of authenticated users keyed by the token's `sub`."""
+
+    def __init__(self, ttl_seconds: float = USER_CACHE_TTL_SECONDS, max_entries: int = USER_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, User]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> Optional[User]:
+        with self._lock:
+            cached = self._entries.get(user_id)
+            if cached is None:
+                return None
+            expires_at, user = cached
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            return user
+
+    def set(self, user: User) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries.pop(user.id, None)
+            self._entries[user.id] = (time.monotonic() + self.ttl_seconds, user)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+async def get_current_user(credentials = Depends(security), db: DbSession = Depends(get_db_session)) -> User:
     """Validate the token and return the current user."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -75,7 +123,8 @@ async def get_current_user(credentials = Depends(security)) -> User:
     
     try:
         token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        with span("auth.jwt_decode"):
+            payload = await token_verifier.verify(token)
         email = payload.get("email")
         sub = payload.get("sub")
         
@@ -86,16 +135,26 @@ async def get_current_user(credentials = Depends(security)) -> User:
     except JWTError:
         raise credentials_exception
     
-    from app.db_service import DatabaseService
-    from app.db_config import get_db
-    from fastapi import Depends
+    user = user_cache.get(sub)
+    if user is not None:
+        return user
     
-    db = next(get_db())
-    db_service = DatabaseService(db)
+    from app.db_service_async import service_for
     
-    user = db_service.get_user_by_email(email)
+    with span("auth.user_lookup"):
+        db_user = await service_for(db).get_user_by_id(sub)
     
-    if user is None:
+    if db_user is None or db_user.email != email:
         raise credentials_exception
     
+    user = User.model_validate(db_user)
+    user_cache.set(user)
+    
     return user
+
+
+@event.listens_for(UserModel, "after_update")
+@event.listens_for(UserModel, "after_delete")
+def invalidate_cached_user(mapper, connection, target):
+    """Drop a user from the cache whenever their row changes."""
+    user_cache.invalidate(target.id)
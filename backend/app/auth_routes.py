@@ -1,19 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status, Request
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import Optional
 
-from app.auth import User, UserCreate, create_access_token, Token, get_current_user
-from app.db_service import DatabaseService
-from app.db_config import get_db
+from app.auth import User, UserCreate, create_access_token, Token, get_current_user, security
+from app.db_async import get_db_session
+from app.db_service_async import service_for
+from app.passwords import password_hasher
+from app.tokens import token_verifier
+from app.tracing import TracedRoute, span
 
-router = APIRouter(tags=["authentication"])
+router = APIRouter(tags=["authentication"], route_class=TracedRoute)
 
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+EMAIL_TAKEN = "このメールアドレスは既に登録されています。"
+
 class UserRegisterRequest(BaseModel):
     email: str
     password: str
@@ -24,22 +29,25 @@ class UserLoginRequest(BaseModel):
     password: str
 
 @router.post("/register", response_model=Token)
-async def register(user_data: UserRegisterRequest, db = Depends(get_db)):
+async def register(user_data: UserRegisterRequest, db = Depends(get_db_session)):
     """新規ユーザー登録エンドポイント"""
-    db_service = DatabaseService(db)
+    db_service = service_for(db)
     
-    existing_user = db_service.get_user_by_email(user_data.email)
+    existing_user = await db_service.get_user_by_email(user_data.email)
     if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="このメールアドレスは既に登録されています。"
-        )
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=EMAIL_TAKEN)
     
-    user = db_service.create_user(UserCreate(
-        email=user_data.email,
-        password=user_data.password,
-        name=user_data.name
-    ))
+    with span("auth.password_hash"):
+        hashed_password = await password_hasher.hash(user_data.password)
+    try:
+        user = await db_service.create_user(UserCreate(
+            email=user_data.email,
+            password=user_data.password,
+            name=user_data.name
+        ), hashed_password=hashed_password)
+    except ValueError:
+        # Registered by a concurrent request since the check above.
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=EMAIL_TAKEN)
     
     access_token = create_access_token(
         data={"sub": user.id, "email": user.email, "name": user.name}
@@ -48,24 +56,46 @@ async def register(user_data: UserRegisterRequest, db = Depends(get_db)):
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/login", response_model=Token)
-async def login(user_data: UserLoginRequest, db = Depends(get_db)):
+async def login(user_data: UserLoginRequest, db = Depends(get_db_session)):
     """ユーザーログインエンドポイント"""
-    db_service = DatabaseService(db)
+    db_service = service_for(db)
     
-    user = db_service.verify_user_password(user_data.email, user_data.password)
-    if not user:
+    # Verify in the bounded hashing pool, so a login storm gets 503s.
+    user = await db_service.get_user_by_email(user_data.email)
+    valid, new_hash = False, None
+    if user:
+        with span("auth.password_verify"):
+            valid, new_hash = await password_hasher.verify_and_update(user_data.password, user.hashed_password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="メールアドレスまたはパスワードが正しくありません。",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    if new_hash:
+        # The hashing settings changed since this password was stored.
+        await db_service.update_user_password_hash(user, new_hash)
+    
     access_token = create_access_token(
         data={"sub": user.id, "email": user.email, "name": user.name}
     )
     
     return {"access_token": access_token, "token_type": "bearer"}
 
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    all_sessions: bool = Query(False, alias="all"),
+    credentials = Depends(security),
+    current_user: User = Depends(get_current_user)
+):
+    """Revoke the bearer token, or with all=true every token issued to the user so far."""
+    if all_sessions:
+        await token_verifier.revoke_user(current_user.id)
+    else:
+        await token_verifier.revoke_token(credentials.credentials)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
 @router.get("/me", response_model=User)
 async def get_current_user(current_user: User = Depends(get_current_user)):
     """Get the current authenticated user."""
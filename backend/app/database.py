@@ -1,132 +1,464 @@
-import uuid
-from datetime import datetime
-from typing import Dict, List, Optional
+import threading
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 
-from app.models import DiaryEntry, FavoriteExpression
-from app.auth import User, UserCreate
+from app.models.base import generate_uuid
+from app.models.diary import TRANSLATION_COMPLETED, TRANSLATION_PENDING
+from app.passwords import verify_and_update
+from app.search import InMemorySearchIndex
+
+EntryKey = Tuple[datetime, str]
+
+
+def _as_utc(value: datetime) -> datetime:
+    """Naive timestamps are taken as UTC, so they order against aware ones."""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _page(
+    keys: List[EntryKey],
+    records: Dict[str, Any],
+    limit: Optional[int],
+    after: Optional[EntryKey],
+    descending: bool,
+    matches: Optional[Callable[[Any], bool]] = None
+) -> List[Any]:
+    """Walk sorted (created_at, id) keys from a keyset position and collect up to limit records."""
+    if after is not None:
+        created_at, row_id = after
+        record = records.get(row_id)
+        after = (record.created_at if record is not None else _as_utc(created_at), row_id)
+
+    if descending:
+        end = len(keys) if after is None else bisect_left(keys, after)
+        positions = range(end - 1, -1, -1)
+    else:
+        start = 0 if after is None else bisect_right(keys, after)
+        positions = range(start, len(keys))
+
+    page = []
+    for position in positions:
+        record = records[keys[position][1]]
+        if matches is None or matches(record):
+            page.append(record)
+            if limit is not None and len(page) >= limit:
+                break
+    return page
+
+
+class Record:
+    """Attribute bag standing in for an ORM row. Writes store a modified copy instead of mutating it."""
+
+    __slots__ = ()
+
+    def __init__(self, **values: Any):
+        for name in self.__slots__:
+            setattr(self, name, values.get(name))
+
+    def replace(self, **changes: Any) -> "Record":
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return type(self)(**values)
+
+
+class UserRecord(Record):
+    __slots__ = ("id", "email", "hashed_password", "name", "picture", "created_at", "is_active")
+
+
+class DiaryEntryRecord(Record):
+    __slots__ = (
+        "id", "user_id", "content", "translated_content", "translated_segments",
+        "translation_status", "created_at", "updated_at", "favorite_expressions",
+    )
+
+
+class FavoriteExpressionRecord(Record):
+    __slots__ = ("id", "diary_entry_id", "user_id", "japanese_text", "english_text", "note", "created_at")
 
 
 class InMemoryDatabase:
-    """In-memory database for diary entries and users."""
-    
+    """Process-local storage for users, diary entries and favorites, guarded by one lock."""
+
     def __init__(self):
-        self.diary_entries: Dict[str, DiaryEntry] = {}
-        self.favorite_expressions: List[FavoriteExpression] = []
-        self.users: Dict[str, User] = {}
-        self.user_entries: Dict[str, List[str]] = {}  # Maps user_id to list of entry_ids
-        self.user_passwords: Dict[str, str] = {}  # Maps user_id to hashed password
-    
-    def create_diary_entry(self, content: str, translated_content: str) -> DiaryEntry:
-        """Create a new diary entry."""
-        entry_id = str(uuid.uuid4())
-        now = datetime.now()
-        
-        entry = DiaryEntry(
+        self._lock = threading.RLock()
+        self.users: Dict[str, UserRecord] = {}
+        self.user_ids_by_email: Dict[str, str] = {}
+        self.diary_entries: Dict[str, DiaryEntryRecord] = {}
+        self.user_entries: Dict[str, List[EntryKey]] = {}  # Sorted (created_at, id) keys per user
+        self.favorite_expressions: Dict[str, FavoriteExpressionRecord] = {}
+        self.user_favorites: Dict[str, List[EntryKey]] = {}  # Sorted (created_at, id) keys per user
+        self.data_versions: Dict[str, int] = {}
+        self.search_index = InMemorySearchIndex()
+
+    def add_user(self, email: str, hashed_password: str, name: Optional[str] = None, picture: Optional[str] = None) -> UserRecord:
+        """Store a new user. Raises ValueError if the email is taken."""
+        with self._lock:
+            if email in self.user_ids_by_email:
+                raise ValueError(f"Email already registered: {email}")
+
+            user = UserRecord(
+                id=generate_uuid(),
+                email=email,
+                hashed_password=hashed_password,
+                name=name,
+                picture=picture,
+                created_at=datetime.now(timezone.utc),
+                is_active=True,
+            )
+            self.users[user.id] = user
+            self.user_ids_by_email[email] = user.id
+            self.user_entries[user.id] = []
+            self.user_favorites[user.id] = []
+            self.data_versions[user.id] = 0
+            self.search_index.load_user(user.id, ())
+            return user
+
+    def get_user(self, user_id: str) -> Optional[UserRecord]:
+        with self._lock:
+            return self.users.get(user_id)
+
+    def get_user_by_email(self, email: str) -> Optional[UserRecord]:
+        with self._lock:
+            user_id = self.user_ids_by_email.get(email)
+            return self.users.get(user_id) if user_id is not None else None
+
+    def update_user(self, user_id: str, **values: Any) -> Optional[UserRecord]:
+        with self._lock:
+            user = self.users.get(user_id)
+            if user is None:
+                return None
+            user = self.users[user_id] = user.replace(**values)
+            return user
+
+    def _bump(self, user_id: str) -> None:
+        if user_id in self.data_versions:
+            self.data_versions[user_id] += 1
+
+    def data_version(self, user_id: str) -> int:
+        with self._lock:
+            return self.data_versions.get(user_id, 0)
+
+    def _insert_entry(self, user_id: str, values: Dict[str, Any], favorites: Sequence[Dict[str, Any]] = ()) -> DiaryEntryRecord:
+        now = datetime.now(timezone.utc)
+        entry_id = values.get("id") or generate_uuid()
+        created_at = _as_utc(values["created_at"]) if values.get("created_at") is not None else now
+        expressions = [
+            FavoriteExpressionRecord(
+                id=favorite.get("id") or generate_uuid(),
+                diary_entry_id=entry_id,
+                user_id=user_id,
+                japanese_text=favorite["japanese_text"],
+                english_text=favorite["english_text"],
+                note=favorite.get("note"),
+                created_at=now,
+            )
+            for favorite in favorites
+        ]
+        entry = DiaryEntryRecord(
             id=entry_id,
-            content=content,
-            translated_content=translated_content,
-            created_at=now,
-            updated_at=None,
-            favorite_expressions=[]
+            user_id=user_id,
+            content=values["content"],
+            translated_content=values["translated_content"],
+            translated_segments=values.get("translated_segments"),
+            translation_status=values.get("translation_status") or TRANSLATION_COMPLETED,
+            created_at=created_at,
+            updated_at=values.get("updated_at"),
+            favorite_expressions=expressions,
         )
-        
+
         self.diary_entries[entry_id] = entry
+        insort(self.user_entries[user_id], (created_at, entry_id))
+        for expression in expressions:
+            self._insert_favorite(expression)
+        self.search_index.index_entry(entry_id, user_id, entry.content, entry.translated_content)
         return entry
-    
-    def get_diary_entry(self, entry_id: str) -> Optional[DiaryEntry]:
-        """Get a diary entry by ID."""
-        return self.diary_entries.get(entry_id)
-    
-    def get_all_diary_entries(self) -> List[DiaryEntry]:
-        """Get all diary entries."""
-        return list(self.diary_entries.values())
-    
-    def update_diary_entry(self, entry_id: str, content: str, translated_content: str) -> Optional[DiaryEntry]:
-        """Update a diary entry."""
-        if entry_id not in self.diary_entries:
-            return None
-        
-        entry = self.diary_entries[entry_id]
-        entry.content = content
-        entry.translated_content = translated_content
-        entry.updated_at = datetime.now()
-        
-        return entry
-    
-    def delete_diary_entry(self, entry_id: str) -> bool:
-        """Delete a diary entry."""
-        if entry_id not in self.diary_entries:
-            return False
-        
-        del self.diary_entries[entry_id]
-        return True
-    
-    def add_favorite_expression(self, entry_id: str, japanese_text: str, english_text: str, note: Optional[str] = None) -> Optional[FavoriteExpression]:
-        """Add a favorite expression to a diary entry."""
-        if entry_id not in self.diary_entries:
-            return None
-        
-        expression = FavoriteExpression(
-            japanese_text=japanese_text,
-            english_text=english_text,
-            note=note
-        )
-        
-        entry = self.diary_entries[entry_id]
-        entry.favorite_expressions.append(expression)
-        self.favorite_expressions.append(expression)
-        
-        return expression
-    
-    def get_all_favorite_expressions(self) -> List[FavoriteExpression]:
-        """Get all favorite expressions."""
-        return self.favorite_expressions
-    
-    def create_user(self, user_data: UserCreate) -> User:
-        """Create a new user."""
-        user_id = str(uuid.uuid4())
-        now = datetime.now()
-        
-        user = User(
-            id=user_id,
-            email=user_data.email,
-            name=user_data.name,
-            picture=user_data.picture,
-            created_at=now
-        )
-        
-        self.users[user_id] = user
-        self.user_entries[user_id] = []
-        
-        # Store hashed password
-        from app.auth import get_password_hash
-        self.user_passwords[user_id] = get_password_hash(user_data.password)
-        
-        return user
-    
-    def get_user_by_id(self, user_id: str) -> Optional[User]:
+
+    def insert_entries(self, user_id: str, rows: Sequence[Dict[str, Any]], favorites: Optional[Sequence[Sequence[Dict[str, Any]]]] = None) -> List[DiaryEntryRecord]:
+        """Store entries given as column dicts, with each entry's favorites as a parallel list."""
+        with self._lock:
+            if user_id not in self.users:
+                raise KeyError(user_id)
+            entries = [
+                self._insert_entry(user_id, row, favorites[i] if favorites is not None else ())
+                for i, row in enumerate(rows)
+            ]
+            self._bump(user_id)
+            return entries
+
+    def get_entry(self, entry_id: str) -> Optional[DiaryEntryRecord]:
+        with self._lock:
+            return self.diary_entries.get(entry_id)
+
+    def get_entries(self, entry_ids: Sequence[str]) -> List[DiaryEntryRecord]:
+        """Entries in the order of entry_ids, skipping IDs that were not found."""
+        with self._lock:
+            return [self.diary_entries[entry_id] for entry_id in entry_ids if entry_id in self.diary_entries]
+
+    def list_entries(
+        self,
+        user_id: str,
+        limit: Optional[int] = None,
+        after: Optional[EntryKey] = None,
+        descending: bool = True
+    ) -> List[DiaryEntryRecord]:
+        """A user's entries ordered by (created_at, id), continuing after a keyset position."""
+        with self._lock:
+            return _page(self.user_entries.get(user_id, []), self.diary_entries, limit, after, descending)
+
+    def update_entry(self, entry_id: str, user_id: str, **values: Any) -> Optional[DiaryEntryRecord]:
+        """Replace columns of the owner's entry. Returns None if it is gone or owned by someone else."""
+        with self._lock:
+            entry = self.diary_entries.get(entry_id)
+            if entry is None or entry.user_id != user_id:
+                return None
+
+            self._bump(user_id)
+            entry = self.diary_entries[entry_id] = entry.replace(updated_at=datetime.now(timezone.utc), **values)
+            self.search_index.index_entry(entry_id, user_id, entry.content, entry.translated_content)
+            return entry
+
+    def delete_entry(self, entry_id: str, user_id: str) -> bool:
+        """Delete the owner's entry and its favorites. Returns False if it was already gone."""
+        with self._lock:
+            entry = self.diary_entries.get(entry_id)
+            if entry is None or entry.user_id != user_id:
+                return False
+
+            self._bump(user_id)
+            del self.diary_entries[entry_id]
+            keys = self.user_entries[user_id]
+            del keys[bisect_left(keys, (entry.created_at, entry_id))]
+            for expression in entry.favorite_expressions:
+                del self.favorite_expressions[expression.id]
+                keys = self.user_favorites[user_id]
+                del keys[bisect_left(keys, (expression.created_at, expression.id))]
+            self.search_index.remove_entry(entry_id, user_id)
+            return True
+
+    def add_favorite(self, entry_id: str, japanese_text: str, english_text: str, note: Optional[str] = None) -> FavoriteExpressionRecord:
+        """Add a favorite to an entry. Raises KeyError if the entry is gone."""
+        with self._lock:
+            entry = self.diary_entries[entry_id]
+            expression = FavoriteExpressionRecord(
+                id=generate_uuid(),
+                diary_entry_id=entry_id,
+                user_id=entry.user_id,
+                japanese_text=japanese_text,
+                english_text=english_text,
+                note=note,
+                created_at=datetime.now(timezone.utc),
+            )
+            self.diary_entries[entry_id] = entry.replace(favorite_expressions=entry.favorite_expressions + [expression])
+            self._insert_favorite(expression)
+            self._bump(entry.user_id)
+            return expression
+
+    def _insert_favorite(self, expression: FavoriteExpressionRecord) -> None:
+        self.favorite_expressions[expression.id] = expression
+        insort(self.user_favorites[expression.user_id], (expression.created_at, expression.id))
+
+    def list_favorites(
+        self,
+        user_id: str,
+        limit: Optional[int] = None,
+        after: Optional[EntryKey] = None,
+        descending: bool = True,
+        prefix: Optional[str] = None
+    ) -> List[FavoriteExpressionRecord]:
+        """A user's favorites ordered by (created_at, id), optionally only those starting with prefix."""
+        matches = None
+        if prefix:
+            prefix = prefix.lower()
+
+            def matches(expression: FavoriteExpressionRecord) -> bool:
+                return expression.japanese_text.lower().startswith(prefix) or expression.english_text.lower().startswith(prefix)
+
+        with self._lock:
+            return _page(self.user_favorites.get(user_id, []), self.favorite_expressions, limit, after, descending, matches)
+
+    def pending_entry_ids(self) -> List[str]:
+        with self._lock:
+            return [entry.id for entry in self.diary_entries.values() if entry.translation_status == TRANSLATION_PENDING]
+
+    def search(self, user_id: str, query: str, limit: int, offset: int) -> List[Tuple[str, float]]:
+        return self.search_index.search(user_id, query, limit, offset)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "users": len(self.users),
+                "diary_entries": len(self.diary_entries),
+                "favorite_expressions": len(self.favorite_expressions),
+            }
+
+
+class InMemoryDatabaseService:
+    """DatabaseService over an InMemoryDatabase, method for method."""
+
+    def __init__(self, store: InMemoryDatabase):
+        self.store = store
+        self._pending_import: List[Tuple[str, Dict[str, Any], List[Dict[str, Any]]]] = []
+
+    def create_user(self, user_data, hashed_password: Optional[str] = None) -> UserRecord:
+        """Create a new user. Pass hashed_password if the password was already hashed. Raises ValueError if the email is taken."""
+        if hashed_password is None:
+            from app.auth import get_password_hash
+            hashed_password = get_password_hash(user_data.password)
+        return self.store.add_user(user_data.email, hashed_password, user_data.name, user_data.picture)
+
+    def get_user_by_id(self, user_id: str) -> Optional[UserRecord]:
         """Get a user by ID."""
-        return self.users.get(user_id)
-    
-    def get_user_by_email(self, email: str) -> Optional[User]:
+        return self.store.get_user(user_id)
+
+    def get_user_by_email(self, email: str) -> Optional[UserRecord]:
         """Get a user by email."""
-        for user in self.users.values():
-            if user.email == email:
-                return user
-        return None
-        
-    def verify_user_password(self, email: str, password: str) -> Optional[User]:
+        return self.store.get_user_by_email(email)
+
+    def verify_user_password(self, email: str, password: str) -> Optional[UserRecord]:
         """Verify user credentials and return user if valid."""
         user = self.get_user_by_email(email)
-        if user and user.id in self.user_passwords:
-            from app.auth import verify_password
-            if verify_password(password, self.user_passwords[user.id]):
-                return user
-        return None
-        
-def get_user_by_email(email: str) -> Optional[User]:
-    """Get a user by email."""
-    return db.get_user_by_email(email)
-
-
-db = InMemoryDatabase()
+        if not user:
+            return None
+
+        valid, new_hash = verify_and_update(password, user.hashed_password)
+        if not valid:
+            return None
+        if new_hash:
+            user = self.update_user_password_hash(user, new_hash)
+        return user
+
+    def update_user_password_hash(self, user: UserRecord, hashed_password: str) -> UserRecord:
+        """Replace a user's password hash, e.g. after rehashing with new settings."""
+        return self.store.update_user(user.id, hashed_password=hashed_password) or user
+
+    def create_diary_entry(self, user_id: str, content: str, translated_content: str, translated_segments: Optional[List[Any]] = None, translation_status: str = TRANSLATION_COMPLETED) -> DiaryEntryRecord:
+        """Create a new diary entry."""
+        return self.create_diary_entries(user_id, [(content, translated_content, translated_segments, translation_status)])[0]
+
+    def create_diary_entries(self, user_id: str, entries: Sequence[Tuple[str, str, Optional[List[Any]], str]]) -> List[DiaryEntryRecord]:
+        """Create several diary entries at once."""
+        return self.store.insert_entries(user_id, [
+            {
+                "content": content,
+                "translated_content": translated_content,
+                "translated_segments": translated_segments,
+                "translation_status": translation_status,
+            }
+            for content, translated_content, translated_segments, translation_status in entries
+        ])
+
+    def get_diary_entry(self, entry_id: str) -> Optional[DiaryEntryRecord]:
+        """Get a diary entry (with favorites) by ID."""
+        return self.store.get_entry(entry_id)
+
+    def get_user_diary_entries(
+        self,
+        user_id: str,
+        limit: Optional[int] = None,
+        after: Optional[EntryKey] = None,
+        fields: Optional[Sequence[str]] = None,
+        descending: bool = True
+    ) -> List[DiaryEntryRecord]:
+        """Get a user's diary entries ordered by (created_at, id). Records are always whole, so fields is ignored."""
+        return self.store.list_entries(user_id, limit, after, descending)
+
+    def update_diary_entry(self, db_entry: DiaryEntryRecord, content: str, translated_content: str, translated_segments: Optional[List[Any]] = None, translation_status: str = TRANSLATION_COMPLETED) -> Optional[DiaryEntryRecord]:
+        """Update a loaded diary entry. Returns None if it was deleted or changed owner since it was loaded."""
+        return self.store.update_entry(
+            db_entry.id, db_entry.user_id,
+            content=content,
+            translated_content=translated_content,
+            translated_segments=translated_segments,
+            translation_status=translation_status
+        )
+
+    def complete_translation(self, db_entry: DiaryEntryRecord, translated_content: str, translated_segments: List[Any], translation_status: str) -> Optional[DiaryEntryRecord]:
+        """Store the result of a background translation job."""
+        return self.store.update_entry(
+            db_entry.id, db_entry.user_id,
+            translated_content=translated_content,
+            translated_segments=translated_segments,
+            translation_status=translation_status
+        )
+
+    def get_diary_entries_by_ids(self, entry_ids: Sequence[str]) -> List[DiaryEntryRecord]:
+        """Get diary entries (with favorites) in the order of the given IDs."""
+        return self.store.get_entries(entry_ids)
+
+    def refresh_diary_entry(self, db_entry: DiaryEntryRecord) -> DiaryEntryRecord:
+        """Return the current version of a diary entry, or the one given if it was deleted."""
+        return self.store.get_entry(db_entry.id) or db_entry
+
+    def search_diary_entries(self, user_id: str, query: str, limit: int, offset: int) -> List[DiaryEntryRecord]:
+        """Search a user's diary entries, best matches first."""
+        ranked = self.store.search(user_id, query, limit, offset)
+        return self.store.get_entries([entry_id for entry_id, score in ranked])
+
+    def iter_user_diary_entries(self, user_id: str, batch_size: int) -> Iterator[DiaryEntryRecord]:
+        """Yield all of a user's entries, oldest first, batch_size at a time so the lock is never held long."""
+        after = None
+        while True:
+            batch = self.store.list_entries(user_id, batch_size, after, descending=False)
+            yield from batch
+            if len(batch) < batch_size:
+                return
+            after = (batch[-1].created_at, batch[-1].id)
+
+    def add_imported_entries(self, user_id: str, entries: Sequence[Dict[str, Any]]) -> List[str]:
+        """Buffer a batch of imported entries until finish_import. Returns the new entry IDs."""
+        entry_ids = []
+        for entry in entries:
+            entry_id = generate_uuid()
+            row = {
+                "id": entry_id,
+                "content": entry["content"],
+                "translated_content": entry["translated_content"],
+                "translated_segments": entry.get("translated_segments"),
+                "translation_status": entry["translation_status"],
+                "created_at": entry.get("created_at"),
+                "updated_at": entry.get("updated_at"),
+            }
+            self._pending_import.append((user_id, row, list(entry.get("favorite_expressions") or ())))
+            entry_ids.append(entry_id)
+        return entry_ids
+
+    def finish_import(self, user_id: str) -> None:
+        """Store every buffered entry at once."""
+        pending = [(row, favorites) for owner, row, favorites in self._pending_import if owner == user_id]
+        self._pending_import = []
+        self.store.insert_entries(user_id, [row for row, favorites in pending], [favorites for row, favorites in pending])
+
+    def rollback(self) -> None:
+        """Drop a buffered import."""
+        self._pending_import = []
+
+    def get_user_data_version(self, user_id: str) -> int:
+        """Get the counter bumped by every write to a user's diary or favorites."""
+        return self.store.data_version(user_id)
+
+    def get_pending_translation_ids(self) -> List[str]:
+        """Get the IDs of diary entries still waiting for translation."""
+        return self.store.pending_entry_ids()
+
+    def delete_diary_entry(self, db_entry: DiaryEntryRecord) -> bool:
+        """Delete a loaded diary entry. Returns False if it was already gone."""
+        return self.store.delete_entry(db_entry.id, db_entry.user_id)
+
+    def add_favorite_expression(self, db_entry: DiaryEntryRecord, japanese_text: str, english_text: str, note: Optional[str] = None) -> FavoriteExpressionRecord:
+        """Add a favorite expression to a loaded diary entry."""
+        return self.store.add_favorite(db_entry.id, japanese_text, english_text, note)
+
+    def get_user_favorite_expressions(
+        self,
+        user_id: str,
+        limit: Optional[int] = None,
+        after: Optional[EntryKey] = None,
+        descending: bool = True,
+        prefix: Optional[str] = None
+    ) -> List[FavoriteExpressionRecord]:
+        """Get a user's favorite expressions ordered by (created_at, id), newest first by default."""
+        return self.store.list_favorites(user_id, limit, after, descending, prefix)
+
+
+memory_db = InMemoryDatabase()
@@ -0,0 +1,125 @@
+import asyncio
+import os
+from typing import AsyncGenerator, Optional, Union
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.database import InMemoryDatabase, memory_db
+from app.db_config import (
+    DATABASE_READ_URL,
+    DATABASE_URL,
+    DB_POOL_PRE_PING,
+    DB_POOL_SIZE,
+    DB_PREWARM_CONNECTIONS,
+    DB_STATEMENT_TIMEOUT_MS,
+    STORAGE_BACKEND,
+    InstrumentedPoolMixin,
+    get_db,
+    get_read_db,
+    pool_options,
+)
+
+# Serve requests through SQLAlchemy's asyncio extension (psycopg or aiosqlite); SQL storage only.
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() == "true" and STORAGE_BACKEND == "sql"
+
+DbSession = Union[Session, AsyncSession, InMemoryDatabase]
+
+
+class InstrumentedAsyncAdaptedQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool with checkout wait metrics."""
+
+
+def to_async_url(url: str) -> str:
+    """Map a sync database URL onto the matching asyncio driver."""
+    scheme, rest = url.split("://", 1)
+    if scheme.startswith("sqlite"):
+        return f"sqlite+aiosqlite://{rest}"
+    if scheme in ("postgres", "postgresql", "postgresql+psycopg2", "postgresql+psycopg"):
+        return f"postgresql+psycopg://{rest}"
+    return url
+
+
+def create_async_db_engine(url: str) -> AsyncEngine:
+    """Create an async engine with the same pool settings as the sync engine."""
+    async_url = to_async_url(url)
+    if async_url.startswith("sqlite"):
+        return create_async_engine(async_url, pool_pre_ping=DB_POOL_PRE_PING)
+
+    connect_args = {}
+    if DB_STATEMENT_TIMEOUT_MS > 0:
+        connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+
+    return create_async_engine(async_url, connect_args=connect_args, **pool_options(InstrumentedAsyncAdaptedQueuePool))
+
+
+async def prewarm_async_pool(db_engine: AsyncEngine, connections: int = DB_PREWARM_CONNECTIONS) -> None:
+    """Open up to `connections` pooled connections concurrently and return them to the pool."""
+    results = await asyncio.gather(
+        *(db_engine.connect().start() for _ in range(min(connections, DB_POOL_SIZE))), return_exceptions=True
+    )
+    opened = [result for result in results if not isinstance(result, BaseException)]
+    await asyncio.gather(*(connection.close() for connection in opened))
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+
+async_engine: Optional[AsyncEngine] = create_async_db_engine(DATABASE_URL) if DB_ASYNC else None
+async_read_engine: Optional[AsyncEngine] = (
+    create_async_db_engine(DATABASE_READ_URL) if DB_ASYNC and DATABASE_READ_URL else async_engine
+)
+
+# Async sessions cannot lazily reload attributes, so never expire them.
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(bind=async_read_engine, autoflush=False, expire_on_commit=False)
+
+
+async def prewarm_async_pools(connections: int = DB_PREWARM_CONNECTIONS) -> None:
+    """Prewarm the async primary pool and, if there is one, the async replica pool."""
+    await prewarm_async_pool(async_engine, connections)
+    if async_read_engine is not async_engine:
+        await prewarm_async_pool(async_read_engine, connections)
+
+
+def reset_async_pools_after_fork() -> None:
+    """The async engines' counterpart to db_config.reset_pools_after_fork."""
+    if async_engine is None:
+        return
+    async_engine.sync_engine.dispose(close=False)
+    if async_read_engine is not async_engine:
+        async_read_engine.sync_engine.dispose(close=False)
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency for getting an async database session.
+    
+    Yields:
+        AsyncSession: SQLAlchemy asyncio database session
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def _get_async_read_replica_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+
+def get_memory_db() -> InMemoryDatabase:
+    """Dependency standing in for a session with the in-memory storage backend."""
+    return memory_db
+
+
+# The session dependencies routes use, picked by STORAGE_BACKEND and DB_ASYNC.
+if STORAGE_BACKEND == "memory":
+    get_db_session = get_memory_db
+    get_read_db_session = get_memory_db
+elif DB_ASYNC:
+    get_db_session = get_async_db
+    get_read_db_session = _get_async_read_replica_db if DATABASE_READ_URL else get_async_db
+else:
+    get_db_session = get_db
+    get_read_db_session = get_read_db
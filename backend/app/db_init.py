@@ -1,11 +1,23 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import SQLAlchemyError
 from app.db_config import Base, engine
 from app.models.user import User
 from app.models.diary import DiaryEntry, FavoriteExpression
+from app.models.translation import TranslationCacheEntry
 
 def init_db():
     """Initialize the database by creating all tables."""
     Base.metadata.create_all(bind=engine)
+    if engine.dialect.name == "postgresql":
+        create_search_extension()
+
+def create_search_extension():
+    """Install pg_trgm for diary search; without it search falls back to ILIKE."""
+    try:
+        with engine.begin() as connection:
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except SQLAlchemyError as e:
+        print(f"Could not create the pg_trgm extension: {e}")
 
 if __name__ == "__main__":
     init_db()
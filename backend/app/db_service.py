@@ -1,12 +1,202 @@
-from typing import List, Optional
-from sqlalchemy.orm import Session
-from passlib.context import CryptContext
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+from sqlalchemy import ColumnElement, Delete, Insert, Select, Update, and_, delete, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, load_only, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
 from app.models.user import User
-from app.models.diary import DiaryEntry, FavoriteExpression
-from app.auth import UserCreate, get_password_hash, verify_password
+from app.models.base import generate_uuid
+from app.models.diary import DiaryEntry, FavoriteExpression, TRANSLATION_COMPLETED, TRANSLATION_PENDING
+from app.auth import UserCreate, get_password_hash
+from app.database import InMemoryDatabaseService, memory_db
+from app.db_config import STORAGE_BACKEND, ReadSessionLocal, SessionLocal
+from app.passwords import verify_and_update
+from app import search
+
+
+def keyset_condition(model: Any, after: Tuple[datetime, str], descending: bool) -> ColumnElement[bool]:
+    """WHERE clause for rows of model that come after a (created_at, id) position in the given order."""
+    created_at, row_id = after
+    # The cursor row's stored timestamp is exact; the cursor's own covers a deleted row.
+    anchor = func.coalesce(
+        select(model.created_at).where(model.id == row_id).scalar_subquery(),
+        created_at
+    )
+    if descending:
+        return or_(model.created_at < anchor, and_(model.created_at == anchor, model.id < row_id))
+    return or_(model.created_at > anchor, and_(model.created_at == anchor, model.id > row_id))
+
+
+def user_diary_entries_statement(
+    user_id: str,
+    limit: Optional[int] = None,
+    after: Optional[Tuple[datetime, str]] = None,
+    fields: Optional[Sequence[str]] = None,
+    descending: bool = True
+) -> Select:
+    """Build the keyset-paginated SELECT behind get_user_diary_entries."""
+    statement = select(DiaryEntry).where(DiaryEntry.user_id == user_id)
+    
+    if after is not None:
+        statement = statement.where(keyset_condition(DiaryEntry, after, descending))
+    
+    if fields is None:
+        statement = statement.options(selectinload(DiaryEntry.favorite_expressions))
+    else:
+        columns = [getattr(DiaryEntry, field) for field in fields if field != "favorite_expressions"]
+        statement = statement.options(load_only(DiaryEntry.id, DiaryEntry.created_at, *columns))
+        if "favorite_expressions" in fields:
+            statement = statement.options(selectinload(DiaryEntry.favorite_expressions))
+    
+    if descending:
+        statement = statement.order_by(DiaryEntry.created_at.desc(), DiaryEntry.id.desc())
+    else:
+        statement = statement.order_by(DiaryEntry.created_at.asc(), DiaryEntry.id.asc())
+    
+    if limit is not None:
+        statement = statement.limit(limit)
+    
+    return statement
+
+
+def diary_entries_by_ids_statement(entry_ids: Sequence[str]) -> Select:
+    """SELECT of entries with their favorites, overwriting any stale copies in the session."""
+    return (
+        select(DiaryEntry)
+        .options(selectinload(DiaryEntry.favorite_expressions))
+        .where(DiaryEntry.id.in_(list(entry_ids)))
+        .execution_options(populate_existing=True)
+    )
+
+
+def order_by_ids(entries: Sequence[DiaryEntry], entry_ids: Sequence[str]) -> List[DiaryEntry]:
+    """Return entries in the order of entry_ids, skipping IDs that were not found."""
+    loaded = {entry.id: entry for entry in entries}
+    return [loaded[entry_id] for entry_id in entry_ids if entry_id in loaded]
+
+
+def user_favorite_expressions_statement(
+    user_id: str,
+    limit: Optional[int] = None,
+    after: Optional[Tuple[datetime, str]] = None,
+    descending: bool = True,
+    prefix: Optional[str] = None
+) -> Select:
+    """Keyset-paginated SELECT of a user's favorites ordered by (created_at, id), optionally filtered by prefix."""
+    statement = select(FavoriteExpression).where(FavoriteExpression.user_id == user_id)
+    
+    if prefix:
+        statement = statement.where(or_(
+            FavoriteExpression.japanese_text.istartswith(prefix, autoescape=True),
+            FavoriteExpression.english_text.istartswith(prefix, autoescape=True)
+        ))
+    
+    if after is not None:
+        statement = statement.where(keyset_condition(FavoriteExpression, after, descending))
+    
+    if descending:
+        statement = statement.order_by(FavoriteExpression.created_at.desc(), FavoriteExpression.id.desc())
+    else:
+        statement = statement.order_by(FavoriteExpression.created_at.asc(), FavoriteExpression.id.asc())
+    
+    if limit is not None:
+        statement = statement.limit(limit)
+    
+    return statement
+
+def insert_diary_entries_statement() -> Insert:
+    """INSERT ... RETURNING for diary entries; execute with a list of column dicts."""
+    return insert(DiaryEntry).returning(DiaryEntry, sort_by_parameter_order=True)
+
+
+def update_diary_entry_statement(entry_id: str, user_id: str, **values: Any) -> Update:
+    """Single-statement UPDATE ... RETURNING that only matches the owner's entry."""
+    return (
+        update(DiaryEntry)
+        .where(DiaryEntry.id == entry_id, DiaryEntry.user_id == user_id)
+        .values(**values)
+        .returning(DiaryEntry)
+    )
+
+
+def delete_diary_entry_statement(entry_id: str, user_id: str) -> Delete:
+    """DELETE that only matches the owner's entry."""
+    return delete(DiaryEntry).where(DiaryEntry.id == entry_id, DiaryEntry.user_id == user_id)
+
+
+def delete_favorite_expressions_statement(entry_id: str) -> Delete:
+    """DELETE of an entry's favorites, which must go before the entry itself."""
+    return delete(FavoriteExpression).where(FavoriteExpression.diary_entry_id == entry_id)
+
+
+def data_version_statement(user_id: str) -> Select:
+    """SELECT of a user's data version, read by the ETag checks without loading any rows."""
+    return select(User.data_version).where(User.id == user_id)
+
+
+def bump_data_version_statement(user_id: str) -> Update:
+    """UPDATE that invalidates every ETag handed out for the user's data."""
+    return (
+        update(User)
+        .where(User.id == user_id)
+        .values(data_version=User.data_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def export_diary_entries_statement(user_id: str, batch_size: int) -> Select:
+    """Oldest-first SELECT of every entry and its favorites, fetched batch_size rows at a time."""
+    return user_diary_entries_statement(user_id, descending=False).execution_options(yield_per=batch_size)
+
+
+def import_rows(user_id: str, entries: Sequence[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Split imported entries into diary_entries and favorite_expressions rows with pre-generated IDs."""
+    entry_rows: List[Dict[str, Any]] = []
+    favorite_rows: List[Dict[str, Any]] = []
+    for entry in entries:
+        entry_id = generate_uuid()
+        row = {
+            "id": entry_id,
+            "user_id": user_id,
+            "content": entry["content"],
+            "translated_content": entry["translated_content"],
+            "translated_segments": entry.get("translated_segments"),
+            "translation_status": entry["translation_status"],
+            "updated_at": entry.get("updated_at"),
+        }
+        if entry.get("created_at") is not None:
+            row["created_at"] = entry["created_at"]
+        entry_rows.append(row)
+        
+        for favorite in entry.get("favorite_expressions") or ():
+            favorite_rows.append({
+                "id": generate_uuid(),
+                "diary_entry_id": entry_id,
+                "user_id": user_id,
+                "japanese_text": favorite["japanese_text"],
+                "english_text": favorite["english_text"],
+                "note": favorite.get("note"),
+            })
+    return entry_rows, favorite_rows
+
+
+def diary_entry_values(user_id: str, content: str, translated_content: str, translated_segments: Optional[List[Any]], translation_status: str) -> dict:
+    return {
+        "content": content,
+        "translated_content": translated_content,
+        "translated_segments": translated_segments,
+        "translation_status": translation_status,
+        "user_id": user_id,
+    }
+
+
+def mark_no_favorites(db_entries: Sequence[DiaryEntry]) -> None:
+    """Mark freshly inserted entries as having no favorites, so nothing lazy-loads them."""
+    for db_entry in db_entries:
+        set_committed_value(db_entry, "favorite_expressions", [])
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 class DatabaseService:
     """Service for database operations."""
@@ -14,20 +204,22 @@ class DatabaseService:
     def __init__(self, db: Session):
         self.db = db
     
-    def create_user(self, user_data: UserCreate) -> User:
-        """Create a new user."""
-        hashed_password = get_password_hash(user_data.password)
+    def create_user(self, user_data: UserCreate, hashed_password: Optional[str] = None) -> User:
+        """Create a new user. Pass hashed_password if the password was already hashed. Raises ValueError if the email is taken."""
+        if hashed_password is None:
+            hashed_password = get_password_hash(user_data.password)
         
-        db_user = User(
-            email=user_data.email,
-            hashed_password=hashed_password,
-            name=user_data.name,
-            picture=user_data.picture
-        )
-        
-        self.db.add(db_user)
-        self.db.commit()
-        self.db.refresh(db_user)
+        try:
+            db_user = self.db.scalars(insert(User).returning(User), [{
+                "email": user_data.email,
+                "hashed_password": hashed_password,
+                "name": user_data.name,
+                "picture": user_data.picture,
+            }]).one()
+            self.db.commit()
+        except IntegrityError as e:
+            self.db.rollback()
+            raise ValueError(f"Email already registered: {user_data.email}") from e
         
         return db_user
     
@@ -42,81 +234,190 @@ class DatabaseService:
     def verify_user_password(self, email: str, password: str) -> Optional[User]:
         """Verify user credentials and return user if valid."""
         user = self.get_user_by_email(email)
-        if user and verify_password(password, user.hashed_password):
-            return user
-        return None
+        if not user:
+            return None
+        
+        valid, new_hash = verify_and_update(password, user.hashed_password)
+        if not valid:
+            return None
+        if new_hash:
+            self.update_user_password_hash(user, new_hash)
+        return user
     
-    def create_diary_entry(self, user_id: str, content: str, translated_content: str) -> DiaryEntry:
+    def update_user_password_hash(self, user: User, hashed_password: str) -> User:
+        """Replace a user's password hash, e.g. after rehashing with new settings."""
+        user.hashed_password = hashed_password
+        self.db.commit()
+        return user
+    
+    def create_diary_entry(self, user_id: str, content: str, translated_content: str, translated_segments: Optional[List[Any]] = None, translation_status: str = TRANSLATION_COMPLETED) -> DiaryEntry:
         """Create a new diary entry."""
-        db_entry = DiaryEntry(
-            content=content,
-            translated_content=translated_content,
-            user_id=user_id
-        )
-        
-        self.db.add(db_entry)
+        return self.create_diary_entries(user_id, [(content, translated_content, translated_segments, translation_status)])[0]
+    
+    def create_diary_entries(self, user_id: str, entries: Sequence[Tuple[str, str, Optional[List[Any]], str]]) -> List[DiaryEntry]:
+        """Create several diary entries with one INSERT ... RETURNING."""
+        db_entries = self.db.scalars(insert_diary_entries_statement(), [
+            diary_entry_values(user_id, content, translated_content, translated_segments, translation_status)
+            for content, translated_content, translated_segments, translation_status in entries
+        ]).all()
+        self.db.execute(bump_data_version_statement(user_id))
         self.db.commit()
-        self.db.refresh(db_entry)
         
-        return db_entry
+        mark_no_favorites(db_entries)
+        for db_entry in db_entries:
+            search.index_entry(db_entry.id, user_id, db_entry.content, db_entry.translated_content)
+        
+        return db_entries
     
     def get_diary_entry(self, entry_id: str) -> Optional[DiaryEntry]:
-        """Get a diary entry by ID."""
-        return self.db.query(DiaryEntry).filter(DiaryEntry.id == entry_id).first()
+        """Get a diary entry (with favorites) by ID."""
+        return self.db.scalars(diary_entries_by_ids_statement([entry_id])).first()
     
-    def get_user_diary_entries(self, user_id: str) -> List[DiaryEntry]:
-        """Get all diary entries for a user."""
-        return self.db.query(DiaryEntry).filter(DiaryEntry.user_id == user_id).all()
+    def get_user_diary_entries(
+        self,
+        user_id: str,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[datetime, str]] = None,
+        fields: Optional[Sequence[str]] = None,
+        descending: bool = True
+    ) -> List[DiaryEntry]:
+        """Get a user's diary entries ordered by (created_at, id), loading only fields if given."""
+        statement = user_diary_entries_statement(user_id, limit, after, fields, descending)
+        return list(self.db.scalars(statement).all())
     
-    def update_diary_entry(self, entry_id: str, content: str, translated_content: str) -> Optional[DiaryEntry]:
-        """Update a diary entry."""
-        db_entry = self.get_diary_entry(entry_id)
-        if not db_entry:
-            return None
-        
-        db_entry.content = content
-        db_entry.translated_content = translated_content
+    def update_diary_entry(self, db_entry: DiaryEntry, content: str, translated_content: str, translated_segments: Optional[List[Any]] = None, translation_status: str = TRANSLATION_COMPLETED) -> Optional[DiaryEntry]:
+        """Update a loaded diary entry. Returns None if it was deleted or changed owner since it was loaded."""
+        statement = update_diary_entry_statement(
+            db_entry.id, db_entry.user_id,
+            content=content,
+            translated_content=translated_content,
+            translated_segments=translated_segments,
+            translation_status=translation_status
+        )
+        updated_entry = self.db.scalars(statement).one_or_none()
+        if updated_entry is not None:
+            self.db.execute(bump_data_version_statement(db_entry.user_id))
+        self.db.commit()
         
+        if updated_entry is not None:
+            search.index_entry(updated_entry.id, updated_entry.user_id, content, translated_content)
+        return updated_entry
+    
+    def complete_translation(self, db_entry: DiaryEntry, translated_content: str, translated_segments: List[Any], translation_status: str) -> Optional[DiaryEntry]:
+        """Store the result of a background translation job."""
+        statement = update_diary_entry_statement(
+            db_entry.id, db_entry.user_id,
+            translated_content=translated_content,
+            translated_segments=translated_segments,
+            translation_status=translation_status
+        )
+        updated_entry = self.db.scalars(statement).one_or_none()
+        if updated_entry is not None:
+            self.db.execute(bump_data_version_statement(db_entry.user_id))
         self.db.commit()
-        self.db.refresh(db_entry)
         
-        return db_entry
+        if updated_entry is not None:
+            search.index_entry(updated_entry.id, updated_entry.user_id, updated_entry.content, translated_content)
+        return updated_entry
     
-    def delete_diary_entry(self, entry_id: str) -> bool:
-        """Delete a diary entry."""
-        db_entry = self.get_diary_entry(entry_id)
-        if not db_entry:
-            return False
+    def get_diary_entries_by_ids(self, entry_ids: Sequence[str]) -> List[DiaryEntry]:
+        """Get diary entries (with favorites) in the order of the given IDs."""
+        if not entry_ids:
+            return []
         
-        self.db.delete(db_entry)
+        return order_by_ids(self.db.scalars(diary_entries_by_ids_statement(entry_ids)).all(), entry_ids)
+    
+    def refresh_diary_entry(self, db_entry: DiaryEntry) -> DiaryEntry:
+        """Reload a diary entry from the database."""
+        self.db.refresh(db_entry)
+        return db_entry
+    
+    def search_diary_entries(self, user_id: str, query: str, limit: int, offset: int) -> List[DiaryEntry]:
+        """Search a user's diary entries, best matches first."""
+        ranked = search.search_entries(self.db, user_id, query, limit, offset)
+        return self.get_diary_entries_by_ids([entry_id for entry_id, score in ranked])
+    
+    def iter_user_diary_entries(self, user_id: str, batch_size: int) -> Iterator[DiaryEntry]:
+        """Yield all of a user's entries, oldest first, fetched batch_size rows at a time."""
+        yield from self.db.scalars(export_diary_entries_statement(user_id, batch_size))
+    
+    def add_imported_entries(self, user_id: str, entries: Sequence[Dict[str, Any]]) -> List[str]:
+        """Insert a batch of imported entries without committing; finish_import commits."""
+        entry_rows, favorite_rows = import_rows(user_id, entries)
+        if entry_rows:
+            self.db.execute(insert(DiaryEntry), entry_rows)
+        if favorite_rows:
+            self.db.execute(insert(FavoriteExpression), favorite_rows)
+        return [row["id"] for row in entry_rows]
+    
+    def finish_import(self, user_id: str) -> None:
+        """Commit an import started with add_imported_entries."""
+        self.db.execute(bump_data_version_statement(user_id))
         self.db.commit()
-        
-        return True
+        search.reindex_user(user_id)
     
-    def add_favorite_expression(self, entry_id: str, japanese_text: str, english_text: str, note: Optional[str] = None) -> Optional[FavoriteExpression]:
-        """Add a favorite expression to a diary entry."""
-        db_entry = self.get_diary_entry(entry_id)
-        if not db_entry:
-            return None
+    def rollback(self) -> None:
+        """Abandon the current transaction, e.g. a failed import."""
+        self.db.rollback()
+    
+    def get_user_data_version(self, user_id: str) -> int:
+        """Get the counter bumped by every write to a user's diary or favorites."""
+        return self.db.scalar(data_version_statement(user_id)) or 0
+    
+    def get_pending_translation_ids(self) -> List[str]:
+        """Get the IDs of diary entries still waiting for translation."""
+        rows = self.db.query(DiaryEntry.id).filter(DiaryEntry.translation_status == TRANSLATION_PENDING).all()
+        return [row.id for row in rows]
+    
+    def delete_diary_entry(self, db_entry: DiaryEntry) -> bool:
+        """Delete a loaded diary entry. Returns False if it was already gone."""
+        # Favorites added since the entry was loaded must go too, so this always runs.
+        self.db.execute(delete_favorite_expressions_statement(db_entry.id))
+        deleted = self.db.execute(delete_diary_entry_statement(db_entry.id, db_entry.user_id)).rowcount
+        if deleted:
+            self.db.execute(bump_data_version_statement(db_entry.user_id))
+        self.db.commit()
         
-        db_expression = FavoriteExpression(
-            japanese_text=japanese_text,
-            english_text=english_text,
-            note=note,
-            diary_entry_id=entry_id
-        )
+        search.remove_entry(db_entry.id, db_entry.user_id)
         
-        self.db.add(db_expression)
+        return deleted > 0
+    
+    def add_favorite_expression(self, db_entry: DiaryEntry, japanese_text: str, english_text: str, note: Optional[str] = None) -> FavoriteExpression:
+        """Add a favorite expression to a loaded diary entry."""
+        db_expression = self.db.scalars(insert(FavoriteExpression).returning(FavoriteExpression), [{
+            "japanese_text": japanese_text,
+            "english_text": english_text,
+            "note": note,
+            "diary_entry_id": db_entry.id,
+            "user_id": db_entry.user_id,
+        }]).one()
+        self.db.execute(bump_data_version_statement(db_entry.user_id))
         self.db.commit()
-        self.db.refresh(db_expression)
         
         return db_expression
     
-    def get_user_favorite_expressions(self, user_id: str) -> List[FavoriteExpression]:
-        """Get all favorite expressions for a user."""
-        return (
-            self.db.query(FavoriteExpression)
-            .join(DiaryEntry)
-            .filter(DiaryEntry.user_id == user_id)
-            .all()
-        )
+    def get_user_favorite_expressions(
+        self,
+        user_id: str,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[datetime, str]] = None,
+        descending: bool = True,
+        prefix: Optional[str] = None
+    ) -> List[FavoriteExpression]:
+        """Get a user's favorite expressions ordered by (created_at, id), newest first by default."""
+        statement = user_favorite_expressions_statement(user_id, limit, after, descending, prefix)
+        return list(self.db.scalars(statement).all())
+
+
+@contextmanager
+def open_database_service(read_only: bool = False) -> Iterator[Union[DatabaseService, InMemoryDatabaseService]]:
+    """A sync database service with its own session, for work outside a request."""
+    if STORAGE_BACKEND == "memory":
+        yield InMemoryDatabaseService(memory_db)
+        return
+    
+    db = (ReadSessionLocal if read_only else SessionLocal)()
+    try:
+        yield DatabaseService(db)
+    finally:
+        db.close()
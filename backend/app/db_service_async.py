@@ -0,0 +1,284 @@
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.models.user import User
+from app.models.diary import DiaryEntry, FavoriteExpression, TRANSLATION_COMPLETED, TRANSLATION_PENDING
+from app.auth import UserCreate
+from app.passwords import password_hasher
+from app.database import InMemoryDatabase, InMemoryDatabaseService
+from app.db_service import (
+    DatabaseService,
+    bump_data_version_statement,
+    data_version_statement,
+    delete_diary_entry_statement,
+    delete_favorite_expressions_statement,
+    diary_entries_by_ids_statement,
+    diary_entry_values,
+    export_diary_entries_statement,
+    import_rows,
+    insert_diary_entries_statement,
+    mark_no_favorites,
+    order_by_ids,
+    update_diary_entry_statement,
+    user_diary_entries_statement,
+    user_favorite_expressions_statement,
+)
+from app import search
+
+
+class AsyncDatabaseService:
+    """DatabaseService for an AsyncSession, method for method, with favorites always loaded."""
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def create_user(self, user_data: UserCreate, hashed_password: Optional[str] = None) -> User:
+        """Create a new user. Pass hashed_password if the password was already hashed. Raises ValueError if the email is taken."""
+        if hashed_password is None:
+            hashed_password = await password_hasher.hash(user_data.password)
+        
+        try:
+            db_user = (await self.db.scalars(insert(User).returning(User), [{
+                "email": user_data.email,
+                "hashed_password": hashed_password,
+                "name": user_data.name,
+                "picture": user_data.picture,
+            }])).one()
+            await self.db.commit()
+        except IntegrityError as e:
+            await self.db.rollback()
+            raise ValueError(f"Email already registered: {user_data.email}") from e
+        
+        return db_user
+    
+    async def get_user_by_id(self, user_id: str) -> Optional[User]:
+        """Get a user by ID."""
+        return await self.db.get(User, user_id)
+    
+    async def get_user_by_email(self, email: str) -> Optional[User]:
+        """Get a user by email."""
+        return (await self.db.scalars(select(User).where(User.email == email))).first()
+    
+    async def verify_user_password(self, email: str, password: str) -> Optional[User]:
+        """Verify user credentials and return user if valid."""
+        user = await self.get_user_by_email(email)
+        if not user:
+            return None
+        
+        valid, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+        if not valid:
+            return None
+        if new_hash:
+            await self.update_user_password_hash(user, new_hash)
+        return user
+    
+    async def update_user_password_hash(self, user: User, hashed_password: str) -> User:
+        """Replace a user's password hash, e.g. after rehashing with new settings."""
+        user.hashed_password = hashed_password
+        await self.db.commit()
+        return user
+    
+    async def create_diary_entry(self, user_id: str, content: str, translated_content: str, translated_segments: Optional[List[Any]] = None, translation_status: str = TRANSLATION_COMPLETED) -> DiaryEntry:
+        """Create a new diary entry."""
+        return (await self.create_diary_entries(user_id, [(content, translated_content, translated_segments, translation_status)]))[0]
+    
+    async def create_diary_entries(self, user_id: str, entries: Sequence[Tuple[str, str, Optional[List[Any]], str]]) -> List[DiaryEntry]:
+        """Create several diary entries with one INSERT ... RETURNING."""
+        db_entries = (await self.db.scalars(insert_diary_entries_statement(), [
+            diary_entry_values(user_id, content, translated_content, translated_segments, translation_status)
+            for content, translated_content, translated_segments, translation_status in entries
+        ])).all()
+        await self.db.execute(bump_data_version_statement(user_id))
+        await self.db.commit()
+        
+        mark_no_favorites(db_entries)
+        for db_entry in db_entries:
+            search.index_entry(db_entry.id, user_id, db_entry.content, db_entry.translated_content)
+        
+        return list(db_entries)
+    
+    async def get_diary_entry(self, entry_id: str) -> Optional[DiaryEntry]:
+        """Get a diary entry by ID."""
+        entries = await self.get_diary_entries_by_ids([entry_id])
+        return entries[0] if entries else None
+    
+    async def get_user_diary_entries(
+        self,
+        user_id: str,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[datetime, str]] = None,
+        fields: Optional[Sequence[str]] = None,
+        descending: bool = True
+    ) -> List[DiaryEntry]:
+        """Get a user's diary entries ordered by (created_at, id). See DatabaseService."""
+        statement = user_diary_entries_statement(user_id, limit, after, fields, descending)
+        return list((await self.db.scalars(statement)).all())
+    
+    async def update_diary_entry(self, db_entry: DiaryEntry, content: str, translated_content: str, translated_segments: Optional[List[Any]] = None, translation_status: str = TRANSLATION_COMPLETED) -> Optional[DiaryEntry]:
+        """Update a loaded diary entry. See DatabaseService."""
+        statement = update_diary_entry_statement(
+            db_entry.id, db_entry.user_id,
+            content=content,
+            translated_content=translated_content,
+            translated_segments=translated_segments,
+            translation_status=translation_status
+        )
+        updated_entry = (await self.db.scalars(statement)).one_or_none()
+        if updated_entry is not None:
+            await self.db.execute(bump_data_version_statement(db_entry.user_id))
+        await self.db.commit()
+        
+        if updated_entry is not None:
+            search.index_entry(updated_entry.id, updated_entry.user_id, content, translated_content)
+        return updated_entry
+    
+    async def complete_translation(self, db_entry: DiaryEntry, translated_content: str, translated_segments: List[Any], translation_status: str) -> Optional[DiaryEntry]:
+        """Store the result of a background translation job."""
+        statement = update_diary_entry_statement(
+            db_entry.id, db_entry.user_id,
+            translated_content=translated_content,
+            translated_segments=translated_segments,
+            translation_status=translation_status
+        )
+        updated_entry = (await self.db.scalars(statement)).one_or_none()
+        if updated_entry is not None:
+            await self.db.execute(bump_data_version_statement(db_entry.user_id))
+        await self.db.commit()
+        
+        if updated_entry is not None:
+            search.index_entry(updated_entry.id, updated_entry.user_id, updated_entry.content, translated_content)
+        return updated_entry
+    
+    async def get_diary_entries_by_ids(self, entry_ids: Sequence[str]) -> List[DiaryEntry]:
+        """Get diary entries (with favorites) in the order of the given IDs."""
+        if not entry_ids:
+            return []
+        
+        entries = (await self.db.scalars(diary_entries_by_ids_statement(entry_ids))).all()
+        return order_by_ids(entries, entry_ids)
+    
+    async def refresh_diary_entry(self, db_entry: DiaryEntry) -> DiaryEntry:
+        """Reload a diary entry from the database."""
+        return (await self.get_diary_entries_by_ids([db_entry.id]))[0]
+    
+    async def search_diary_entries(self, user_id: str, query: str, limit: int, offset: int) -> List[DiaryEntry]:
+        """Search a user's diary entries, best matches first."""
+        ranked = await search.search_entries_async(self.db, user_id, query, limit, offset)
+        return await self.get_diary_entries_by_ids([entry_id for entry_id, score in ranked])
+    
+    async def stream_user_diary_entries(self, user_id: str, batch_size: int) -> AsyncIterator[DiaryEntry]:
+        """Async variant of DatabaseService.iter_user_diary_entries."""
+        result = await self.db.stream_scalars(export_diary_entries_statement(user_id, batch_size))
+        async for entry in result:
+            yield entry
+    
+    async def add_imported_entries(self, user_id: str, entries: Sequence[Dict[str, Any]]) -> List[str]:
+        """Insert a batch of imported entries without committing. See DatabaseService."""
+        entry_rows, favorite_rows = import_rows(user_id, entries)
+        if entry_rows:
+            await self.db.execute(insert(DiaryEntry), entry_rows)
+        if favorite_rows:
+            await self.db.execute(insert(FavoriteExpression), favorite_rows)
+        return [row["id"] for row in entry_rows]
+    
+    async def finish_import(self, user_id: str) -> None:
+        """Commit an import started with add_imported_entries."""
+        await self.db.execute(bump_data_version_statement(user_id))
+        await self.db.commit()
+        search.reindex_user(user_id)
+    
+    async def rollback(self) -> None:
+        """Abandon the current transaction, e.g. a failed import."""
+        await self.db.rollback()
+    
+    async def get_user_data_version(self, user_id: str) -> int:
+        """Get the counter bumped by every write to a user's diary or favorites."""
+        return (await self.db.scalar(data_version_statement(user_id))) or 0
+    
+    async def get_pending_translation_ids(self) -> List[str]:
+        """Get the IDs of diary entries still waiting for translation."""
+        result = await self.db.scalars(select(DiaryEntry.id).where(DiaryEntry.translation_status == TRANSLATION_PENDING))
+        return list(result.all())
+    
+    async def delete_diary_entry(self, db_entry: DiaryEntry) -> bool:
+        """Delete a loaded diary entry. Returns False if it was already gone."""
+        await self.db.execute(delete_favorite_expressions_statement(db_entry.id))
+        deleted = (await self.db.execute(delete_diary_entry_statement(db_entry.id, db_entry.user_id))).rowcount
+        if deleted:
+            await self.db.execute(bump_data_version_statement(db_entry.user_id))
+        await self.db.commit()
+        
+        search.remove_entry(db_entry.id, db_entry.user_id)
+        
+        return deleted > 0
+    
+    async def add_favorite_expression(self, db_entry: DiaryEntry, japanese_text: str, english_text: str, note: Optional[str] = None) -> FavoriteExpression:
+        """Add a favorite expression to a loaded diary entry."""
+        db_expression = (await self.db.scalars(insert(FavoriteExpression).returning(FavoriteExpression), [{
+            "japanese_text": japanese_text,
+            "english_text": english_text,
+            "note": note,
+            "diary_entry_id": db_entry.id,
+            "user_id": db_entry.user_id,
+        }])).one()
+        await self.db.execute(bump_data_version_statement(db_entry.user_id))
+        await self.db.commit()
+        
+        return db_expression
+    
+    async def get_user_favorite_expressions(
+        self,
+        user_id: str,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[datetime, str]] = None,
+        descending: bool = True,
+        prefix: Optional[str] = None
+    ) -> List[FavoriteExpression]:
+        """Get a user's favorite expressions ordered by (created_at, id), newest first by default."""
+        statement = user_favorite_expressions_statement(user_id, limit, after, descending, prefix)
+        return list((await self.db.scalars(statement)).all())
+
+
+class ThreadedDatabaseService:
+    """Awaitable facade over DatabaseService that runs each call in the threadpool, one at a time."""
+    
+    def __init__(self, db: Session):
+        self._service = DatabaseService(db)
+    
+    def __getattr__(self, name: str):
+        method = getattr(self._service, name)
+        
+        async def call(*args, **kwargs):
+            return await run_in_threadpool(method, *args, **kwargs)
+        
+        return call
+
+
+class InlineDatabaseService:
+    """Awaitable facade over InMemoryDatabaseService, run on the event loop since it never waits on I/O."""
+    
+    def __init__(self, db: InMemoryDatabase):
+        self._service = InMemoryDatabaseService(db)
+    
+    def __getattr__(self, name: str):
+        method = getattr(self._service, name)
+        
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        
+        return call
+
+
+def service_for(db: Union[Session, AsyncSession, InMemoryDatabase]) -> Union[AsyncDatabaseService, ThreadedDatabaseService, InlineDatabaseService]:
+    """Return an awaitable database service for whichever kind of session the request has."""
+    if isinstance(db, InMemoryDatabase):
+        return InlineDatabaseService(db)
+    if isinstance(db, AsyncSession):
+        return AsyncDatabaseService(db)
+    return ThreadedDatabaseService(db)
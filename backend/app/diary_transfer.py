@@ -0,0 +1,103 @@
+import os
+from typing import AsyncIterator, Iterator, List
+
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+
+from app.db_async import DB_ASYNC, AsyncReadSessionLocal
+from app.db_service import open_database_service
+from app.db_service_async import AsyncDatabaseService
+from app.fast_json import diary_entry_to_dict, dumps
+from app.models.diary import DiaryEntry
+from app.schemas import DiaryEntryImport
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+DIARY_EXPORT_BATCH_SIZE = int(os.getenv("DIARY_EXPORT_BATCH_SIZE", "200"))
+DIARY_EXPORT_CHUNK_BYTES = int(os.getenv("DIARY_EXPORT_CHUNK_BYTES", "65536"))
+DIARY_IMPORT_BATCH_SIZE = int(os.getenv("DIARY_IMPORT_BATCH_SIZE", "500"))
+DIARY_IMPORT_MAX_LINE_BYTES = int(os.getenv("DIARY_IMPORT_MAX_LINE_BYTES", str(1024 * 1024)))
+DIARY_IMPORT_MAX_ENTRIES = int(os.getenv("DIARY_IMPORT_MAX_ENTRIES", "100000"))
+
+
+def export_line(entry: DiaryEntry) -> bytes:
+    """One NDJSON line: the DiaryEntry schema plus translated_segments."""
+    data = diary_entry_to_dict(entry)
+    data["translated_segments"] = entry.translated_segments
+    return dumps(data) + b"\n"
+
+
+def export_entries(user_id: str) -> Iterator[bytes]:
+    """Yield a user's export in chunks of about DIARY_EXPORT_CHUNK_BYTES, from its own session."""
+    with open_database_service(read_only=True) as db_service:
+        buffer = bytearray()
+        for entry in db_service.iter_user_diary_entries(user_id, DIARY_EXPORT_BATCH_SIZE):
+            buffer += export_line(entry)
+            if len(buffer) >= DIARY_EXPORT_CHUNK_BYTES:
+                yield bytes(buffer)
+                buffer.clear()
+        if buffer:
+            yield bytes(buffer)
+
+
+async def export_entries_async(user_id: str) -> AsyncIterator[bytes]:
+    """Async variant of export_entries for DB_ASYNC."""
+    async with AsyncReadSessionLocal() as db:
+        buffer = bytearray()
+        async for entry in AsyncDatabaseService(db).stream_user_diary_entries(user_id, DIARY_EXPORT_BATCH_SIZE):
+            buffer += export_line(entry)
+            if len(buffer) >= DIARY_EXPORT_CHUNK_BYTES:
+                yield bytes(buffer)
+                buffer.clear()
+        if buffer:
+            yield bytes(buffer)
+
+
+def export_stream(user_id: str):
+    """The export body for whichever kind of session this process uses."""
+    return export_entries_async(user_id) if DB_ASYNC else export_entries(user_id)
+
+
+def _parse_line(line: bytes, line_number: int) -> DiaryEntryImport:
+    try:
+        return DiaryEntryImport.model_validate_json(line)
+    except ValidationError as e:
+        error = e.errors()[0]
+        location = ".".join(str(part) for part in error["loc"])
+        detail = f"Line {line_number}: {error['msg']}" + (f" ({location})" if location else "")
+        raise HTTPException(status_code=400, detail=detail)
+
+
+async def read_import_batches(request: Request, batch_size: int = DIARY_IMPORT_BATCH_SIZE) -> AsyncIterator[List[DiaryEntryImport]]:
+    """Parse an NDJSON upload as it arrives, yielding batch_size entries at a time."""
+    batch: List[DiaryEntryImport] = []
+    buffer = b""
+    line_number = 0
+    total = 0
+
+    async def lines():
+        nonlocal buffer
+        async for chunk in request.stream():
+            buffer += chunk
+            *complete, buffer = buffer.split(b"\n")
+            for line in complete:
+                yield line
+            if len(buffer) > DIARY_IMPORT_MAX_LINE_BYTES:
+                raise HTTPException(status_code=413, detail=f"Line {line_number + 1} exceeds {DIARY_IMPORT_MAX_LINE_BYTES} bytes")
+        yield buffer
+
+    async for line in lines():
+        line_number += 1
+        if not line.strip():
+            continue
+
+        total += 1
+        if total > DIARY_IMPORT_MAX_ENTRIES:
+            raise HTTPException(status_code=413, detail=f"An import may contain at most {DIARY_IMPORT_MAX_ENTRIES} entries")
+
+        batch.append(_parse_line(line, line_number))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
@@ -0,0 +1,89 @@
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+
+from app.models.diary import DiaryEntry, FavoriteExpression
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Serialize diary lists straight from the ORM rows, skipping response_model validation.
+FAST_JSON_RESPONSES = os.getenv("FAST_JSON_RESPONSES", "false").lower() == "true"
+
+
+def _isoformat(value: datetime) -> str:
+    # Match pydantic, which writes UTC as "Z".
+    text = value.isoformat()
+    return text[:-6] + "Z" if text.endswith("+00:00") else text
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return _isoformat(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Encode content as compact UTF-8 JSON, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with dumps()."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def favorite_expression_to_dict(expression: FavoriteExpression) -> Dict[str, Any]:
+    """Same keys, in the same order, as schemas.FavoriteExpression."""
+    return {
+        "japanese_text": expression.japanese_text,
+        "english_text": expression.english_text,
+        "note": expression.note,
+        "id": expression.id,
+        "diary_entry_id": expression.diary_entry_id,
+        "created_at": expression.created_at,
+    }
+
+
+def diary_entry_to_dict(entry: DiaryEntry, fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """Same keys, in the same order, as schemas.DiaryEntry; with fields, only those are read."""
+    if fields is None:
+        fields = ("content", "translated_content", "translation_status", "updated_at", "favorite_expressions")
+
+    data: Dict[str, Any] = {}
+    if "content" in fields:
+        data["content"] = entry.content
+    data["id"] = entry.id
+    for field in ("translated_content", "translation_status"):
+        if field in fields:
+            data[field] = getattr(entry, field)
+    data["created_at"] = entry.created_at
+    if "updated_at" in fields:
+        data["updated_at"] = entry.updated_at
+    if "favorite_expressions" in fields:
+        data["favorite_expressions"] = [favorite_expression_to_dict(expression) for expression in entry.favorite_expressions]
+    return data
+
+
+def diary_entries_response(
+    entries: Iterable[DiaryEntry],
+    response: Response,
+    fields: Optional[Sequence[str]] = None
+) -> FastJSONResponse:
+    """Serialize entries directly, keeping every header already set on the route's Response."""
+    json_response = FastJSONResponse([diary_entry_to_dict(entry, fields) for entry in entries])
+    # raw_headers, unlike a dict, keeps repeated headers such as Set-Cookie.
+    json_response.raw_headers.extend(
+        (name, value) for name, value in response.raw_headers if name != b"content-length"
+    )
+    return json_response
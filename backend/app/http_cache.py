@@ -0,0 +1,40 @@
+import hashlib
+import os
+
+from fastapi import Request, Response
+
+# Per-user responses: browsers may keep them but revalidate before every reuse.
+HTTP_CACHE_CONTROL = os.getenv("HTTP_CACHE_CONTROL", "private, no-cache")
+
+ETAG_HEADER = "ETag"
+
+
+def make_etag(user_id: str, version: int, request: Request) -> str:
+    """Strong ETag for a user's data at a given version, specific to the request URL."""
+    key = f"{user_id}:{version}:{request.url.path}?{request.url.query}"
+    return '"' + hashlib.sha256(key.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match header already names this ETag."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 prescribes for If-None-Match.
+    candidates = {candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")}
+    return etag in candidates
+
+
+def set_cache_headers(response: Response, etag: str) -> None:
+    response.headers[ETAG_HEADER] = etag
+    response.headers["Cache-Control"] = HTTP_CACHE_CONTROL
+    response.headers["Vary"] = "Authorization"
+
+
+def not_modified(etag: str) -> Response:
+    """Empty 304 reply; returning it skips the query and serialization entirely."""
+    response = Response(status_code=304)
+    set_cache_headers(response, etag)
+    return response
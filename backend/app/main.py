@@ -1,14 +1,49 @@
+import asyncio
 import os
-from fastapi import FastAPI
+
+# First, so that every import below is timed.
+from app.startup import STARTUP_WARM_UP, startup_report
+
+from app.db_config import STORAGE_BACKEND, engine, pool_stats, prewarm_pools, read_engine
+
+# Connect to the database while FastAPI and the routes are still importing.
+if STORAGE_BACKEND == "sql":
+    startup_report.run_in_background("db_prewarm", prewarm_pools)
+
+from fastapi import Depends, FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 
+from app.admin_routes import require_admin, require_metrics_scraper, router as admin_router
 from app.api import router
 from app.auth_routes import router as auth_router
+from app.compression import CompressionMiddleware
+from app.db_async import async_engine, async_read_engine, prewarm_async_pools
+from app.database import memory_db
 from app.db_init import init_db
+from app.migrations import upgrade as run_migrations
+from app.http_cache import ETAG_HEADER
+from app.metrics import PROMETHEUS_CONTENT_TYPE, registry
+from app.pagination import NEXT_CURSOR_HEADER
+from app.passwords import password_hasher
+from app.rate_limit import RATE_LIMIT_ENABLED, RateLimitMiddleware, rate_limiter
+from app.tokens import token_verifier
+from app.tracing import TRACE_ID_HEADER, TracingMiddleware, trace_exporter
+from app.translation import translator
+from app.translation_jobs import TRANSLATION_ASYNC, job_queue
+
+# Schema setup on startup: "create_all" (development), "migrate" or "off".
+DB_INIT_MODE = os.getenv("DB_INIT_MODE", "create_all")
+
+startup_report.record("import", startup_report.elapsed())
 
 app = FastAPI(title="Parallel Diary API", description="API for Japanese-English diary application")
 
+# Added before CORS so that 429 replies still carry CORS headers.
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
 # Disable CORS. Do not remove this for full-stack development.
 app.add_middleware(
     CORSMiddleware,
@@ -16,18 +51,153 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=[NEXT_CURSOR_HEADER, ETAG_HEADER, TRACE_ID_HEADER, "Retry-After"],
 )
 
 app.add_middleware(SessionMiddleware, secret_key=os.getenv("SESSION_SECRET_KEY"))
 
+app.add_middleware(CompressionMiddleware)
+
+# Outermost, so request latency includes every other middleware.
+app.add_middleware(TracingMiddleware, exporter=trace_exporter)
+
 app.include_router(router, prefix="/api")
 app.include_router(auth_router, prefix="/auth")
+app.include_router(admin_router, prefix="/admin")
+
+_async_prewarm_task = None
+
+
+async def _prewarm_async_pools():
+    try:
+        with startup_report.phase("async_db_prewarm"):
+            await prewarm_async_pools()
+    except Exception as e:
+        startup_report.record_failure("async_db_prewarm", e)
+
+
+def _warm_up():
+    password_hasher.warm_up()
+    token_verifier.warm_up()
+    translator.warm_up()
+
+
+_database_prepared = False
+
+
+def prepare_database():
+    """Prepare the schema as DB_INIT_MODE says, once; forked workers inherit that it is done."""
+    global _database_prepared
+    if _database_prepared:
+        return
+    _database_prepared = True
+    if STORAGE_BACKEND == "memory":
+        print("Using in-memory storage; nothing is persisted.")
+    elif DB_INIT_MODE == "create_all":
+        with startup_report.phase("init_db"):
+            init_db()
+        print("Database initialized successfully.")
+    elif DB_INIT_MODE == "migrate":
+        with startup_report.phase("migrate"):
+            run_migrations()
+
 
 @app.on_event("startup")
 async def startup_event():
-    init_db()
-    print("Database initialized successfully.")
+    global _async_prewarm_task
+    if async_engine is not None:
+        _async_prewarm_task = asyncio.create_task(_prewarm_async_pools())
+    prepare_database()
+    if TRANSLATION_ASYNC:
+        with startup_report.phase("job_queue"):
+            await job_queue.start()
+    startup_report.finish()
+    print(f"Started in {startup_report.total_seconds():.3f}s (budget {startup_report.budget_seconds}s)")
+    if STARTUP_WARM_UP:
+        startup_report.run_in_background("warm_up", _warm_up)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Warm-up may still be creating the pools stopped below.
+    startup_report.join()
+    if _async_prewarm_task is not None:
+        _async_prewarm_task.cancel()
+    if TRANSLATION_ASYNC:
+        await job_queue.stop()
+    translator.shutdown()
+    password_hasher.shutdown()
+    if trace_exporter is not None:
+        trace_exporter.shutdown()
+    if async_engine is not None:
+        await async_engine.dispose()
+        if async_read_engine is not async_engine:
+            await async_read_engine.dispose()
+
+def _pool_stats():
+    if STORAGE_BACKEND == "memory":
+        return {}
+    pools = {"primary": pool_stats(engine)}
+    if read_engine is not engine:
+        pools["replica"] = pool_stats(read_engine)
+    if async_engine is not None:
+        pools["async_primary"] = pool_stats(async_engine)
+        if async_read_engine is not async_engine:
+            pools["async_replica"] = pool_stats(async_read_engine)
+    return pools
+
+
+registry.gauge_callback(
+    "db_pool", "Connection pool usage and checkout wait counters.", ("pool", "stat"),
+    lambda: [
+        ((pool, stat), value)
+        for pool, stats in _pool_stats().items()
+        for stat, value in stats.items() if isinstance(value, (int, float))
+    ],
+)
+registry.gauge_callback(
+    "translation_cache", "Translation cache counters and size.", ("stat",),
+    lambda: [((stat,), value) for stat, value in translator.cache.stats().items()],
+)
+registry.gauge_callback(
+    "translation_backend_circuit_open", "1 while a translation backend's circuit is not closed.", ("backend",),
+    lambda: [((name,), int(stats["state"] != "closed")) for name, stats in translator.backend_stats().items()],
+)
+registry.gauge_callback(
+    "auth_token_cache_entries", "Verified bearer tokens held in the cache.", (),
+    lambda: [((), len(token_verifier.cache))],
+)
+registry.gauge_callback(
+    "startup_phase_seconds", "Duration of each import and startup phase of this process.", ("phase",),
+    lambda: [((phase,), seconds) for phase, seconds in startup_report.report()["phases"].items()],
+)
+registry.gauge_callback(
+    "password_hash_pending", "Password hashes queued or running.", (),
+    lambda: [((), password_hasher.stats()["pending"])],
+)
+
 
 @app.get("/healthz")
 async def healthz():
     return {"status": "ok"}
+
+
+@app.get("/admin/stats", dependencies=[Depends(require_admin)])
+async def admin_stats():
+    """This process's startup report, caches, pools and limiters."""
+    return {
+        "startup": startup_report.report(),
+        "translation_cache": translator.cache.stats(),
+        "db_pool": _pool_stats(),
+        "storage": {"backend": STORAGE_BACKEND, **(memory_db.stats() if STORAGE_BACKEND == "memory" else {})},
+        "password_hashing": password_hasher.stats(),
+        "rate_limits": rate_limiter.stats(),
+        "auth_tokens": token_verifier.stats(),
+        "translation_budget": translator.call_budget.stats(),
+        "translation_backends": translator.backend_stats(),
+    }
+
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_metrics_scraper)])
+async def metrics():
+    """Prometheus metrics."""
+    return PlainTextResponse(registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,62 @@
+"""Versioned schema migrations: python -m app.migrations upgrade|status."""
+import importlib
+import pkgutil
+from types import ModuleType
+from typing import List, Set, Tuple
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, inspect, select
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.sql import func
+
+from app.db_config import engine as default_engine
+from app.migrations import versions
+
+migration_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    migration_metadata,
+    Column("version", String, primary_key=True),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+
+def load_migrations() -> List[Tuple[str, ModuleType]]:
+    """Return (revision, module) pairs for every migration, in order."""
+    migrations = []
+    for module_info in pkgutil.iter_modules(versions.__path__):
+        revision = module_info.name.split("_", 1)[0]
+        module = importlib.import_module(f"{versions.__name__}.{module_info.name}")
+        migrations.append((revision, module))
+    return sorted(migrations, key=lambda migration: migration[0])
+
+
+def applied_revisions(connection: Connection) -> Set[str]:
+    """Return the revisions already recorded in schema_migrations."""
+    if not inspect(connection).has_table(schema_migrations.name):
+        return set()
+    return set(connection.execute(select(schema_migrations.c.version)).scalars())
+
+
+def upgrade(engine: Engine = default_engine) -> List[str]:
+    """Apply every pending migration, each in its own transaction."""
+    migration_metadata.create_all(bind=engine)
+
+    applied: List[str] = []
+    for revision, module in load_migrations():
+        with engine.begin() as connection:
+            if revision in applied_revisions(connection):
+                continue
+            module.upgrade(connection)
+            connection.execute(schema_migrations.insert().values(version=revision))
+        applied.append(revision)
+        print(f"Applied migration {revision}: {module.description}")
+
+    return applied
+
+
+def status(engine: Engine = default_engine) -> List[Tuple[str, str, bool]]:
+    """Return (revision, description, applied) for every migration."""
+    with engine.connect() as connection:
+        done = applied_revisions(connection)
+    return [(revision, module.description, revision in done) for revision, module in load_migrations()]
@@ -0,0 +1,24 @@
+import sys
+
+from app.migrations import status, upgrade
+
+
+def main(argv=None):
+    args = sys.argv[1:] if argv is None else argv
+    command = args[0] if args else "upgrade"
+
+    if command == "upgrade":
+        applied = upgrade()
+        if not applied:
+            print("Database schema is up to date.")
+    elif command == "status":
+        for revision, description, done in status():
+            print(f"[{'x' if done else ' '}] {revision} {description}")
+    else:
+        print(f"Unknown command: {command}. Use 'upgrade' or 'status'.", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
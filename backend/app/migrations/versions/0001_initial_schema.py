@@ -0,0 +1,56 @@
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, MetaData, String, Table, Text
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql import func
+
+description = "Create the tables that existed before migrations"
+
+# Frozen copy of the schema at this revision; later columns and indexes are added by later migrations.
+metadata = MetaData()
+
+Table(
+    "users",
+    metadata,
+    Column("id", String, primary_key=True),
+    Column("email", String, unique=True, index=True, nullable=False),
+    Column("hashed_password", String, nullable=False),
+    Column("name", String, nullable=True),
+    Column("picture", String, nullable=True),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Column("is_active", Boolean),
+)
+
+Table(
+    "diary_entries",
+    metadata,
+    Column("id", String, primary_key=True),
+    Column("content", Text, nullable=False),
+    Column("translated_content", Text, nullable=False),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Column("updated_at", DateTime(timezone=True)),
+    Column("user_id", String, ForeignKey("users.id"), nullable=False),
+)
+
+Table(
+    "favorite_expressions",
+    metadata,
+    Column("id", String, primary_key=True),
+    Column("japanese_text", Text, nullable=False),
+    Column("english_text", Text, nullable=False),
+    Column("note", Text, nullable=True),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Column("diary_entry_id", String, ForeignKey("diary_entries.id"), nullable=False),
+)
+
+Table(
+    "translation_cache",
+    metadata,
+    Column("key", String(64), primary_key=True),
+    Column("source_lang", String, nullable=False),
+    Column("target_lang", String, nullable=False),
+    Column("translated_text", Text, nullable=False),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+
+def upgrade(connection: Connection) -> None:
+    metadata.create_all(bind=connection)
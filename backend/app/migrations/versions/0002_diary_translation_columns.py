@@ -0,0 +1,16 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+description = "Add translated_segments and translation_status to diary_entries"
+
+
+def upgrade(connection: Connection) -> None:
+    columns = {column["name"] for column in inspect(connection).get_columns("diary_entries")}
+    if "translated_segments" not in columns:
+        connection.execute(text("ALTER TABLE diary_entries ADD COLUMN translated_segments JSON"))
+
+    if "translation_status" not in columns:
+        connection.execute(text(
+            "ALTER TABLE diary_entries ADD COLUMN translation_status VARCHAR "
+            "NOT NULL DEFAULT 'completed'"
+        ))
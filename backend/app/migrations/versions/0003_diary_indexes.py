@@ -0,0 +1,24 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+description = "Index diary entries by (user_id, created_at DESC, id DESC) and favorites by diary_entry_id"
+
+INDEXES = {
+    "diary_entries": (
+        "ix_diary_entries_user_id_created_at",
+        "(user_id, created_at DESC, id DESC)",
+    ),
+    "favorite_expressions": (
+        "ix_favorite_expressions_diary_entry_id",
+        "(diary_entry_id)",
+    ),
+}
+
+
+def upgrade(connection: Connection) -> None:
+    inspector = inspect(connection)
+
+    for table, (name, columns) in INDEXES.items():
+        existing = {index["name"] for index in inspector.get_indexes(table)}
+        if name not in existing:
+            connection.execute(text(f"CREATE INDEX {name} ON {table} {columns}"))
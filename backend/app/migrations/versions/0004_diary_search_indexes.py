@@ -0,0 +1,24 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+description = "Add pg_trgm GIN indexes for diary search (PostgreSQL only)"
+
+INDEXES = {
+    "ix_diary_entries_content_trgm": "content",
+    "ix_diary_entries_translated_content_trgm": "translated_content",
+}
+
+
+def upgrade(connection: Connection) -> None:
+    if connection.dialect.name != "postgresql":
+        # Other databases use the in-process search index.
+        return
+
+    connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+    existing = {index["name"] for index in inspect(connection).get_indexes("diary_entries")}
+    for name, column in INDEXES.items():
+        if name not in existing:
+            connection.execute(text(
+                f"CREATE INDEX {name} ON diary_entries USING gin ({column} gin_trgm_ops)"
+            ))
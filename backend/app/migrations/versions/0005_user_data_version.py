@@ -0,0 +1,10 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+description = "Add data_version to users for HTTP cache validation"
+
+
+def upgrade(connection: Connection) -> None:
+    columns = {column["name"] for column in inspect(connection).get_columns("users")}
+    if "data_version" not in columns:
+        connection.execute(text("ALTER TABLE users ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0"))
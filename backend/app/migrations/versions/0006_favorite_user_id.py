@@ -0,0 +1,30 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+description = "Denormalize user_id onto favorite_expressions and index it by (user_id, created_at DESC, id DESC)"
+
+INDEX_NAME = "ix_favorite_expressions_user_id_created_at"
+
+
+def upgrade(connection: Connection) -> None:
+    inspector = inspect(connection)
+
+    columns = {column["name"] for column in inspector.get_columns("favorite_expressions")}
+    if "user_id" not in columns:
+        connection.execute(text("ALTER TABLE favorite_expressions ADD COLUMN user_id VARCHAR REFERENCES users (id)"))
+
+    connection.execute(text(
+        "UPDATE favorite_expressions SET user_id = ("
+        "SELECT diary_entries.user_id FROM diary_entries WHERE diary_entries.id = favorite_expressions.diary_entry_id"
+        ") WHERE user_id IS NULL"
+    ))
+
+    if connection.dialect.name == "postgresql":
+        # SQLite cannot add NOT NULL to an existing column; the model enforces it there.
+        connection.execute(text("ALTER TABLE favorite_expressions ALTER COLUMN user_id SET NOT NULL"))
+
+    existing = {index["name"] for index in inspector.get_indexes("favorite_expressions")}
+    if INDEX_NAME not in existing:
+        connection.execute(text(
+            f"CREATE INDEX {INDEX_NAME} ON favorite_expressions (user_id, created_at DESC, id DESC)"
+        ))
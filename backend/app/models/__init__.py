@@ -1,2 +1,3 @@
 from app.models.user import User
 from app.models.diary import DiaryEntry, FavoriteExpression
+from app.models.translation import TranslationCacheEntry
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Text
+from sqlalchemy import Column, String, DateTime, ForeignKey, Text, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from typing import List, Optional
@@ -7,6 +7,10 @@ from sqlalchemy.ext.declarative import declarative_base
 from app.db_config import Base
 from app.models.base import generate_uuid
 
+TRANSLATION_PENDING = "pending"
+TRANSLATION_COMPLETED = "completed"
+TRANSLATION_FAILED = "failed"
+
 class DiaryEntry(Base):
     """Diary entry model."""
     __tablename__ = "diary_entries"
@@ -14,6 +18,8 @@ class DiaryEntry(Base):
     id = Column(String, primary_key=True, default=generate_uuid)
     content = Column(Text, nullable=False)
     translated_content = Column(Text, nullable=False)
+    translated_segments = Column(JSON, nullable=True)
+    translation_status = Column(String, nullable=False, default=TRANSLATION_COMPLETED, server_default=TRANSLATION_COMPLETED)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -33,6 +39,25 @@ class FavoriteExpression(Base):
     note = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
-    diary_entry_id = Column(String, ForeignKey("diary_entries.id"), nullable=False)
+    diary_entry_id = Column(String, ForeignKey("diary_entries.id"), nullable=False, index=True)
+    # Copied from the entry on insert, so listing a user's favorites needs no join.
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
     
     diary_entry = relationship("DiaryEntry", back_populates="favorite_expressions")
+
+
+# Serves the per-user listing, which orders by (created_at, id).
+Index(
+    "ix_diary_entries_user_id_created_at",
+    DiaryEntry.user_id,
+    DiaryEntry.created_at.desc(),
+    DiaryEntry.id.desc()
+)
+
+# Serves the per-user favorites listing, which also orders by (created_at, id).
+Index(
+    "ix_favorite_expressions_user_id_created_at",
+    FavoriteExpression.user_id,
+    FavoriteExpression.created_at.desc(),
+    FavoriteExpression.id.desc()
+)
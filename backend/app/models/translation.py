@@ -0,0 +1,15 @@
+from sqlalchemy import Column, String, DateTime, Text
+from sqlalchemy.sql import func
+
+from app.db_config import Base
+
+
+class TranslationCacheEntry(Base):
+    """Persistent translation cache model keyed by a hash of the source text."""
+    __tablename__ = "translation_cache"
+
+    key = Column(String(64), primary_key=True)
+    source_lang = Column(String, nullable=False)
+    target_lang = Column(String, nullable=False)
+    translated_text = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Boolean
+from sqlalchemy import Column, String, DateTime, Boolean, Integer
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -16,5 +16,7 @@ class User(Base):
     picture = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     is_active = Column(Boolean, default=True)
+    # Bumped by every diary or favorites write; ETags are derived from it.
+    data_version = Column(Integer, nullable=False, default=0, server_default="0")
     
     diary_entries = relationship("DiaryEntry", back_populates="user", cascade="all, delete-orphan")
@@ -0,0 +1,146 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+# Imported by the hashing worker processes, so no database or app imports.
+
+# Stale hashes are rehashed at their owner's next login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# "process" hashes on every core; "thread" saves the worker processes' memory.
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "process")
+# Server processes, as set by app.server, gunicorn or uvicorn --workers.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# Hashing workers per server process; the CPUs are shared out between server processes.
+PASSWORD_HASH_WORKERS = int(os.getenv(
+    "PASSWORD_HASH_WORKERS", str(max((os.cpu_count() or 1) // max(WEB_CONCURRENCY, 1), 1))
+))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+PASSWORD_HASH_RETRY_AFTER_SECONDS = int(os.getenv("PASSWORD_HASH_RETRY_AFTER_SECONDS", "2"))
+
+_pwd_context = None
+_pwd_context_lock = threading.Lock()
+
+
+def get_pwd_context():
+    """The shared CryptContext, created (and passlib imported) on first use."""
+    global _pwd_context
+    if _pwd_context is None:
+        with _pwd_context_lock:
+            if _pwd_context is None:
+                from passlib.context import CryptContext
+
+                _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+    return _pwd_context
+
+
+def hash_password(password: str) -> str:
+    """Hash a password with the current CryptContext settings."""
+    return get_pwd_context().hash(password)
+
+
+def verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password, returning a new hash if the stored one uses outdated settings."""
+    return get_pwd_context().verify_and_update(password, hashed_password)
+
+
+class PasswordHasher:
+    """Runs bcrypt off the event loop in a bounded worker pool, answering 503 past max_pending."""
+
+    def __init__(
+        self,
+        executor: str = PASSWORD_HASH_EXECUTOR,
+        workers: int = PASSWORD_HASH_WORKERS,
+        max_pending: int = PASSWORD_HASH_MAX_PENDING,
+        retry_after_seconds: int = PASSWORD_HASH_RETRY_AFTER_SECONDS,
+    ):
+        if executor not in ("process", "thread"):
+            raise ValueError(f"Unknown password hash executor: {executor}")
+        self.executor = executor
+        self.workers = workers
+        self.max_pending = max_pending
+        self.retry_after_seconds = retry_after_seconds
+        self.pending = 0
+        self.rejected = 0
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+
+    async def hash(self, password: str) -> str:
+        """Hash a password in the worker pool."""
+        return await self._submit(hash_password, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verify a password in the worker pool. See verify_and_update."""
+        return await self._submit(verify_and_update, password, hashed_password)
+
+    async def _submit(self, func: Callable, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many sign-in requests. Please try again shortly.",
+                    headers={"Retry-After": str(self.retry_after_seconds)},
+                )
+            self.pending += 1
+
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool for the next request.
+            with self._lock:
+                self._executor = None
+            raise
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.executor == "process":
+                    # spawn: forking a process with running threads is unsafe.
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn")
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers,
+                        thread_name_prefix="password-hash"
+                    )
+            return self._executor
+
+    def warm_up(self) -> None:
+        """Load the CryptContext and start the worker pool before the first sign-in."""
+        get_pwd_context()
+        executor = self._get_executor()
+        if self.executor == "process":
+            # Each worker imports this module and passlib on its first job.
+            for _ in range(self.workers):
+                executor.submit(get_pwd_context)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "executor": self.executor,
+                "workers": self.workers,
+                "pending": self.pending,
+                "max_pending": self.max_pending,
+                "rejected": self.rejected,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,320 @@
+import fnmatch
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from jose import JWTError
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.tokens import token_verifier
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# "memory" keeps buckets per process; "redis" shares them between processes and machines.
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Header with the client address behind a proxy, e.g. Fly-Client-IP; empty uses the peer address.
+RATE_LIMIT_CLIENT_IP_HEADER = os.getenv("RATE_LIMIT_CLIENT_IP_HEADER", "")
+# ";"-separated "METHOD path=requests/seconds[@ip]" rules, keyed by user id unless @ip.
+RATE_LIMIT_RULES = os.getenv(
+    "RATE_LIMIT_RULES",
+    "POST /api/diary=30/60;"
+    "PUT /api/diary/*=30/60;"
+    "POST /api/diary/batch=5/60;"
+    "POST /api/diary/import=5/3600;"
+    "POST /auth/login=10/60@ip;"
+    "POST /auth/register=5/3600@ip;"
+    "* /api/*=600/60"
+)
+EXEMPT_PATHS = ("/healthz", "/metrics")
+
+
+class TokenBucket:
+    """Thread-safe token bucket for budgets enforced inside one process."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.rejected = 0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout: float = 0.0) -> bool:
+        """Take one token, waiting up to timeout seconds for one to refill."""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self.acquired += 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+                if now + wait > deadline:
+                    self.rejected += 1
+                    return False
+            time.sleep(wait)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "rate": self.rate,
+                "capacity": self.capacity,
+                "tokens": round(self._tokens, 2),
+                "acquired": self.acquired,
+                "rejected": self.rejected,
+            }
+
+
+# A bucket to charge: (key, capacity, refill rate per second).
+Bucket = Tuple[str, float, float]
+
+
+class TokenBucketStore:
+    """Where request buckets live. take() charges every bucket or none, returning each one's wait."""
+
+    async def take(self, buckets: Sequence[Bucket], cost: float = 1) -> List[float]:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, int]:
+        return {}
+
+
+class InMemoryTokenBucketStore(TokenBucketStore):
+    """Per-process buckets, least recently used first out beyond max_keys."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def take(self, buckets: Sequence[Bucket], cost: float = 1) -> List[float]:
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            for key, capacity, rate in buckets:
+                tokens, updated = self._buckets.pop(key, (capacity, now))
+                levels.append(min(capacity, tokens + (now - updated) * rate))
+            waits = [
+                0.0 if tokens >= cost else (cost - tokens) / rate
+                for tokens, (key, capacity, rate) in zip(levels, buckets)
+            ]
+            charge = cost if not any(waits) else 0
+            for tokens, (key, capacity, rate) in zip(levels, buckets):
+                self._buckets[key] = (tokens - charge, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return waits
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"keys": len(self._buckets)}
+
+
+# Charges every bucket or none, atomically and by the Redis clock. ARGV: cost, then capacity and rate per key.
+REDIS_TAKE_SCRIPT = """
+local cost = tonumber(ARGV[1])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local levels = {}
+local waits = {}
+local allowed = true
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i])
+    local rate = tonumber(ARGV[2 * i + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'updated')
+    local tokens = tonumber(state[1]) or capacity
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+    levels[i] = tokens
+    waits[i] = '0'
+    if tokens < cost then
+        waits[i] = tostring((cost - tokens) / rate)
+        allowed = false
+    end
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i])
+    local rate = tonumber(ARGV[2 * i + 1])
+    local tokens = levels[i]
+    if allowed then
+        tokens = tokens - cost
+    end
+    redis.call('HSET', key, 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+end
+return waits
+"""
+
+
+class RedisTokenBucketStore(TokenBucketStore):
+    """Buckets shared through Redis. Needs the redis package."""
+
+    def __init__(self, url: str = RATE_LIMIT_REDIS_URL, prefix: str = "ratelimit:"):
+        import redis.asyncio as redis
+
+        self.prefix = prefix
+        self._client = redis.from_url(url)
+        self._script = self._client.register_script(REDIS_TAKE_SCRIPT)
+
+    async def take(self, buckets: Sequence[Bucket], cost: float = 1) -> List[float]:
+        args: List[float] = [cost]
+        for key, capacity, rate in buckets:
+            args += [capacity, rate]
+        waits = await self._script(keys=[self.prefix + key for key, capacity, rate in buckets], args=args)
+        return [float(wait) for wait in waits]
+
+
+def create_store(backend: str = RATE_LIMIT_BACKEND) -> TokenBucketStore:
+    """Create the bucket store for the configured backend."""
+    if backend == "memory":
+        return InMemoryTokenBucketStore()
+    if backend == "redis":
+        return RedisTokenBucketStore()
+    raise ValueError(f"Unknown rate limit backend: {backend}")
+
+
+class RateLimitRule:
+    """A budget of `requests` per `seconds` for requests matching method and path."""
+
+    def __init__(self, method: str, path: str, requests: int, seconds: float, by_ip: bool = False):
+        self.method = method.upper()
+        self.path = path
+        self.capacity = float(requests)
+        self.rate = requests / seconds
+        self.by_ip = by_ip
+        self.name = f"{self.method} {path}"
+        self.allowed = 0
+        self.limited = 0
+
+    def matches(self, method: str, path: str) -> bool:
+        return self.method in ("*", method) and fnmatch.fnmatchcase(path, self.path)
+
+
+def parse_rules(spec: str) -> List[RateLimitRule]:
+    """Parse RATE_LIMIT_RULES, e.g. "POST /auth/login=10/60@ip;* /api/*=600/60"."""
+    rules = []
+    for item in spec.split(";"):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            route, budget = item.rsplit("=", 1)
+            method, path = route.split()
+            by_ip = budget.endswith("@ip")
+            requests, seconds = budget.removesuffix("@ip").split("/")
+            rules.append(RateLimitRule(method, path, int(requests), float(seconds), by_ip))
+        except ValueError:
+            raise ValueError(f"Invalid rate limit rule: {item!r}")
+    return rules
+
+
+class RateLimiter:
+    """Charges every matching rule's bucket for a request, or none if one is spent."""
+
+    def __init__(self, rules: List[RateLimitRule], store: Optional[TokenBucketStore] = None):
+        self.rules = rules
+        self.store = store if store is not None else create_store()
+        self.store_errors = 0
+
+    async def check(self, method: str, path: str, user_id: Optional[str], client_ip: str) -> Tuple[bool, float]:
+        """Return (allowed, retry_after seconds) for a request."""
+        rules = [rule for rule in self.rules if rule.matches(method, path)]
+        if not rules:
+            return True, 0.0
+
+        buckets = []
+        for rule in rules:
+            subject = f"ip:{client_ip}" if rule.by_ip or user_id is None else f"user:{user_id}"
+            buckets.append((f"{rule.name}|{subject}", rule.capacity, rule.rate))
+        try:
+            waits = await self.store.take(buckets)
+        except Exception as e:
+            # Fail open: an unreachable shared store must not take the API down.
+            self.store_errors += 1
+            print(f"Rate limit store error: {e!r}")
+            return True, 0.0
+
+        if any(waits):
+            for rule, wait in zip(rules, waits):
+                if wait:
+                    rule.limited += 1
+            return False, max(waits)
+        for rule in rules:
+            rule.allowed += 1
+        return True, 0.0
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "backend": type(self.store).__name__,
+            "store": self.store.stats(),
+            "store_errors": self.store_errors,
+            "rules": {rule.name: {"allowed": rule.allowed, "limited": rule.limited} for rule in self.rules},
+        }
+
+
+def user_id_from_headers(headers: Headers) -> Optional[str]:
+    """The `sub` of a valid bearer token, or None. Does not touch the database."""
+    authorization = headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        # Revoked tokens still count against their user; the route rejects them.
+        digest, kid, claims = token_verifier.decode(token)
+        return claims.get("sub")
+    except JWTError:
+        return None
+
+
+def client_ip(scope: Scope, headers: Headers) -> str:
+    if RATE_LIMIT_CLIENT_IP_HEADER:
+        forwarded = headers.get(RATE_LIMIT_CLIENT_IP_HEADER)
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class RateLimitMiddleware:
+    """Answers 429 with Retry-After once a client has spent a route's budget."""
+
+    def __init__(self, app: ASGIApp, limiter: "RateLimiter"):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        allowed, retry_after = await self.limiter.check(
+            scope["method"], scope["path"], user_id_from_headers(headers), client_ip(scope, headers)
+        )
+        if allowed:
+            await self.app(scope, receive, send)
+            return
+
+        response = JSONResponse(
+            {"detail": "Too many requests. Please slow down."},
+            status_code=429,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+        await response(scope, receive, send)
+
+
+rate_limiter = RateLimiter(parse_rules(RATE_LIMIT_RULES))
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Literal, Optional
 from pydantic import BaseModel
 
 class FavoriteExpressionBase(BaseModel):
@@ -24,9 +24,13 @@ class DiaryEntryBase(BaseModel):
 class DiaryEntryCreate(DiaryEntryBase):
     pass
 
+class DiaryEntryBatchCreate(BaseModel):
+    entries: List[DiaryEntryCreate]
+
 class DiaryEntry(DiaryEntryBase):
     id: str
     translated_content: str
+    translation_status: str = "completed"
     created_at: datetime
     updated_at: Optional[datetime] = None
     favorite_expressions: List[FavoriteExpression] = []
@@ -34,6 +38,28 @@ class DiaryEntry(DiaryEntryBase):
     class Config:
         from_attributes = True
 
+class DiaryEntryImport(DiaryEntryBase):
+    """One NDJSON line of POST /diary/import; exported lines are accepted as they are."""
+    translated_content: Optional[str] = None
+    translated_segments: Optional[List[List[Optional[str]]]] = None
+    translation_status: Optional[Literal["pending", "completed", "failed"]] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    favorite_expressions: List[FavoriteExpressionCreate] = []
+
+class DiaryEntryListItem(BaseModel):
+    """Diary entry in list responses, where `fields=` may leave out attributes."""
+    id: str
+    created_at: datetime
+    content: Optional[str] = None
+    translated_content: Optional[str] = None
+    translation_status: Optional[str] = None
+    updated_at: Optional[datetime] = None
+    favorite_expressions: Optional[List[FavoriteExpression]] = None
+
+    class Config:
+        from_attributes = True
+
 class UserBase(BaseModel):
     email: str
     name: Optional[str] = None
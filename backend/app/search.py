@@ -0,0 +1,318 @@
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import literal, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.db_config import engine
+from app.models.diary import DiaryEntry
+
+# "postgres" (pg_trgm), "memory" (in-process index, one server process only) or "like"; "auto" picks one.
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "auto")
+# Server processes, as set by app.server, gunicorn or uvicorn --workers.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# Users the in-process index holds at once; the least recently searched are dropped.
+SEARCH_INDEX_MAX_USERS = int(os.getenv("SEARCH_INDEX_MAX_USERS", "1000"))
+
+# Runs of Japanese script (kana, ー, CJK ideographs) and of Latin letters/digits.
+CJK_RUN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+WORD_RUN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(value: str, for_query: bool = False) -> List[str]:
+    """Tokenize mixed text: Japanese runs into bigrams (and unigrams for documents), Latin text into words."""
+    normalized = unicodedata.normalize("NFKC", value).lower()
+    tokens: List[str] = []
+
+    for match in CJK_RUN.finditer(normalized):
+        run = match.group()
+        if len(run) == 1 or not for_query:
+            tokens.extend(run)
+        if len(run) > 1:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+
+    tokens.extend(WORD_RUN.findall(normalized))
+    return tokens
+
+
+class InMemorySearchIndex:
+    """Per-process inverted index over diary content and translations, loaded per user on first search."""
+
+    def __init__(self, max_users: Optional[int] = None):
+        self.max_users = max_users
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_tokens: Dict[str, Counter] = {}
+        self._doc_owner: Dict[str, str] = {}
+        self._user_docs: Dict[str, Set[str]] = {}
+        self._loaded_users: OrderedDict[str, None] = OrderedDict()
+        # Writes seen for users whose entries are being read, see begin_load.
+        self._loading: Dict[str, int] = {}
+        self._lock = threading.RLock()
+
+    def index_entry(self, entry_id: str, user_id: str, content: str, translated_content: str) -> None:
+        """Add or replace an entry in the index."""
+        with self._lock:
+            if user_id not in self._loaded_users:
+                self._missed_write(user_id)
+                return
+            self._remove(entry_id)
+
+            counts = Counter(tokenize(content or "") + tokenize(translated_content or ""))
+            self._doc_tokens[entry_id] = counts
+            self._doc_owner[entry_id] = user_id
+            self._user_docs.setdefault(user_id, set()).add(entry_id)
+            for token, count in counts.items():
+                self._postings.setdefault(token, {})[entry_id] = count
+
+    def remove_entry(self, entry_id: str, user_id: str) -> None:
+        """Drop an entry from the index."""
+        with self._lock:
+            if user_id not in self._loaded_users:
+                self._missed_write(user_id)
+                return
+            self._remove(entry_id)
+
+    def _missed_write(self, user_id: str) -> None:
+        if user_id in self._loading:
+            self._loading[user_id] += 1
+
+    def _remove(self, entry_id: str) -> None:
+        counts = self._doc_tokens.pop(entry_id, None)
+        if counts is None:
+            return
+
+        user_id = self._doc_owner.pop(entry_id)
+        self._user_docs.get(user_id, set()).discard(entry_id)
+        for token in counts:
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(entry_id, None)
+                if not postings:
+                    del self._postings[token]
+
+    def is_loaded(self, user_id: str) -> bool:
+        """Whether this process has loaded the user's entries."""
+        with self._lock:
+            if user_id not in self._loaded_users:
+                return False
+            self._loaded_users.move_to_end(user_id)
+            return True
+
+    def begin_load(self, user_id: str) -> Optional[int]:
+        """Start reading a user's rows; returns the generation to pass to load_user, or None if loaded."""
+        with self._lock:
+            if self.is_loaded(user_id):
+                return None
+            return self._loading.setdefault(user_id, 0)
+
+    def load_user(self, user_id: str, rows: Iterable[Tuple[str, str, str]], generation: Optional[int] = None) -> bool:
+        """Index a user's (id, content, translated_content) rows; False if written to since begin_load."""
+        with self._lock:
+            if user_id in self._loaded_users:
+                return True
+            if generation is not None and self._loading.get(user_id, 0) != generation:
+                return False
+            self._loading.pop(user_id, None)
+            self._loaded_users[user_id] = None
+            for entry_id, content, translated_content in rows:
+                self.index_entry(entry_id, user_id, content, translated_content)
+            while self.max_users is not None and len(self._loaded_users) > self.max_users:
+                self.unload_user(next(iter(self._loaded_users)))
+            return True
+
+    def unload_user(self, user_id: str) -> None:
+        """Forget a user's entries so the next search reloads them from the database."""
+        with self._lock:
+            self._missed_write(user_id)
+            self._loaded_users.pop(user_id, None)
+            for entry_id in list(self._user_docs.pop(user_id, ())):
+                self._remove(entry_id)
+
+    def ensure_user_loaded(self, db: Session, user_id: str) -> None:
+        """Load a user's entries into the index if this process has not yet done so."""
+        while True:
+            generation = self.begin_load(user_id)
+            if generation is None:
+                return
+            if self.load_user(user_id, db.execute(user_documents_statement(user_id)).all(), generation):
+                return
+
+    def search(self, user_id: str, query: str, limit: int, offset: int) -> List[Tuple[str, float]]:
+        """Return (entry_id, score) pairs for entries containing every query token, by TF-IDF."""
+        tokens = list(dict.fromkeys(tokenize(query, for_query=True)))
+        if not tokens:
+            return []
+
+        with self._lock:
+            user_docs = self._user_docs.get(user_id, set())
+            total = len(user_docs) or 1
+
+            candidates: Optional[Set[str]] = None
+            for token in sorted(tokens, key=lambda t: len(self._postings.get(t, {}))):
+                matching = user_docs.intersection(self._postings.get(token, {}))
+                candidates = matching if candidates is None else candidates & matching
+                if not candidates:
+                    return []
+
+            idf = {
+                token: 1 + math.log(total / len(user_docs.intersection(self._postings[token])))
+                for token in tokens
+            }
+
+            scores = []
+            for entry_id in candidates:
+                counts = self._doc_tokens[entry_id]
+                length = sum(counts.values()) or 1
+                score = sum((counts[token] / length) * idf[token] for token in tokens)
+                scores.append((entry_id, score))
+
+        scores.sort(key=lambda item: (-item[1], item[0]))
+        return scores[offset:offset + limit]
+
+
+def user_documents_statement(user_id: str):
+    """SELECT of the columns the in-process index needs for one user."""
+    return (
+        select(DiaryEntry.id, DiaryEntry.content, DiaryEntry.translated_content)
+        .where(DiaryEntry.user_id == user_id)
+    )
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+POSTGRES_SEARCH_SQL = text(
+    "SELECT id, GREATEST(similarity(content, :q), similarity(translated_content, :q)) AS score "
+    "FROM diary_entries "
+    "WHERE user_id = :user_id AND (content ILIKE :pattern OR translated_content ILIKE :pattern) "
+    "ORDER BY score DESC, created_at DESC, id DESC "
+    "LIMIT :limit OFFSET :offset"
+)
+
+
+def postgres_search_params(user_id: str, query: str, limit: int, offset: int) -> Dict[str, object]:
+    return {
+        "q": query,
+        "pattern": f"%{_escape_like(query)}%",
+        "user_id": user_id,
+        "limit": limit,
+        "offset": offset,
+    }
+
+
+PG_TRGM_INSTALLED_SQL = text("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")
+
+# Whether PostgreSQL has pg_trgm, looked up on the first search.
+_trigram_installed: Optional[bool] = None
+
+
+def _note_trigram_installed(installed: bool) -> bool:
+    global _trigram_installed
+    if not installed:
+        print("pg_trgm is not installed; diary search falls back to ILIKE without ranking")
+    _trigram_installed = installed
+    return installed
+
+
+def like_search_statement(user_id: str, query: str, limit: int, offset: int):
+    """Unranked case-insensitive substring search, newest entries first."""
+    pattern = f"%{_escape_like(query)}%"
+    return (
+        select(DiaryEntry.id, literal(1.0).label("score"))
+        .where(
+            DiaryEntry.user_id == user_id,
+            or_(
+                DiaryEntry.content.ilike(pattern, escape="\\"),
+                DiaryEntry.translated_content.ilike(pattern, escape="\\"),
+            ),
+        )
+        .order_by(DiaryEntry.created_at.desc(), DiaryEntry.id.desc())
+        .limit(limit)
+        .offset(offset)
+    )
+
+
+def search_postgres(db: Session, user_id: str, query: str, limit: int, offset: int) -> List[Tuple[str, float]]:
+    """Search with ILIKE over pg_trgm GIN indexes, ranked by trigram similarity."""
+    if _trigram_installed is None:
+        _note_trigram_installed(bool(db.execute(PG_TRGM_INSTALLED_SQL).scalar()))
+    if not _trigram_installed:
+        return search_like(db, user_id, query, limit, offset)
+    rows = db.execute(POSTGRES_SEARCH_SQL, postgres_search_params(user_id, query, limit, offset)).all()
+    return [(row.id, float(row.score)) for row in rows]
+
+
+def search_like(db: Session, user_id: str, query: str, limit: int, offset: int) -> List[Tuple[str, float]]:
+    """Search with a plain ILIKE scan, for any database and any number of processes."""
+    rows = db.execute(like_search_statement(user_id, query, limit, offset)).all()
+    return [(row.id, float(row.score)) for row in rows]
+
+
+def _resolve_backend() -> str:
+    if SEARCH_BACKEND != "auto":
+        return SEARCH_BACKEND
+    if engine.dialect.name == "postgresql":
+        return "postgres"
+    return "memory" if WEB_CONCURRENCY <= 1 else "like"
+
+
+search_backend = _resolve_backend()
+search_index = InMemorySearchIndex(max_users=SEARCH_INDEX_MAX_USERS)
+
+
+def index_entry(entry_id: str, user_id: str, content: str, translated_content: str) -> None:
+    """Keep the in-process index current after an entry is written."""
+    if search_backend == "memory":
+        search_index.index_entry(entry_id, user_id, content, translated_content)
+
+
+def remove_entry(entry_id: str, user_id: str) -> None:
+    """Keep the in-process index current after an entry is deleted."""
+    if search_backend == "memory":
+        search_index.remove_entry(entry_id, user_id)
+
+
+def reindex_user(user_id: str) -> None:
+    """Drop a user from the in-process index after a bulk write, e.g. an import."""
+    if search_backend == "memory":
+        search_index.unload_user(user_id)
+
+
+def search_entries(db: Session, user_id: str, query: str, limit: int, offset: int) -> List[Tuple[str, float]]:
+    """Search a user's entries with the configured backend, best matches first."""
+    if search_backend == "postgres":
+        return search_postgres(db, user_id, query, limit, offset)
+    if search_backend == "like":
+        return search_like(db, user_id, query, limit, offset)
+
+    search_index.ensure_user_loaded(db, user_id)
+    return search_index.search(user_id, query, limit, offset)
+
+
+async def search_entries_async(db: AsyncSession, user_id: str, query: str, limit: int, offset: int) -> List[Tuple[str, float]]:
+    """Async variant of search_entries for AsyncSession."""
+    if search_backend == "postgres" and _trigram_installed is None:
+        _note_trigram_installed(bool((await db.execute(PG_TRGM_INSTALLED_SQL)).scalar()))
+    if search_backend == "postgres" and _trigram_installed:
+        result = await db.execute(POSTGRES_SEARCH_SQL, postgres_search_params(user_id, query, limit, offset))
+        return [(row.id, float(row.score)) for row in result.all()]
+    if search_backend in ("postgres", "like"):
+        result = await db.execute(like_search_statement(user_id, query, limit, offset))
+        return [(row.id, float(row.score)) for row in result.all()]
+
+    while True:
+        generation = search_index.begin_load(user_id)
+        if generation is None:
+            break
+        rows = (await db.execute(user_documents_statement(user_id))).all()
+        if await run_in_threadpool(search_index.load_user, user_id, rows, generation):
+            break
+    return await run_in_threadpool(search_index.search, user_id, query, limit, offset)
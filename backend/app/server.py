@@ -0,0 +1,279 @@
+import os
+import random
+import signal
+import sys
+import time
+import traceback
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Worker processes, 0 for one per CPU. Exported as WEB_CONCURRENCY for per-process pools.
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", os.getenv("WEB_CONCURRENCY", "0")))
+SERVER_HOST = os.getenv("HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("PORT", "8000"))
+# Restart a worker after this many requests plus some jitter; 0 never restarts.
+SERVER_MAX_REQUESTS = int(os.getenv("SERVER_MAX_REQUESTS", "0"))
+SERVER_MAX_REQUESTS_JITTER = int(os.getenv("SERVER_MAX_REQUESTS_JITTER", "0"))
+# Restart a worker whose resident memory grows past this (Linux only); 0 never does.
+SERVER_MAX_MEMORY_MB = int(os.getenv("SERVER_MAX_MEMORY_MB", "0"))
+# Seconds a stopping worker waits for in-flight requests before cancelling them.
+SERVER_GRACEFUL_TIMEOUT = int(os.getenv("SERVER_GRACEFUL_TIMEOUT", "15"))
+
+# Exit codes a worker reports its stop reason with.
+EXIT_BOOT_FAILED = 3
+EXIT_UNDRAINED = 4
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on, which can be fewer than the machine has."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def rss_megabytes(pid: int) -> Optional[float]:
+    """Resident memory of a process, or None where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+class Worker:
+    """A forked server process in one of the supervisor's slots."""
+
+    def __init__(self, index: int, pid: int):
+        self.index = index
+        self.pid = pid
+        self.started_at = time.monotonic()
+        self.stopping = False
+
+
+class Supervisor:
+    """Pre-forking launcher that serves the app from several uvicorn processes sharing one socket."""
+
+    def __init__(
+        self,
+        workers: int = SERVER_WORKERS,
+        host: str = SERVER_HOST,
+        port: int = SERVER_PORT,
+        max_requests: int = SERVER_MAX_REQUESTS,
+        max_requests_jitter: int = SERVER_MAX_REQUESTS_JITTER,
+        max_memory_mb: int = SERVER_MAX_MEMORY_MB,
+        graceful_timeout: int = SERVER_GRACEFUL_TIMEOUT,
+    ):
+        self.worker_count = workers if workers > 0 else available_cpus()
+        self.host = host
+        self.port = port
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.max_memory_mb = max_memory_mb
+        self.graceful_timeout = graceful_timeout
+        self.workers: Dict[int, Worker] = {}
+        self.socket = None
+        self.stopping = False
+        self.exit_code = 0
+
+    def run(self) -> int:
+        """Preload the app, fork the workers and supervise them until stopped."""
+        import uvicorn
+
+        os.environ["WEB_CONCURRENCY"] = str(self.worker_count)
+        from app.main import app
+        from app.startup import startup_report
+
+        problem = self._check_settings()
+        if problem is not None:
+            print(problem, file=sys.stderr)
+            return 2
+        self._prepare_fork()
+
+        self.socket = uvicorn.Config(app, host=self.host, port=self.port).bind_socket()
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        print(f"Preloaded in {startup_report.elapsed():.3f}s; starting {self.worker_count} workers")
+
+        # One worker picks up translations a previous deployment left pending.
+        for index in range(self.worker_count):
+            self._spawn(index, recover_pending=index == 0)
+
+        while not self.stopping:
+            self._reap()
+            self._check_memory()
+            time.sleep(0.5)
+
+        self._stop_workers()
+        return self.exit_code
+
+    def _check_settings(self) -> Optional[str]:
+        """Warn about per-process state; returns an error if the settings cannot work."""
+        from app.db_config import STORAGE_BACKEND
+        from app.rate_limit import RATE_LIMIT_BACKEND, RATE_LIMIT_ENABLED
+        from app.search import search_backend
+        from app.tokens import TOKEN_REVOCATION_BACKEND
+
+        if self.worker_count == 1:
+            return None
+        if STORAGE_BACKEND == "memory":
+            return "STORAGE_BACKEND=memory keeps data per process; set SERVER_WORKERS=1."
+        if RATE_LIMIT_ENABLED and RATE_LIMIT_BACKEND == "memory":
+            print("RATE_LIMIT_BACKEND=memory: each worker enforces its own limits.")
+        if TOKEN_REVOCATION_BACKEND == "memory":
+            print("TOKEN_REVOCATION_BACKEND=memory: a logout only revokes tokens in the worker that served it.")
+        if search_backend == "memory":
+            print("SEARCH_BACKEND=memory: each worker's index misses the other workers' writes.")
+        return None
+
+    def _prepare_fork(self) -> None:
+        from app.db_config import engine, read_engine
+        from app.main import prepare_database
+        from app.startup import startup_report
+
+        # Once here rather than racing in every worker's startup event.
+        prepare_database()
+
+        # Nothing may be mid-way through a lock or a connection when we fork.
+        startup_report.join()
+        startup_report.imports.uninstall()
+        engine.dispose()
+        if read_engine is not engine:
+            read_engine.dispose()
+
+    def _handle_stop(self, signum, frame) -> None:
+        self.stopping = True
+
+    def _spawn(self, index: int, recover_pending: bool = False) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                code = self._serve(recover_pending)
+            except BaseException:
+                traceback.print_exc()
+            # Exit the normal way so atexit handlers run.
+            sys.exit(code)
+
+        self.workers[pid] = Worker(index, pid)
+        print(f"Started worker {index} (pid {pid})")
+
+    def _serve(self, recover_pending: bool) -> int:
+        """Run one worker's server in the forked child; returns its exit code."""
+        import uvicorn
+
+        from app.db_async import reset_async_pools_after_fork
+        from app.db_config import STORAGE_BACKEND, prewarm_pools, reset_pools_after_fork
+        from app.main import app
+        from app.startup import startup_report
+        from app.translation_jobs import job_queue
+
+        # uvicorn re-raises the signal it stopped for, which must not kill us before we exit.
+        stop_requested = []
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda signum, frame: stop_requested.append(signum))
+
+        startup_report.forked()
+        reset_pools_after_fork()
+        reset_async_pools_after_fork()
+        job_queue.recover_pending = recover_pending
+        if STORAGE_BACKEND == "sql":
+            startup_report.run_in_background("db_prewarm", prewarm_pools)
+
+        max_requests = None
+        if self.max_requests > 0:
+            max_requests = self.max_requests + random.randint(0, self.max_requests_jitter)
+        server = uvicorn.Server(uvicorn.Config(
+            app,
+            lifespan="on",
+            limit_max_requests=max_requests,
+            timeout_graceful_shutdown=self.graceful_timeout,
+        ))
+        if stop_requested:
+            return 0
+        try:
+            server.run(sockets=[self.socket])
+        except SystemExit:
+            # uvicorn exits like this when the app fails to start.
+            return EXIT_BOOT_FAILED
+
+        if not server.started:
+            return EXIT_BOOT_FAILED
+        return 0 if job_queue.drained else EXIT_UNDRAINED
+
+    def _reap(self) -> None:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+
+            worker = self.workers.pop(pid, None)
+            if worker is None or self.stopping:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if code == EXIT_BOOT_FAILED:
+                print(f"Worker {worker.index} failed to start; shutting down", file=sys.stderr)
+                self.exit_code = 1
+                self.stopping = True
+                continue
+            if code not in (0, EXIT_UNDRAINED):
+                print(f"Worker {worker.index} (pid {pid}) exited with {code}; restarting", file=sys.stderr)
+                # Do not fork in a tight loop if it keeps dying right away.
+                if time.monotonic() - worker.started_at < 1:
+                    time.sleep(1)
+            # After a crash or an incomplete drain its translations are still pending.
+            self._spawn(worker.index, recover_pending=code != 0)
+
+    def _check_memory(self) -> None:
+        if self.max_memory_mb <= 0:
+            return
+        for worker in list(self.workers.values()):
+            if worker.stopping:
+                continue
+            rss = rss_megabytes(worker.pid)
+            if rss is not None and rss > self.max_memory_mb:
+                print(f"Worker {worker.index} (pid {worker.pid}) uses {rss:.0f} MB, over {self.max_memory_mb} MB; restarting")
+                worker.stopping = True
+                self._signal(worker.pid, signal.SIGTERM)
+
+    def _stop_workers(self) -> None:
+        from app.translation_jobs import TRANSLATION_DRAIN_SECONDS
+
+        print(f"Stopping {len(self.workers)} workers")
+        for pid in self.workers:
+            self._signal(pid, signal.SIGTERM)
+
+        deadline = time.monotonic() + self.graceful_timeout + TRANSLATION_DRAIN_SECONDS + 5
+        while self.workers and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for pid in self.workers:
+            print(f"Worker pid {pid} did not stop in time; killing it", file=sys.stderr)
+            self._signal(pid, signal.SIGKILL)
+        for pid in list(self.workers):
+            os.waitpid(pid, 0)
+        self.workers = {}
+        self.socket.close()
+
+    @staticmethod
+    def _signal(pid: int, sig: int) -> None:
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+
+def main() -> int:
+    """Run the API with SERVER_WORKERS preforked uvicorn processes."""
+    return Supervisor().run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
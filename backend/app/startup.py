@@ -0,0 +1,224 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from importlib.abc import MetaPathFinder
+from importlib.machinery import ExtensionFileLoader, SourceFileLoader, SourcelessFileLoader
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Imported first by app.main, so the clock starts before anything heavy.
+_STARTED = time.perf_counter()
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Seconds from the first app import to the end of the startup event; --check fails past it.
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "2.5"))
+# Time every module imported until the startup event has run.
+STARTUP_PROFILE_IMPORTS = os.getenv("STARTUP_PROFILE_IMPORTS", "true").lower() == "true"
+# Create the translator, JWT code and hashing pool in the background instead of on first use.
+STARTUP_WARM_UP = os.getenv("STARTUP_WARM_UP", "true").lower() == "true"
+# How many of the slowest imports the report lists.
+STARTUP_REPORT_IMPORTS = int(os.getenv("STARTUP_REPORT_IMPORTS", "15"))
+
+
+def _group(module_name: str) -> str:
+    # App modules are reported one by one, libraries per top-level package.
+    if module_name == "app" or module_name.startswith("app."):
+        return module_name
+    return module_name.split(".", 1)[0]
+
+
+class ImportProfiler(MetaPathFinder):
+    """Measures each module's own import time from inside the process, like `python -X importtime`."""
+
+    def __init__(self):
+        self.self_seconds: Dict[str, float] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def install(self) -> None:
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self) -> None:
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, name, path, target=None):
+        if getattr(self._local, "finding", False):
+            return None
+        self._local.finding = True
+        try:
+            for finder in list(sys.meta_path):
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(name, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._local.finding = False
+
+        # Only file loaders are one instance per module and safe to wrap.
+        if isinstance(spec.loader, (SourceFileLoader, SourcelessFileLoader, ExtensionFileLoader)):
+            spec.loader.exec_module = self._timed(name, spec.loader.exec_module)
+        return spec
+
+    def _timed(self, name: str, exec_module: Callable) -> Callable:
+        def timed_exec_module(module):
+            stack: List[float] = self._local.__dict__.setdefault("stack", [])
+            stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                exec_module(module)
+            finally:
+                elapsed = time.perf_counter() - start
+                children = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                with self._lock:
+                    self.self_seconds[name] = elapsed - children
+
+        return timed_exec_module
+
+    def slowest(self, limit: int = STARTUP_REPORT_IMPORTS) -> Dict[str, float]:
+        """Import seconds per app module or library package, slowest first."""
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for name, seconds in self.self_seconds.items():
+                group = _group(name)
+                totals[group] = totals.get(group, 0.0) + seconds
+        ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return {name: round(seconds, 4) for name, seconds in ranked}
+
+
+class StartupReport:
+    """Durations of the import and startup phases, checked against a budget."""
+
+    def __init__(self, started: float, budget_seconds: float = STARTUP_BUDGET_SECONDS):
+        self.started = started
+        self.budget_seconds = budget_seconds
+        self.finished: Optional[float] = None
+        self.phases: Dict[str, float] = {}
+        self.failures: Dict[str, str] = {}
+        self.imports = ImportProfiler()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def elapsed(self) -> float:
+        """Seconds since the first app import."""
+        return time.perf_counter() - self.started
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.phases[name] = seconds
+
+    def record_failure(self, name: str, error: BaseException) -> None:
+        print(f"Startup phase {name} failed: {error!r}")
+        with self._lock:
+            self.failures[name] = repr(error)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time the block as a startup phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def run_in_background(self, name: str, func: Callable[[], Any]) -> threading.Thread:
+        """Run func as a phase in a daemon thread; a failure is reported but never stops the app."""
+        def run():
+            try:
+                with self.phase(name):
+                    func()
+            except Exception as e:
+                self.record_failure(name, e)
+
+        thread = threading.Thread(target=run, name=f"startup-{name}", daemon=True)
+        with self._lock:
+            self._threads.append(thread)
+        thread.start()
+        return thread
+
+    def join(self, timeout: float = 5.0) -> None:
+        """Wait a bounded time for background phases, e.g. before shutting down what they use."""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            threads = list(self._threads)
+        for thread in threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+
+    def forked(self) -> None:
+        """Restart the clock in a worker forked from a preloaded parent."""
+        self.started = time.perf_counter()
+        self.finished = None
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def finish(self) -> None:
+        """Mark the app as started and stop profiling imports."""
+        self.finished = time.perf_counter()
+        self.imports.uninstall()
+
+    def total_seconds(self) -> Optional[float]:
+        return None if self.finished is None else self.finished - self.started
+
+    def report(self) -> Dict[str, Any]:
+        total = self.total_seconds()
+        with self._lock:
+            phases = {name: round(seconds, 4) for name, seconds in self.phases.items()}
+            failures = dict(self.failures)
+        return {
+            "total_seconds": None if total is None else round(total, 4),
+            "budget_seconds": self.budget_seconds,
+            "within_budget": None if total is None else total <= self.budget_seconds,
+            "phases": phases,
+            "failures": failures,
+            "slowest_imports": self.imports.slowest(),
+        }
+
+
+startup_report = StartupReport(_STARTED)
+if STARTUP_PROFILE_IMPORTS:
+    startup_report.imports.install()
+
+
+def main(argv=None) -> int:
+    """Start and stop the app once and print its startup report; --check fails over budget."""
+    import asyncio
+
+    args = sys.argv[1:] if argv is None else argv
+    if args not in ([], ["--check"]):
+        print("Usage: python -m app.startup [--check]", file=sys.stderr)
+        return 2
+
+    # The app records into app.startup, not this __main__ copy.
+    startup_report.imports.uninstall()
+    from app.main import app
+    from app.startup import startup_report as report
+
+    async def start_and_stop():
+        await app.router.startup()
+        await app.router.shutdown()
+
+    asyncio.run(start_and_stop())
+    result = report.report()
+    print(json.dumps(result, indent=2))
+    if args == ["--check"] and not result["within_budget"]:
+        print(
+            f"Startup took {result['total_seconds']}s, over the {result['budget_seconds']}s budget",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,375 @@
+import hashlib
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+# jose.jwt is slow to import, so it is imported on first use.
+from jose import JWTError
+
+from app.metrics import registry
+
+load_dotenv()
+
+SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secure-jwt-secret-key")  # Default value for development
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 1 week
+# Comma-separated "kid=secret" signing keys on top of JWT_SECRET_KEY as kid "default".
+JWT_KEYS = os.getenv("JWT_KEYS", "")
+JWT_ACTIVE_KID = os.getenv("JWT_ACTIVE_KID", "default")
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+# "memory" keeps revocations per process; "redis" shares them between processes and machines.
+TOKEN_REVOCATION_BACKEND = os.getenv("TOKEN_REVOCATION_BACKEND", "memory")
+TOKEN_REVOCATION_REDIS_URL = os.getenv("TOKEN_REVOCATION_REDIS_URL", os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0"))
+# Seconds a token found not revoked in Redis is trusted without asking again; 0 always checks.
+TOKEN_REVOCATION_CACHE_SECONDS = float(os.getenv("TOKEN_REVOCATION_CACHE_SECONDS", "5"))
+
+DEFAULT_KID = "default"
+
+TOKEN_VERIFICATIONS = registry.counter(
+    "auth_token_verifications_total", "Bearer token checks by outcome.", ("outcome",)
+)
+
+
+def token_digest(token: str) -> str:
+    """Key for a token in the cache and revocation list, so raw tokens are never stored."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class KeyRing:
+    """HMAC keys by kid, and the one new tokens are signed with."""
+
+    def __init__(self, keys: Dict[str, str], active_kid: str = DEFAULT_KID):
+        if active_kid not in keys:
+            raise ValueError(f"JWT_ACTIVE_KID {active_kid!r} is not in JWT_KEYS")
+        self.keys = keys
+        self.active_kid = active_kid
+
+    @classmethod
+    def from_settings(cls, spec: str = JWT_KEYS, active_kid: str = JWT_ACTIVE_KID) -> "KeyRing":
+        """Parse JWT_KEYS, e.g. "2026-10=secret-a,2027-01=secret-b", on top of JWT_SECRET_KEY."""
+        keys = {DEFAULT_KID: SECRET_KEY}
+        for pair in spec.split(","):
+            if not pair.strip():
+                continue
+            kid, separator, secret = pair.partition("=")
+            if not separator or not kid.strip() or not secret.strip():
+                raise ValueError(f"Invalid JWT_KEYS entry: {pair!r}")
+            keys[kid.strip()] = secret.strip()
+        return cls(keys, active_kid)
+
+    def key_for(self, kid: Optional[str]) -> str:
+        key = self.keys.get(kid or DEFAULT_KID)
+        if key is None:
+            raise JWTError(f"Unknown key id: {kid}")
+        return key
+
+
+class VerifiedTokenCache:
+    """LRU of claims from tokens whose signature already checked out, dropped once they expire."""
+
+    def __init__(self, max_entries: int = TOKEN_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """The (kid, claims) of a verified token, or None."""
+        with self._lock:
+            cached = self._entries.get(digest)
+            if cached is None:
+                return None
+            expires_at, kid, claims = cached
+            if expires_at <= time.time():
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            return kid, claims
+
+    def set(self, digest: str, kid: str, claims: Dict[str, Any]) -> None:
+        expires_at = claims.get("exp")
+        if self.max_entries <= 0 or not isinstance(expires_at, (int, float)):
+            return
+        with self._lock:
+            self._entries[digest] = (float(expires_at), kid, claims)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, digest: str) -> None:
+        with self._lock:
+            self._entries.pop(digest, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RevocationStore:
+    """Interface for the list of revoked tokens, users (by issue cutoff) and signing keys."""
+
+    async def is_revoked(self, digest: str, kid: str, claims: Dict[str, Any]) -> bool:
+        raise NotImplementedError
+
+    async def revoke_token(self, digest: str, expires_at: float) -> None:
+        raise NotImplementedError
+
+    async def revoke_user(self, user_id: str, before: float) -> None:
+        raise NotImplementedError
+
+    async def revoke_kid(self, kid: str) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, int]:
+        return {}
+
+
+def _issued_at(claims: Dict[str, Any]) -> float:
+    # Tokens from before iat was added count as issued at the epoch.
+    issued_at = claims.get("iat")
+    return float(issued_at) if isinstance(issued_at, (int, float)) else 0.0
+
+
+class InMemoryRevocationStore(RevocationStore):
+    """Per-process revocations. Expired token entries are pruned as new ones arrive."""
+
+    def __init__(self):
+        self._tokens: Dict[str, float] = {}
+        self._users: Dict[str, float] = {}
+        self._kids: set = set()
+        self._lock = threading.Lock()
+
+    async def is_revoked(self, digest: str, kid: str, claims: Dict[str, Any]) -> bool:
+        with self._lock:
+            if digest in self._tokens or kid in self._kids:
+                return True
+            cutoff = self._users.get(claims.get("sub"))
+        return cutoff is not None and _issued_at(claims) < cutoff
+
+    async def revoke_token(self, digest: str, expires_at: float) -> None:
+        now = time.time()
+        with self._lock:
+            for expired in [key for key, until in self._tokens.items() if until <= now]:
+                del self._tokens[expired]
+            self._tokens[digest] = expires_at
+
+    async def revoke_user(self, user_id: str, before: float) -> None:
+        with self._lock:
+            self._users[user_id] = max(before, self._users.get(user_id, 0.0))
+
+    async def revoke_kid(self, kid: str) -> None:
+        with self._lock:
+            self._kids.add(kid)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"tokens": len(self._tokens), "users": len(self._users), "kids": len(self._kids)}
+
+
+class RedisRevocationStore(RevocationStore):
+    """Revocations shared through Redis, checked with one MGET. Needs the redis package."""
+
+    def __init__(
+        self,
+        url: str = TOKEN_REVOCATION_REDIS_URL,
+        prefix: str = "revoked:",
+        cache_seconds: float = TOKEN_REVOCATION_CACHE_SECONDS,
+        max_cached: int = TOKEN_CACHE_MAX_ENTRIES,
+        client: Any = None,
+    ):
+        if client is None:
+            import redis.asyncio as redis
+
+            client = redis.from_url(url)
+        self.prefix = prefix
+        self.cache_seconds = cache_seconds
+        self.max_cached = max_cached
+        self.lookups = 0
+        self._client = client
+        # Token digest -> (monotonic time the check expires, subject, kid).
+        self._not_revoked: "OrderedDict[str, Tuple[float, Any, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _known_not_revoked(self, digest: str) -> bool:
+        with self._lock:
+            cached = self._not_revoked.get(digest)
+            if cached is None:
+                return False
+            if cached[0] <= time.monotonic():
+                del self._not_revoked[digest]
+                return False
+            return True
+
+    def _remember_not_revoked(self, digest: str, subject: Any, kid: str) -> None:
+        if self.cache_seconds <= 0 or self.max_cached <= 0:
+            return
+        with self._lock:
+            self._not_revoked[digest] = (time.monotonic() + self.cache_seconds, subject, kid)
+            self._not_revoked.move_to_end(digest)
+            while len(self._not_revoked) > self.max_cached:
+                self._not_revoked.popitem(last=False)
+
+    def _forget(self, subject: Any = None, kid: Optional[str] = None) -> None:
+        with self._lock:
+            for digest in [
+                digest for digest, (expires, cached_subject, cached_kid) in self._not_revoked.items()
+                if cached_subject == subject or cached_kid == kid
+            ]:
+                del self._not_revoked[digest]
+
+    async def is_revoked(self, digest: str, kid: str, claims: Dict[str, Any]) -> bool:
+        if self._known_not_revoked(digest):
+            return False
+
+        self.lookups += 1
+        token, cutoff, key = await self._client.mget(
+            f"{self.prefix}token:{digest}",
+            f"{self.prefix}user:{claims.get('sub')}",
+            f"{self.prefix}kid:{kid}",
+        )
+        if token is not None or key is not None:
+            return True
+        if cutoff is not None and _issued_at(claims) < float(cutoff):
+            return True
+        self._remember_not_revoked(digest, claims.get("sub"), kid)
+        return False
+
+    async def revoke_token(self, digest: str, expires_at: float) -> None:
+        with self._lock:
+            self._not_revoked.pop(digest, None)
+        await self._client.set(f"{self.prefix}token:{digest}", 1, exat=int(expires_at) + 1)
+
+    async def revoke_user(self, user_id: str, before: float) -> None:
+        self._forget(subject=user_id)
+        # Tokens live at most ACCESS_TOKEN_EXPIRE_MINUTES, and so does the cutoff.
+        await self._client.set(f"{self.prefix}user:{user_id}", before, ex=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+    async def revoke_kid(self, kid: str) -> None:
+        self._forget(kid=kid)
+        await self._client.set(f"{self.prefix}kid:{kid}", 1)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"lookups": self.lookups, "cached_not_revoked": len(self._not_revoked)}
+
+
+def create_revocation_store(backend: str = TOKEN_REVOCATION_BACKEND) -> RevocationStore:
+    """Create the revocation store for the configured backend."""
+    if backend == "memory":
+        return InMemoryRevocationStore()
+    if backend == "redis":
+        return RedisRevocationStore()
+    raise ValueError(f"Unknown token revocation backend: {backend}")
+
+
+class TokenVerifier:
+    """Signs access tokens and verifies them with a cache in front of jwt.decode."""
+
+    def __init__(
+        self,
+        key_ring: Optional[KeyRing] = None,
+        cache: Optional[VerifiedTokenCache] = None,
+        revocations: Optional[RevocationStore] = None,
+    ):
+        self.key_ring = key_ring if key_ring is not None else KeyRing.from_settings()
+        self.cache = cache if cache is not None else VerifiedTokenCache()
+        self.revocations = revocations if revocations is not None else create_revocation_store()
+
+    def encode(self, claims: Dict[str, Any]) -> str:
+        """Sign claims with the active key, naming it in the kid header."""
+        from jose import jwt
+
+        kid = self.key_ring.active_kid
+        return jwt.encode(claims, self.key_ring.key_for(kid), algorithm=ALGORITHM, headers={"kid": kid})
+
+    def decode(self, token: str) -> Tuple[str, str, Dict[str, Any]]:
+        """Return (digest, kid, claims) of a correctly signed, unexpired token, ignoring revocations."""
+        digest = token_digest(token)
+        cached = self.cache.get(digest)
+        if cached is not None:
+            TOKEN_VERIFICATIONS.inc(outcome="cache_hit")
+            return (digest, *cached)
+
+        from jose import jwt
+
+        try:
+            kid = jwt.get_unverified_header(token).get("kid") or DEFAULT_KID
+            claims = jwt.decode(token, self.key_ring.key_for(kid), algorithms=[ALGORITHM])
+        except JWTError:
+            TOKEN_VERIFICATIONS.inc(outcome="invalid")
+            raise
+        TOKEN_VERIFICATIONS.inc(outcome="verified")
+        self.cache.set(digest, kid, claims)
+        return digest, kid, claims
+
+    async def verify(self, token: str) -> Dict[str, Any]:
+        """Claims of a valid token that has not been revoked. Raises JWTError."""
+        digest, kid, claims = self.decode(token)
+        if await self.revocations.is_revoked(digest, kid, claims):
+            TOKEN_VERIFICATIONS.inc(outcome="revoked")
+            raise JWTError("Token revoked")
+        return claims
+
+    async def revoke_token(self, token: str) -> None:
+        """Revoke one token until it would have expired anyway."""
+        digest, kid, claims = self.decode(token)
+        await self.revocations.revoke_token(digest, float(claims.get("exp", time.time() + ACCESS_TOKEN_EXPIRE_MINUTES * 60)))
+        self.cache.discard(digest)
+
+    async def revoke_user(self, user_id: str, before: Optional[float] = None) -> None:
+        """Revoke every token issued to a user before `before` (default: now)."""
+        await self.revocations.revoke_user(user_id, time.time() if before is None else before)
+
+    async def revoke_kid(self, kid: str) -> None:
+        """Revoke every token signed with a key, e.g. one that leaked."""
+        await self.revocations.revoke_kid(kid)
+
+    def warm_up(self) -> None:
+        """Import the JWT code now instead of on the first request."""
+        from jose import jwt
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "active_kid": self.key_ring.active_kid,
+            "kids": sorted(self.key_ring.keys),
+            "cached": len(self.cache),
+            "revocations": self.revocations.stats(),
+        }
+
+
+token_verifier = TokenVerifier()
+
+
+def main(argv=None) -> int:
+    """Revoke a user's tokens or a signing key from the command line."""
+    import asyncio
+
+    args = sys.argv[1:] if argv is None else argv
+    if len(args) != 2 or args[0] not in ("revoke-user", "revoke-kid"):
+        print("Usage: python -m app.tokens revoke-user <user_id> | revoke-kid <kid>", file=sys.stderr)
+        return 2
+    if TOKEN_REVOCATION_BACKEND == "memory":
+        print(
+            "TOKEN_REVOCATION_BACKEND=memory: revocations from here never reach the server; "
+            "use its /admin/revocations routes, or TOKEN_REVOCATION_BACKEND=redis.",
+            file=sys.stderr,
+        )
+        return 1
+
+    command, value = args
+    if command == "revoke-user":
+        asyncio.run(token_verifier.revoke_user(value))
+    else:
+        asyncio.run(token_verifier.revoke_kid(value))
+    print(f"Revoked {command.split('-', 1)[1]} {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,408 @@
+import functools
+import inspect
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.metrics import registry
+
+# "none" only keeps metrics, "file" appends JSON lines to TRACING_FILE, "otlp" sends to a collector.
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none")
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "1.0"))
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "parallel-diary-api")
+# Requests slower than this print their span breakdown; 0 disables.
+TRACING_SLOW_REQUEST_MS = float(os.getenv("TRACING_SLOW_REQUEST_MS", "0"))
+# Spans kept per request, so a large import cannot grow a trace without bound.
+TRACING_MAX_SPANS = int(os.getenv("TRACING_MAX_SPANS", "500"))
+TRACE_ID_HEADER = "X-Trace-Id"
+
+REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "Time to serve a request, by route template.", ("method", "route", "status")
+)
+REQUEST_DB_QUERIES = registry.histogram(
+    "http_request_db_queries", "SQL statements executed per request.", ("method", "route"),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100, 500),
+)
+DB_QUERY_SECONDS = registry.histogram("db_query_duration_seconds", "SQL statement execution time.", ("operation",))
+DB_COMMIT_SECONDS = registry.histogram("db_commit_duration_seconds", "Session flush and commit time.")
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attributes")
+
+    def __init__(self, name: str, parent_id: Optional[str], start_ns: int, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.start_ns = start_ns
+        self.end_ns = start_ns
+        self.attributes = attributes or {}
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "attributes": self.attributes,
+        }
+
+
+class Trace:
+    """The spans and SQL statement count of one request."""
+
+    def __init__(self, trace_id: Optional[str] = None, remote_parent_id: Optional[str] = None):
+        self.trace_id = trace_id or f"{random.getrandbits(128):032x}"
+        self.remote_parent_id = remote_parent_id
+        self.root = Span("http.request", remote_parent_id, time.time_ns())
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self.db_queries = 0
+        self.endpoint_end_ns: Optional[int] = None
+
+    def add(self, span: Span) -> None:
+        # list.append is atomic, and spans arrive from worker threads too.
+        if len(self.spans) < TRACING_MAX_SPANS:
+            self.spans.append(span)
+        else:
+            self.dropped += 1
+
+    def breakdown(self) -> Dict[str, Dict[str, float]]:
+        """Count and total milliseconds per span name."""
+        totals: Dict[str, Dict[str, float]] = {}
+        for span in self.spans:
+            total = totals.setdefault(span.name, {"count": 0, "ms": 0.0})
+            total["count"] += 1
+            total["ms"] = round(total["ms"] + span.duration_ms, 3)
+        return totals
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "spans": [self.root.to_dict(), *(span.to_dict() for span in self.spans)],
+            "dropped_spans": self.dropped,
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Record a span around a block within the current request's trace, if any."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    parent = _current_span.get() or trace.root
+    current = Span(name, parent.span_id, time.time_ns(), attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current_span.reset(token)
+        trace.add(current)
+
+
+def _record_span(trace: Trace, name: str, start_ns: int, end_ns: int, attributes: Dict[str, Any]) -> None:
+    parent = _current_span.get() or trace.root
+    recorded = Span(name, parent.span_id, start_ns, attributes)
+    recorded.end_ns = end_ns
+    trace.add(recorded)
+
+
+def traced_endpoint(endpoint: Callable) -> Callable:
+    """Wrap a route endpoint in an "endpoint" span and note when it returned."""
+    if getattr(endpoint, "__traced__", False):
+        # include_router builds new routes from already wrapped endpoints.
+        return endpoint
+
+    def finished() -> None:
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.endpoint_end_ns = time.time_ns()
+
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            with span("endpoint"):
+                result = await endpoint(*args, **kwargs)
+            finished()
+            return result
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            with span("endpoint"):
+                result = endpoint(*args, **kwargs)
+            finished()
+            return result
+    wrapper.__traced__ = True
+    return wrapper
+
+
+class TracedRoute(APIRoute):
+    """APIRoute whose endpoint runs inside a span, followed by a "serialize" span."""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs: Any):
+        super().__init__(path, traced_endpoint(endpoint), **kwargs)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.time_ns())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    end_ns = time.time_ns()
+    start_ns = conn.info["query_start"].pop()
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+    DB_QUERY_SECONDS.observe((end_ns - start_ns) / 1e9, operation=operation)
+
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.db_queries += 1
+        _record_span(trace, "db.query", start_ns, end_ns, {"db.operation": operation, "db.statement": statement[:300]})
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    starts = exception_context.connection.info.get("query_start") if exception_context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+@event.listens_for(Session, "before_commit")
+def _before_commit(session):
+    session.info["commit_start"] = time.time_ns()
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    start_ns = session.info.pop("commit_start", None)
+    if start_ns is None:
+        return
+    end_ns = time.time_ns()
+    DB_COMMIT_SECONDS.observe((end_ns - start_ns) / 1e9)
+    trace = _current_trace.get()
+    if trace is not None:
+        _record_span(trace, "db.commit", start_ns, end_ns, {})
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("commit_start", None)
+
+
+class TraceExporter:
+    """Interface for where finished, sampled traces go."""
+
+    def export(self, trace: Trace) -> None:
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        pass
+
+
+class FileTraceExporter(TraceExporter):
+    """Appends each trace as one JSON line."""
+
+    def __init__(self, path: str = TRACING_FILE):
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def export(self, trace: Trace) -> None:
+        line = json.dumps(trace.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class OtlpTraceExporter(TraceExporter):
+    """Replays finished traces through the OpenTelemetry SDK to an OTLP/HTTP collector."""
+
+    def __init__(self, service_name: str = TRACING_SERVICE_NAME):
+        from opentelemetry import trace as otel_trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.sdk.trace.id_generator import RandomIdGenerator
+
+        exporter = self
+
+        class RequestIdGenerator(RandomIdGenerator):
+            # Keep our trace id, so X-Trace-Id finds the trace in the collector.
+            def generate_trace_id(self) -> int:
+                return exporter._next_trace_id or super().generate_trace_id()
+
+        self._otel_trace = otel_trace
+        self._next_trace_id: Optional[int] = None
+        self._lock = threading.Lock()
+        self._provider = TracerProvider(
+            resource=Resource.create({"service.name": service_name}), id_generator=RequestIdGenerator()
+        )
+        self._provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        self._tracer = self._provider.get_tracer("app.tracing")
+
+    def export(self, trace: Trace) -> None:
+        otel_trace = self._otel_trace
+        context = None
+        if trace.remote_parent_id is not None:
+            context = otel_trace.set_span_in_context(otel_trace.NonRecordingSpan(otel_trace.SpanContext(
+                trace_id=int(trace.trace_id, 16),
+                span_id=int(trace.remote_parent_id, 16),
+                is_remote=True,
+                trace_flags=otel_trace.TraceFlags(otel_trace.TraceFlags.SAMPLED),
+            )))
+
+        with self._lock:
+            self._next_trace_id = int(trace.trace_id, 16)
+            try:
+                root = self._tracer.start_span(
+                    trace.root.name, context=context, start_time=trace.root.start_ns, attributes=trace.root.attributes
+                )
+            finally:
+                self._next_trace_id = None
+
+        started = {trace.root.span_id: root}
+        # Children are appended when they end, so replay them in start order.
+        for recorded in sorted(trace.spans, key=lambda s: s.start_ns):
+            parent = started.get(recorded.parent_id, root)
+            started[recorded.span_id] = self._tracer.start_span(
+                recorded.name,
+                context=otel_trace.set_span_in_context(parent),
+                start_time=recorded.start_ns,
+                attributes=recorded.attributes,
+            )
+        for recorded in trace.spans:
+            started[recorded.span_id].end(end_time=recorded.end_ns)
+        root.end(end_time=trace.root.end_ns)
+
+    def shutdown(self) -> None:
+        self._provider.shutdown()
+
+
+def create_exporter(kind: str = TRACING_EXPORTER) -> Optional[TraceExporter]:
+    """Create the exporter for TRACING_EXPORTER, or None to only keep metrics."""
+    if kind == "none":
+        return None
+    if kind == "file":
+        return FileTraceExporter()
+    if kind == "otlp":
+        return OtlpTraceExporter()
+    raise ValueError(f"Unknown tracing exporter: {kind}")
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[tuple]:
+    """(trace id, parent span id) from a W3C traceparent header, if valid."""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2]
+
+
+class TracingMiddleware:
+    """Traces each request, records its metrics by route template and exports sampled traces."""
+
+    def __init__(self, app: ASGIApp, exporter: Optional[TraceExporter] = None, sample_rate: float = TRACING_SAMPLE_RATE):
+        self.app = app
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        parent = parse_traceparent(Headers(scope=scope).get("traceparent"))
+        trace = Trace(*parent) if parent else Trace()
+        status = 500
+
+        async def send_traced(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if trace.endpoint_end_ns is not None:
+                    _record_span(trace, "serialize", trace.endpoint_end_ns, time.time_ns(), {})
+                MutableHeaders(scope=message)[TRACE_ID_HEADER] = trace.trace_id
+            await send(message)
+
+        token = _current_trace.set(trace)
+        try:
+            await self.app(scope, receive, send_traced)
+        finally:
+            _current_trace.reset(token)
+            self._finish(scope, trace, status)
+
+    def _finish(self, scope: Scope, trace: Trace, status: int) -> None:
+        trace.root.end_ns = time.time_ns()
+        route = scope.get("route")
+        template = getattr(route, "path", None) or "unmatched"
+        method = scope["method"]
+        seconds = (trace.root.end_ns - trace.root.start_ns) / 1e9
+
+        REQUEST_SECONDS.observe(seconds, method=method, route=template, status=str(status))
+        REQUEST_DB_QUERIES.observe(trace.db_queries, method=method, route=template)
+
+        trace.root.name = f"{method} {template}"
+        trace.root.attributes.update({
+            "http.method": method,
+            "http.route": template,
+            "http.status_code": status,
+            "db.queries": trace.db_queries,
+        })
+
+        if TRACING_SLOW_REQUEST_MS and seconds * 1000 >= TRACING_SLOW_REQUEST_MS:
+            print(
+                f"Slow request {method} {template} {status} {seconds * 1000:.1f}ms "
+                f"trace={trace.trace_id} {json.dumps(trace.breakdown())}"
+            )
+
+        if self.exporter is not None and random.random() < self.sample_rate:
+            try:
+                self.exporter.export(trace)
+            except Exception as e:
+                print(f"Trace export error: {e!r}")
+
+
+trace_exporter = create_exporter()
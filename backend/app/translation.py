@@ -1,21 +1,573 @@
-from deep_translator import GoogleTranslator
+import asyncio
+import contextvars
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.db_config import STORAGE_BACKEND, SessionLocal
+from app.models.translation import TranslationCacheEntry
+from app.rate_limit import TokenBucket
+from app.translation_backends import BackendSlot, TranslationBackend, create_backends
+
+TRANSLATION_CACHE_MAX_BYTES = int(os.getenv("TRANSLATION_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+TRANSLATION_CACHE_PERSIST = os.getenv("TRANSLATION_CACHE_PERSIST", "true").lower() == "true"
+TRANSLATION_MAX_WORKERS = int(os.getenv("TRANSLATION_MAX_WORKERS", "8"))
+TRANSLATION_MAX_CONCURRENCY = int(os.getenv("TRANSLATION_MAX_CONCURRENCY", "16"))
+TRANSLATION_TIMEOUT_SECONDS = float(os.getenv("TRANSLATION_TIMEOUT_SECONDS", "10"))
+# Google rejects requests over 5000 characters; leave some headroom.
+TRANSLATION_MAX_BATCH_CHARS = int(os.getenv("TRANSLATION_MAX_BATCH_CHARS", "4500"))
+# Per-process budget for calls to metered backends (Google). When it is spent
+# the last backend waits up to TRANSLATION_BUDGET_WAIT_SECONDS for a token.
+TRANSLATION_CALLS_PER_SECOND = float(os.getenv("TRANSLATION_CALLS_PER_SECOND", "10"))
+TRANSLATION_CALL_BURST = float(os.getenv("TRANSLATION_CALL_BURST", "20"))
+TRANSLATION_BUDGET_WAIT_SECONDS = float(os.getenv("TRANSLATION_BUDGET_WAIT_SECONDS", str(TRANSLATION_TIMEOUT_SECONDS)))
+
+# Sentences end at 。！？; newlines are kept as their own segments.
+SENTENCE_PATTERN = re.compile(r"[^。！？\n]+[。！？]*|[。！？]+|\n+")
+
+# [source segment, translated segment] pairs; None marks a failed translation.
+Segments = List[List[Optional[str]]]
+
+
+def normalize_text(text: str) -> str:
+    """Normalize source text so equivalent inputs share a cache key."""
+    return unicodedata.normalize("NFC", text).strip()
+
+
+def make_cache_key(text: str, source: str, target: str) -> str:
+    """Build a content-hash cache key for a text and language pair."""
+    payload = f"{source}:{target}:{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split Japanese text on sentence boundaries (。！？ and newlines)."""
+    return SENTENCE_PATTERN.findall(text)
+
+
+def is_separator(segment: str) -> bool:
+    """Whitespace-only segments are copied through without translation."""
+    return not segment.strip()
+
+
+def has_failed_segments(segments: Sequence[Sequence[Optional[str]]]) -> bool:
+    """Whether any sentence of aligned segments is still untranslated."""
+    return any(translated is None for source, translated in segments if not is_separator(source))
+
+
+def join_segments(segments: Sequence[Sequence[Optional[str]]], errors: Optional[Dict[int, str]] = None) -> str:
+    """Join aligned segment translations back into a single English text."""
+    parts: List[str] = []
+    previous_was_sentence = False
+
+    for index, (source, translated) in enumerate(segments):
+        if is_separator(source):
+            parts.append(source)
+            previous_was_sentence = False
+            continue
+
+        if translated is None:
+            message = (errors or {}).get(index, "segment not translated")
+            translated = f"[Translation error: {message}]"
+
+        if not translated:
+            continue
+
+        if previous_was_sentence:
+            parts.append(" ")
+        parts.append(translated)
+        previous_was_sentence = True
+
+    return "".join(parts).strip()
+
+
+class TranslationCache:
+    """Two-tier translation cache: an in-process LRU backed by a database table."""
+
+    def __init__(
+        self,
+        max_bytes: int = TRANSLATION_CACHE_MAX_BYTES,
+        session_factory: Optional[Callable[[], Session]] = SessionLocal if STORAGE_BACKEND == "sql" else None,
+    ):
+        self.max_bytes = max_bytes
+        self.session_factory = session_factory
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.persistent_hits = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _entry_size(key: str, value: str) -> int:
+        return len(key) + len(value.encode("utf-8"))
+
+    def get(self, key: str) -> Optional[str]:
+        """Look up a translation, falling back to the persistent tier."""
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, str]:
+        """Look up several translations with at most one persistent-tier query."""
+        found: Dict[str, str] = {}
+        missing: List[str] = []
+
+        with self._lock:
+            for key in keys:
+                value = self._entries.get(key)
+                if value is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    found[key] = value
+                else:
+                    missing.append(key)
+
+        if not missing:
+            return found
+
+        loaded = self._load_many(missing)
+        with self._lock:
+            self.persistent_hits += len(loaded)
+            self.misses += len(missing) - len(loaded)
+        for key, value in loaded.items():
+            self._remember(key, value)
+            found[key] = value
+        return found
+
+    def set(self, key: str, value: str, source: str, target: str) -> None:
+        """Store a translation in both tiers."""
+        self.set_many({key: value}, source, target)
+
+    def set_many(self, values: Dict[str, str], source: str, target: str) -> None:
+        """Store several translations in both tiers with a single commit."""
+        for key, value in values.items():
+            self._remember(key, value)
+        self._store_many(values, source, target)
+
+    def _remember(self, key: str, value: str) -> None:
+        size = self._entry_size(key, value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= self._entry_size(key, previous)
+
+            self._entries[key] = value
+            self._size += size
+
+            while self._size > self.max_bytes:
+                old_key, old_value = self._entries.popitem(last=False)
+                self._size -= self._entry_size(old_key, old_value)
+                self.evictions += 1
+
+    def _load_many(self, keys: List[str]) -> Dict[str, str]:
+        if not TRANSLATION_CACHE_PERSIST or self.session_factory is None:
+            return {}
+
+        db = self.session_factory()
+        try:
+            rows = db.query(TranslationCacheEntry).filter(TranslationCacheEntry.key.in_(keys)).all()
+            return {row.key: row.translated_text for row in rows}
+        except SQLAlchemyError as e:
+            print(f"Translation cache read error: {e}")
+            return {}
+        finally:
+            db.close()
+
+    def _store_many(self, values: Dict[str, str], source: str, target: str) -> None:
+        if not values or not TRANSLATION_CACHE_PERSIST or self.session_factory is None:
+            return
+
+        db = self.session_factory()
+        try:
+            existing = {
+                row.key for row in
+                db.query(TranslationCacheEntry.key).filter(TranslationCacheEntry.key.in_(list(values))).all()
+            }
+            db.add_all([
+                TranslationCacheEntry(
+                    key=key,
+                    source_lang=source,
+                    target_lang=target,
+                    translated_text=value
+                )
+                for key, value in values.items() if key not in existing
+            ])
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            print(f"Translation cache write error: {e}")
+        finally:
+            db.close()
+
+    def clear(self) -> None:
+        """Drop every in-process entry. The persistent tier is left untouched."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss/eviction counters and current memory usage."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class TranslationBudgetExceeded(RuntimeError):
+    """Raised when the outgoing translator call budget stays exhausted."""
+
+
+class TranslationUnavailable(RuntimeError):
+    """Raised when every translation backend's circuit is open."""
 
 
 class TranslationService:
     """Service for translating text between languages."""
-    
-    @staticmethod
-    def translate_japanese_to_english(text: str) -> str:
+
+    def __init__(
+        self,
+        cache: Optional[TranslationCache] = None,
+        max_workers: int = TRANSLATION_MAX_WORKERS,
+        max_concurrency: int = TRANSLATION_MAX_CONCURRENCY,
+        timeout: float = TRANSLATION_TIMEOUT_SECONDS,
+        call_budget: Optional[TokenBucket] = None,
+        backends: Optional[List[TranslationBackend]] = None,
+        budget_wait: float = TRANSLATION_BUDGET_WAIT_SECONDS,
+    ):
+        self.cache = cache if cache is not None else TranslationCache()
+        # Created on first use: the Google backend's HTTP stack is slow to import.
+        self._backends: Optional[List[BackendSlot]] = (
+            [BackendSlot(backend) for backend in backends] if backends is not None else None
+        )
+        self._backends_lock = threading.Lock()
+        self.call_budget = call_budget if call_budget is not None else TokenBucket(
+            TRANSLATION_CALLS_PER_SECOND, TRANSLATION_CALL_BURST
+        )
+        self.max_workers = max_workers
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.budget_wait = min(budget_wait, timeout)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def backends(self) -> List[BackendSlot]:
+        """The backends in failover order."""
+        return self._get_backends()
+
+    def _get_backends(self) -> List[BackendSlot]:
+        if self._backends is None:
+            with self._backends_lock:
+                if self._backends is None:
+                    self._backends = [BackendSlot(backend) for backend in create_backends()]
+        return self._backends
+
+    def warm_up(self) -> None:
+        """Create the backends and thread pool now instead of on the first translation."""
+        self._get_backends()
+        self._get_executor()
+
+    def translate(self, text: str, source: str, target: str) -> str:
+        """Translate text, serving repeated inputs from the cache."""
+        normalized = normalize_text(text)
+        if not normalized:
+            return ""
+
+        key = make_cache_key(normalized, source, target)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        translated = self._translate_remote(normalized, source, target)
+        self.cache.set(key, translated, source, target)
+        return translated
+
+    def _translate_remote(self, text: str, source: str, target: str) -> str:
+        """Try each backend in order, skipping those whose circuit is open."""
+        error: Optional[Exception] = None
+
+        for slot in self.backends:
+            if not slot.breaker.allow():
+                slot.skipped += 1
+                continue
+
+            if slot.backend.metered:
+                wait = self.budget_wait if slot is self.backends[-1] else 0.0
+                if not self.call_budget.acquire(timeout=wait):
+                    slot.breaker.release()
+                    slot.skipped += 1
+                    error = TranslationBudgetExceeded("Translation call budget exhausted")
+                    continue
+
+            try:
+                return slot.call(text, source, target)
+            except Exception as e:
+                print(f"Translation backend {slot.backend.name} failed: {e!r}")
+                error = e
+
+        raise error if error is not None else TranslationUnavailable("No translation backend is available")
+
+    def backend_stats(self) -> Dict[str, Dict[str, object]]:
+        """Circuit state, call counts and latency histogram per backend, in failover order."""
+        return {slot.backend.name: slot.stats() for slot in self._backends or ()}
+
+    def translate_japanese_to_english(self, text: str) -> str:
         """Translate Japanese text to English."""
         if not text:
             return ""
-        
+
         try:
-            translator = GoogleTranslator(source='ja', target='en')
-            return translator.translate(text)
+            return self.translate(text, "ja", "en")
         except Exception as e:
             print(f"Translation error: {e}")
             return f"[Translation error: {str(e)}]"
 
+    def translate_incremental(
+        self,
+        text: str,
+        previous_segments: Optional[Segments] = None,
+    ) -> Tuple[str, Segments]:
+        """Translate Japanese text, reusing the stored translation of unchanged sentences."""
+        [result] = self._translate_texts([text], "ja", "en", self._reusable_translations(previous_segments))
+        return result
+
+    async def translate_async(self, text: str, source: str, target: str, timeout: Optional[float] = None) -> str:
+        """Translate text on the translator thread pool without blocking the event loop."""
+        return await self._run_in_pool(self.translate, text, source, target, timeout=timeout)
+
+    async def translate_japanese_to_english_async(self, text: str) -> str:
+        """Translate Japanese text to English off the event loop."""
+        if not text:
+            return ""
+
+        try:
+            return await self.translate_async(text, "ja", "en")
+        except Exception as e:
+            print(f"Translation error: {e!r}")
+            return f"[Translation error: {str(e) or type(e).__name__}]"
+
+    async def translate_incremental_async(
+        self,
+        text: str,
+        previous_segments: Optional[Segments] = None,
+    ) -> Tuple[str, Segments]:
+        """Async variant of translate_incremental, run on the translator thread pool."""
+        [result] = await self._translate_texts_async(
+            [text], "ja", "en", self._reusable_translations(previous_segments)
+        )
+        return result
+
+    def translate_many(
+        self,
+        texts: Sequence[str],
+        source: str = "ja",
+        target: str = "en",
+    ) -> List[Tuple[str, Segments]]:
+        """Translate many texts, packing their uncached sentences into as few calls as possible."""
+        return self._translate_texts(texts, source, target)
+
+    async def translate_many_async(
+        self,
+        texts: Sequence[str],
+        source: str = "ja",
+        target: str = "en",
+    ) -> List[Tuple[str, Segments]]:
+        """Async variant of translate_many that sends the packed requests concurrently."""
+        return await self._translate_texts_async(texts, source, target)
+
+    def _translate_texts(
+        self,
+        texts: Sequence[str],
+        source: str,
+        target: str,
+        known: Optional[Dict[str, str]] = None,
+    ) -> List[Tuple[str, Segments]]:
+        split, known, chunks = self._plan_batch(texts, source, target, known)
+        failures: Dict[str, str] = {}
+
+        for chunk in chunks:
+            self._translate_chunk(chunk, source, target, known, failures)
+
+        return [self._assemble(sources, known, failures) for sources in split]
+
+    async def _translate_texts_async(
+        self,
+        texts: Sequence[str],
+        source: str,
+        target: str,
+        known: Optional[Dict[str, str]] = None,
+    ) -> List[Tuple[str, Segments]]:
+        split, known, chunks = await self._run_in_pool(self._plan_batch, texts, source, target, known)
+        failures: Dict[str, str] = {}
+
+        results = await asyncio.gather(
+            *(self._run_in_pool(self._translate_chunk, chunk, source, target, known, failures) for chunk in chunks),
+            return_exceptions=True
+        )
+
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, BaseException):
+                print(f"Translation error: {result!r}")
+                for sentence in chunk:
+                    if sentence not in known:
+                        failures[sentence] = str(result) or type(result).__name__
+
+        return [self._assemble(sources, known, failures) for sources in split]
+
+    def _plan_batch(
+        self,
+        texts: Sequence[str],
+        source: str,
+        target: str,
+        known: Optional[Dict[str, str]] = None,
+    ) -> Tuple[List[List[str]], Dict[str, str], List[List[str]]]:
+        split = [split_sentences(text) for text in texts]
+        known = dict(known or {})
+
+        unique: Dict[str, str] = {}
+        for sources in split:
+            for sentence in sources:
+                if not is_separator(sentence) and sentence not in known and sentence not in unique:
+                    unique[sentence] = make_cache_key(sentence, source, target)
+
+        cached = self.cache.get_many(list(unique.values()))
+        known.update((sentence, cached[key]) for sentence, key in unique.items() if key in cached)
+        pending = [sentence for sentence in unique if sentence not in known]
+
+        return split, known, self._pack(pending)
+
+    @staticmethod
+    def _pack(sentences: List[str], max_chars: int = TRANSLATION_MAX_BATCH_CHARS) -> List[List[str]]:
+        chunks: List[List[str]] = []
+        current: List[str] = []
+        size = 0
+
+        for sentence in sentences:
+            length = len(normalize_text(sentence)) + 1
+            if current and size + length > max_chars:
+                chunks.append(current)
+                current, size = [], 0
+            current.append(sentence)
+            size += length
+
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _translate_chunk(
+        self,
+        chunk: List[str],
+        source: str,
+        target: str,
+        known: Dict[str, str],
+        failures: Dict[str, str],
+    ) -> None:
+        normalized = [normalize_text(sentence) for sentence in chunk]
+        results: Optional[List[Optional[str]]] = None
+
+        # One newline-joined request per chunk; a wrong line count falls back to one per sentence.
+        if len(chunk) > 1:
+            try:
+                lines = self._translate_remote("\n".join(normalized), source, target).split("\n")
+            except Exception as e:
+                print(f"Translation error: {e}")
+                for sentence in chunk:
+                    failures[sentence] = str(e)
+                return
+            if len(lines) == len(chunk):
+                results = [line.strip() for line in lines]
+
+        if results is None:
+            results = []
+            for sentence, text in zip(chunk, normalized):
+                try:
+                    results.append(self._translate_remote(text, source, target))
+                except Exception as e:
+                    print(f"Translation error: {e}")
+                    failures[sentence] = str(e)
+                    results.append(None)
+
+        translated: Dict[str, str] = {}
+        for sentence, result in zip(chunk, results):
+            if result is not None:
+                known[sentence] = result
+                translated[make_cache_key(sentence, source, target)] = result
+        self.cache.set_many(translated, source, target)
+
+    @staticmethod
+    def _reusable_translations(previous_segments: Optional[Segments]) -> Dict[str, str]:
+        known: Dict[str, str] = {}
+        for source, translated in previous_segments or []:
+            if source is not None and translated is not None:
+                known[source] = translated
+        return known
+
+    @staticmethod
+    def _assemble(sources: List[str], known: Dict[str, str], failures: Dict[str, str]) -> Tuple[str, Segments]:
+        segments: Segments = []
+        errors: Dict[int, str] = {}
+
+        for index, source in enumerate(sources):
+            if is_separator(source):
+                segments.append([source, source])
+                continue
+
+            if source in failures:
+                errors[index] = failures[source]
+            segments.append([source, known.get(source)])
+
+        return join_segments(segments, errors), segments
+
+    async def _run_in_pool(self, func: Callable, *args, timeout: Optional[float] = None):
+        async with self._get_semaphore():
+            loop = asyncio.get_running_loop()
+            # Run in a copy of the caller's context so the request's trace follows.
+            future = loop.run_in_executor(self._get_executor(), contextvars.copy_context().run, func, *args)
+            return await asyncio.wait_for(future, timeout if timeout is not None else self.timeout)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="translator"
+                )
+            return self._executor
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # asyncio primitives are bound to one event loop, so keep one per loop.
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the translator thread pool, optionally waiting for running calls, and close backends."""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+        for slot in self._backends or ():
+            slot.backend.close()
 
 translator = TranslationService()
@@ -0,0 +1,236 @@
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.metrics import registry
+from app.tracing import span
+
+# Comma-separated backends in failover order: "google", "local" (offline model) or "stub" (tests).
+TRANSLATION_BACKENDS = os.getenv("TRANSLATION_BACKENDS", "google")
+# Idle GoogleTranslator instances the google backend keeps per language pair.
+TRANSLATION_HTTP_POOL_SIZE = int(os.getenv("TRANSLATION_HTTP_POOL_SIZE", os.getenv("TRANSLATION_MAX_WORKERS", "8")))
+# Consecutive failures that open a backend's circuit, and how long it stays open.
+TRANSLATION_BREAKER_FAILURES = int(os.getenv("TRANSLATION_BREAKER_FAILURES", "5"))
+TRANSLATION_BREAKER_RESET_SECONDS = float(os.getenv("TRANSLATION_BREAKER_RESET_SECONDS", "30"))
+# Hugging Face model for the "local" backend; needs the transformers and torch packages.
+TRANSLATION_LOCAL_MODEL = os.getenv("TRANSLATION_LOCAL_MODEL", "Helsinki-NLP/opus-mt-ja-en")
+TRANSLATION_STUB_LATENCY_MS = float(os.getenv("TRANSLATION_STUB_LATENCY_MS", "0"))
+
+BACKEND_SECONDS = registry.histogram(
+    "translation_backend_duration_seconds", "Translation backend call time, failures included.", ("backend",)
+)
+BACKEND_CALLS = registry.counter("translation_backend_calls_total", "Translation backend calls.", ("backend", "outcome"))
+
+
+class TranslationBackend:
+    """Interface for a thread-safe machine translation provider that keeps line breaks."""
+
+    name = ""
+    metered = False
+
+    def translate(self, text: str, source: str, target: str) -> str:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class GoogleBackend(TranslationBackend):
+    """Google Translate through deep_translator, borrowing a GoogleTranslator per call from a pool."""
+
+    name = "google"
+    metered = True
+
+    def __init__(self, pool_size: int = TRANSLATION_HTTP_POOL_SIZE):
+        from deep_translator import GoogleTranslator
+
+        self._translator_class = GoogleTranslator
+        self.pool_size = pool_size
+        self._idle: Dict[Tuple[str, str], List] = {}
+        self._lock = threading.Lock()
+
+    def translate(self, text: str, source: str, target: str) -> str:
+        pair = (source, target)
+        with self._lock:
+            idle = self._idle.setdefault(pair, [])
+            translator = idle.pop() if idle else None
+        if translator is None:
+            translator = self._translator_class(source=source, target=target)
+
+        try:
+            translated = translator.translate(text)
+        finally:
+            with self._lock:
+                if len(idle) < self.pool_size:
+                    idle.append(translator)
+        # GoogleTranslator returns None for some replies that echo the input.
+        return text.strip() if translated is None else translated
+
+    def close(self) -> None:
+        with self._lock:
+            self._idle.clear()
+
+
+class LocalModelBackend(TranslationBackend):
+    """Offline translation with a MarianMT model from Hugging Face, loaded on first use."""
+
+    name = "local"
+
+    def __init__(self, model_name: str = TRANSLATION_LOCAL_MODEL, pair: Tuple[str, str] = ("ja", "en")):
+        self.model_name = model_name
+        self.pair = pair
+        self._pipeline = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        from transformers import pipeline
+
+        return pipeline("translation", model=self.model_name, device=-1)
+
+    def translate(self, text: str, source: str, target: str) -> str:
+        if (source, target) != self.pair:
+            raise ValueError(f"{self.model_name} does not translate {source} to {target}")
+
+        lines = text.split("\n")
+        sentences = [line.strip() for line in lines if line.strip()]
+        if not sentences:
+            return text.strip()
+
+        with self._lock:
+            if self._pipeline is None:
+                self._pipeline = self._load()
+            outputs = iter(self._pipeline(sentences))
+
+        return "\n".join(next(outputs)["translation_text"] if line.strip() else "" for line in lines)
+
+
+class StubBackend(TranslationBackend):
+    """Deterministic fake translations: every line prefixed with the target language."""
+
+    name = "stub"
+
+    def __init__(self, latency_seconds: float = TRANSLATION_STUB_LATENCY_MS / 1000):
+        self.latency_seconds = latency_seconds
+
+    def translate(self, text: str, source: str, target: str) -> str:
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        return "\n".join(f"[{target}] {line.strip()}" if line.strip() else "" for line in text.split("\n"))
+
+
+BACKENDS: Dict[str, Callable[[], TranslationBackend]] = {
+    "google": GoogleBackend,
+    "local": LocalModelBackend,
+    "stub": StubBackend,
+}
+
+
+def register_backend(name: str, factory: Callable[[], TranslationBackend]) -> None:
+    """Make a backend available to TRANSLATION_BACKENDS under name."""
+    BACKENDS[name] = factory
+
+
+def create_backend(name: str) -> TranslationBackend:
+    """Create the backend registered under name."""
+    factory = BACKENDS.get(name)
+    if factory is None:
+        raise ValueError(f"Unknown translation backend: {name}")
+    return factory()
+
+
+def create_backends(names: str = TRANSLATION_BACKENDS) -> List[TranslationBackend]:
+    """Create the comma-separated backends in failover order."""
+    backends = [create_backend(name.strip()) for name in names.split(",") if name.strip()]
+    if not backends:
+        raise ValueError("TRANSLATION_BACKENDS names no backend")
+    return backends
+
+
+class CircuitBreaker:
+    """Stops calling a backend after repeated failures, letting one trial call through after reset_seconds."""
+
+    def __init__(
+        self,
+        failure_threshold: int = TRANSLATION_BREAKER_FAILURES,
+        reset_seconds: float = TRANSLATION_BREAKER_RESET_SECONDS,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.opened += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """End a call that neither succeeded nor failed, e.g. one skipped for budget."""
+        with self._lock:
+            self._trial_running = False
+
+
+class BackendSlot:
+    """A backend with its circuit breaker, latency histogram and counters."""
+
+    def __init__(self, backend: TranslationBackend, breaker: Optional[CircuitBreaker] = None):
+        self.backend = backend
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.latency = BACKEND_SECONDS.labels(backend=backend.name)
+        self.successes = 0
+        self.failures = 0
+        self.skipped = 0
+
+    def call(self, text: str, source: str, target: str) -> str:
+        start = time.perf_counter()
+        try:
+            with span("translate", backend=self.backend.name, chars=len(text)):
+                result = self.backend.translate(text, source, target)
+        except Exception:
+            self.latency.observe(time.perf_counter() - start)
+            self.failures += 1
+            BACKEND_CALLS.inc(backend=self.backend.name, outcome="failure")
+            self.breaker.record_failure()
+            raise
+        self.latency.observe(time.perf_counter() - start)
+        self.successes += 1
+        BACKEND_CALLS.inc(backend=self.backend.name, outcome="success")
+        self.breaker.record_success()
+        return result
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "state": self.breaker.state,
+            "successes": self.successes,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "opened": self.breaker.opened,
+            "latency_seconds": self.latency.snapshot(),
+        }
@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.db_service import open_database_service
+from app.models.diary import TRANSLATION_COMPLETED, TRANSLATION_FAILED, TRANSLATION_PENDING
+from app.translation import TranslationService, has_failed_segments, translator
+
+TRANSLATION_ASYNC = os.getenv("TRANSLATION_ASYNC", "false").lower() == "true"
+TRANSLATION_QUEUE_BACKEND = os.getenv("TRANSLATION_QUEUE_BACKEND", "local")
+TRANSLATION_QUEUE_WORKERS = int(os.getenv("TRANSLATION_QUEUE_WORKERS", "2"))
+TRANSLATION_MAX_ATTEMPTS = int(os.getenv("TRANSLATION_MAX_ATTEMPTS", "5"))
+TRANSLATION_RETRY_BASE_SECONDS = float(os.getenv("TRANSLATION_RETRY_BASE_SECONDS", "1"))
+# How long shutdown waits for translations; unfinished entries stay pending.
+TRANSLATION_DRAIN_SECONDS = float(os.getenv("TRANSLATION_DRAIN_SECONDS", "15"))
+
+logger = logging.getLogger(__name__)
+
+
+class TranslationJobQueue:
+    """Interface for queues that translate diary entries, given by ID, in the background."""
+
+    recover_pending = True
+    drained = True
+
+    async def start(self) -> None:
+        """Start processing jobs."""
+
+    async def stop(self) -> None:
+        """Stop processing jobs, finishing the ones in progress."""
+
+    async def enqueue(self, entry_id: str) -> None:
+        """Queue a diary entry for translation."""
+        raise NotImplementedError
+
+    async def wait_for(self, entry_id: str, timeout: float) -> bool:
+        """Wait until the entry's queued translation finishes. Returns False on timeout."""
+        return False
+
+
+class LocalTranslationJobQueue(TranslationJobQueue):
+    """In-process job queue backed by asyncio tasks."""
+
+    def __init__(
+        self,
+        service: TranslationService = translator,
+        workers: int = TRANSLATION_QUEUE_WORKERS,
+        max_attempts: int = TRANSLATION_MAX_ATTEMPTS,
+        retry_base_seconds: float = TRANSLATION_RETRY_BASE_SECONDS,
+        drain_seconds: float = TRANSLATION_DRAIN_SECONDS,
+    ):
+        self.service = service
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.drain_seconds = drain_seconds
+        self._queue: Optional["asyncio.Queue[tuple]"] = None
+        self._tasks: List[asyncio.Task] = []
+        self._retries: Set[asyncio.Task] = set()
+        self._events: Dict[str, asyncio.Event] = {}
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self.drained = True
+        if not self.recover_pending:
+            return
+
+        # Pick up entries left pending by a previous process.
+        pending_ids = await run_in_threadpool(_pending_translation_ids)
+        for entry_id in pending_ids:
+            await self.enqueue(entry_id)
+
+    async def stop(self) -> None:
+        for task in self._retries:
+            task.cancel()
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), self.drain_seconds)
+            except asyncio.TimeoutError:
+                pass
+            # Includes entries whose retry was just cancelled.
+            self.drained = not self._events
+            if not self.drained:
+                logger.warning("Stopped with %d translations unfinished; they stay pending", len(self._events))
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._retries, return_exceptions=True)
+        self._tasks = []
+        self._retries = set()
+
+    async def enqueue(self, entry_id: str, attempt: int = 1) -> None:
+        self._events.setdefault(entry_id, asyncio.Event())
+        await self._queue.put((entry_id, attempt))
+
+    async def wait_for(self, entry_id: str, timeout: float) -> bool:
+        event = self._events.get(entry_id)
+        if event is None:
+            return True
+
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _worker(self) -> None:
+        while True:
+            entry_id, attempt = await self._queue.get()
+            try:
+                await self._process(entry_id, attempt)
+            except Exception:
+                logger.exception("Translation job for %s failed (attempt %d)", entry_id, attempt)
+                await self._retry_or_fail(entry_id, attempt)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, entry_id: str, attempt: int) -> None:
+        # Two short sessions, so no connection is held while translating.
+        pending = await run_in_threadpool(_load_pending_entry, entry_id)
+        if pending is None:
+            self._finish(entry_id)
+            return
+
+        content, previous_segments = pending
+        translated_content, segments = await self.service.translate_incremental_async(content, previous_segments)
+
+        failed = has_failed_segments(segments)
+        if not failed:
+            status = TRANSLATION_COMPLETED
+        elif attempt < self.max_attempts:
+            # Keep the sentences that did translate so the retry only redoes the failures.
+            status = TRANSLATION_PENDING
+        else:
+            status = TRANSLATION_FAILED
+
+        stored = await run_in_threadpool(
+            _store_translation, entry_id, content, None if failed else translated_content, segments, status
+        )
+        if not stored:
+            # Edited while translating; translate the newer content instead.
+            await self.enqueue(entry_id, attempt)
+        elif status == TRANSLATION_PENDING:
+            self._schedule_retry(entry_id, attempt + 1)
+        else:
+            self._finish(entry_id)
+
+    async def _retry_or_fail(self, entry_id: str, attempt: int) -> None:
+        if attempt < self.max_attempts:
+            self._schedule_retry(entry_id, attempt + 1)
+            return
+        try:
+            await run_in_threadpool(_mark_failed, entry_id)
+        except Exception:
+            logger.exception("Could not mark the translation of %s failed", entry_id)
+        self._finish(entry_id)
+
+    def _schedule_retry(self, entry_id: str, attempt: int) -> None:
+        delay = self.retry_base_seconds * (2 ** (attempt - 2))
+
+        async def retry():
+            await asyncio.sleep(delay)
+            await self.enqueue(entry_id, attempt)
+
+        task = asyncio.create_task(retry())
+        self._retries.add(task)
+        task.add_done_callback(self._retries.discard)
+
+    def _finish(self, entry_id: str) -> None:
+        event = self._events.pop(entry_id, None)
+        if event is not None:
+            event.set()
+
+
+def _pending_translation_ids() -> List[str]:
+    with open_database_service() as db_service:
+        return db_service.get_pending_translation_ids()
+
+
+def _load_pending_entry(entry_id: str) -> Optional[Tuple[str, List[Any]]]:
+    """The content and previous segments of an entry awaiting translation, or None."""
+    with open_database_service() as db_service:
+        entry = db_service.get_diary_entry(entry_id)
+        if entry is None or entry.translation_status != TRANSLATION_PENDING:
+            return None
+        return entry.content, entry.translated_segments
+
+
+def _mark_failed(entry_id: str) -> None:
+    """Give up on an entry's translation, keeping whatever it already has."""
+    with open_database_service() as db_service:
+        entry = db_service.get_diary_entry(entry_id)
+        if entry is not None and entry.translation_status == TRANSLATION_PENDING:
+            db_service.complete_translation(entry, entry.translated_content, entry.translated_segments, TRANSLATION_FAILED)
+
+
+def _store_translation(
+    entry_id: str,
+    content: str,
+    translated_content: Optional[str],
+    segments: List[Any],
+    status: str,
+) -> bool:
+    """Store a translation of content. Returns False if the entry was edited meanwhile."""
+    with open_database_service() as db_service:
+        entry = db_service.get_diary_entry(entry_id)
+        if entry is None:
+            # Deleted while translating; nothing left to do.
+            return True
+        if entry.content != content:
+            return False
+        if translated_content is None:
+            translated_content = entry.translated_content
+        db_service.complete_translation(entry, translated_content, segments, status)
+        return True
+
+
+def create_job_queue(backend: str = TRANSLATION_QUEUE_BACKEND) -> TranslationJobQueue:
+    """Create the translation job queue for the configured backend."""
+    if backend == "local":
+        return LocalTranslationJobQueue()
+    raise ValueError(f"Unknown translation queue backend: {backend}")
+
+
+job_queue = create_job_queue()
@@ -0,0 +1,133 @@
+"""
+Bytes on the wire and CPU per request for diary list responses, per serializer and content coding.
+
+    cd backend && DATABASE_URL=sqlite:// python -m benchmarks.serialization [--sizes 20,50,200] [--repeat 200]
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app.compression import COMPRESSORS
+from app.fast_json import dumps, diary_entry_to_dict, orjson
+from app.models.diary import DiaryEntry, FavoriteExpression
+from app.schemas import DiaryEntry as DiaryEntrySchema
+
+# Sentences are assembled from parts so the text is not unrealistically repetitive.
+JAPANESE_PARTS = [
+    ["今日は", "昨日は", "朝から", "夜になって", "週末に", "久しぶりに", "仕事の後で", "雨の中"],
+    ["友達と", "家族と", "一人で", "同僚と", "母と", "犬と", "先生と", "近所の人と"],
+    ["駅前のカフェで", "公園で", "図書館で", "海の近くで", "新しい店で", "会社の近くで", "山の上で", "家で"],
+    ["本を読んだ", "ランチを食べた", "映画を見た", "散歩をした", "日本語を勉強した", "写真を撮った", "料理を作った", "話をした"],
+]
+ENGLISH_PARTS = [
+    ["Today", "Yesterday", "Since the morning", "In the evening", "On the weekend", "For the first time in a while", "After work", "In the rain"],
+    ["with a friend", "with my family", "on my own", "with a coworker", "with my mother", "with the dog", "with my teacher", "with a neighbor"],
+    ["at the cafe by the station", "in the park", "at the library", "near the sea", "at a new shop", "near the office", "on the mountain", "at home"],
+    ["I read a book.", "I had lunch.", "I watched a movie.", "I went for a walk.", "I studied Japanese.", "I took photos.", "I cooked dinner.", "we talked for hours."],
+]
+
+
+def make_entries(count: int, seed: int = 0) -> List[DiaryEntry]:
+    """Transient DiaryEntry rows of roughly 8 sentences each, some with favorites."""
+    rng = random.Random(seed)
+    now = datetime(2025, 1, 1, 12, 0, 0)
+    entries = []
+    for i in range(count):
+        picks = [[rng.randrange(8) for _ in JAPANESE_PARTS] for _ in range(8)]
+        entry = DiaryEntry(
+            id=f"{rng.getrandbits(128):032x}",
+            user_id="user",
+            content="".join(
+                "".join(part[p] for part, p in zip(JAPANESE_PARTS, pick)) + "。" for pick in picks
+            ),
+            translated_content=" ".join(
+                " ".join(part[p] for part, p in zip(ENGLISH_PARTS, pick)) for pick in picks
+            ),
+            translation_status="completed",
+            created_at=now - timedelta(hours=i),
+            updated_at=now - timedelta(hours=i) + timedelta(minutes=5),
+        )
+        entry.favorite_expressions = [
+            FavoriteExpression(
+                id=f"{rng.getrandbits(128):032x}",
+                japanese_text="散歩",
+                english_text="walk",
+                note=None,
+                diary_entry_id=entry.id,
+                created_at=now,
+            )
+            for _ in range(rng.randrange(3))
+        ]
+        entries.append(entry)
+    return entries
+
+
+def render_response_model(entries: List[DiaryEntry]) -> bytes:
+    """What FastAPI does for response_model=List[DiaryEntry]: validate, encode, dump."""
+    adapter = TypeAdapter(List[DiaryEntrySchema])
+    validated = adapter.validate_python(entries, from_attributes=True)
+    content = jsonable_encoder(adapter.dump_python(validated, mode="json"))
+    return JSONResponse(content).body
+
+
+def render_fast(entries: List[DiaryEntry]) -> bytes:
+    return dumps([diary_entry_to_dict(entry) for entry in entries])
+
+
+def cpu_ms(func: Callable[[], object], repeat: int) -> float:
+    """Mean CPU milliseconds per call."""
+    func()
+    start = time.process_time()
+    for _ in range(repeat):
+        func()
+    return (time.process_time() - start) * 1000 / repeat
+
+
+def compress(encoding: str, body: bytes) -> bytes:
+    compressor = COMPRESSORS[encoding]()
+    return compressor.compress(body) + compressor.finish()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="20,50,200", help="Comma-separated entries per response")
+    parser.add_argument("--repeat", type=int, default=200, help="Iterations per measurement")
+    args = parser.parse_args()
+
+    print(f"JSON encoder for fast path: {'orjson' if orjson is not None else 'json (stdlib)'}")
+    print(f"Encodings available: {', '.join(COMPRESSORS)}")
+    print()
+    print(f"{'entries':>7}  {'path':<22}{'bytes':>10}{'cpu ms':>10}")
+
+    for size in (int(value) for value in args.sizes.split(",")):
+        entries = make_entries(size)
+        default_body = render_response_model(entries)
+        fast_body = render_fast(entries)
+        assert json.loads(default_body) == json.loads(fast_body)
+
+        rows = [
+            ("response_model", len(default_body), cpu_ms(lambda: render_response_model(entries), args.repeat)),
+            ("fast json", len(fast_body), cpu_ms(lambda: render_fast(entries), args.repeat)),
+        ]
+        for encoding in COMPRESSORS:
+            compressed = compress(encoding, fast_body)
+            rows.append((
+                f"fast json + {encoding}",
+                len(compressed),
+                cpu_ms(lambda: compress(encoding, render_fast(entries)), args.repeat),
+            ))
+
+        for name, size_bytes, ms in rows:
+            print(f"{size:>7}  {name:<22}{size_bytes:>10}{ms:>10.3f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import os
+import tempfile
+import uuid
+from typing import Dict
+
+import pytest
+
+# The app reads its settings at import time, so they are set before any
+# test module imports it.
+_DATA_DIR = tempfile.mkdtemp(prefix="parallel-diary-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{_DATA_DIR}/test.db",
+    "STORAGE_BACKEND": "sql",
+    "DB_INIT_MODE": "create_all",
+    "STARTUP_WARM_UP": "false",
+    "PASSWORD_HASH_EXECUTOR": "thread",
+    "BCRYPT_ROUNDS": "4",
+    "TRANSLATION_BACKENDS": "stub",
+    "TRANSLATION_ASYNC": "false",
+    "RATE_LIMIT_ENABLED": "false",
+    "ADMIN_TOKEN": "test-admin-token",
+})
+
+ADMIN_HEADERS = {"Authorization": "Bearer test-admin-token"}
+
+
+@pytest.fixture(scope="session")
+def client():
+    """A TestClient over the app, started once for the whole run."""
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+def register(client, email: str = None, password: str = "password") -> Dict[str, str]:
+    """Register a fresh user and return Authorization headers for them."""
+    email = email or f"{uuid.uuid4().hex}@example.com"
+    response = client.post("/auth/register", json={"email": email, "password": password})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture
+def auth_headers(client) -> Dict[str, str]:
+    return register(client)
+
+
+class CountingBackend:
+    """Translation backend that records each call and can be told to fail."""
+
+    name = "counting"
+    metered = False
+
+    def __init__(self, fail_on=()):
+        self.calls = []
+        self.fail_on = set(fail_on)
+
+    def translate(self, text: str, source: str, target: str) -> str:
+        self.calls.append(text)
+        if any(marker in text for marker in self.fail_on):
+            raise RuntimeError("backend down")
+        return "\n".join(f"EN<{line}>" if line else "" for line in text.split("\n"))
+
+    def close(self) -> None:
+        pass
+
+
+@pytest.fixture
+def rain_fails(monkeypatch):
+    """Make the API translate with a backend that fails on any sentence mentioning rain."""
+    from app.translation import TranslationCache, TranslationService
+
+    service = TranslationService(cache=TranslationCache(session_factory=None), backends=[CountingBackend(fail_on=["雨"])])
+    monkeypatch.setattr("app.api.translator", service)
+    yield service
+    service.shutdown()
+
+
+def create_user_id() -> str:
+    """Create a user directly in the database and return its ID."""
+    from app.db_service import open_database_service
+    from app.schemas import UserCreate
+
+    with open_database_service() as db_service:
+        user = db_service.create_user(
+            UserCreate(email=f"{uuid.uuid4().hex}@example.com", password="password"), hashed_password="unused"
+        )
+        return user.id
@@ -0,0 +1,117 @@
+import asyncio
+import threading
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+
+import app.search as search
+from app.database import memory_db
+from app.db_async import create_async_db_engine, to_async_url
+from app.db_config import DATABASE_URL
+from app.db_service_async import AsyncDatabaseService, InlineDatabaseService, ThreadedDatabaseService, service_for
+from app.schemas import UserCreate
+from app.search import InMemorySearchIndex
+from tests.conftest import create_user_id
+
+
+def run_with_service(work):
+    """Run work(service) against an AsyncDatabaseService on the test database."""
+
+    async def run():
+        engine = create_async_db_engine(DATABASE_URL)
+        try:
+            async with async_sessionmaker(bind=engine, expire_on_commit=False)() as db:
+                return await work(AsyncDatabaseService(db))
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+
+def test_async_urls_use_asyncio_drivers():
+    assert to_async_url("sqlite:///./diary.db") == "sqlite+aiosqlite:///./diary.db"
+    assert to_async_url("postgresql://u:p@db/diary") == "postgresql+psycopg://u:p@db/diary"
+    assert to_async_url("postgresql+psycopg2://u:p@db/diary") == "postgresql+psycopg://u:p@db/diary"
+
+
+def test_service_for_matches_the_session_type():
+    assert isinstance(service_for(AsyncSession()), AsyncDatabaseService)
+    assert isinstance(service_for(Session()), ThreadedDatabaseService)
+    assert isinstance(service_for(memory_db), InlineDatabaseService)
+
+
+def test_entry_lifecycle_with_favorites_loaded(client):
+    user_id = create_user_id()
+
+    async def create(service):
+        entry = await service.create_diary_entry(user_id, "晴れ。", "Sunny.", [["晴れ。", "Sunny."]])
+        await service.add_favorite_expression(entry, "晴れ", "sunny")
+
+    async def edit(service):
+        [entry] = await service.get_user_diary_entries(user_id)
+        # Favorites are loaded up front, so reading them needs no I/O.
+        favorites = [favorite.english_text for favorite in entry.favorite_expressions]
+
+        updated = await service.update_diary_entry(entry, "雨。", "Rain.")
+        version = await service.get_user_data_version(user_id)
+        deleted = await service.delete_diary_entry(updated)
+        remaining = await service.get_user_diary_entries(user_id)
+        return favorites, updated, version, deleted, remaining
+
+    # One session per step, as each request gets its own.
+    run_with_service(create)
+    favorites, updated, version, deleted, remaining = run_with_service(edit)
+
+    assert favorites == ["sunny"]
+    assert (updated.content, updated.translated_content) == ("雨。", "Rain.")
+    assert version >= 3
+    assert deleted
+    assert remaining == []
+
+
+def test_create_user_and_verify_password(client):
+    async def work(service):
+        from app.passwords import password_hasher
+
+        created = await service.create_user(
+            UserCreate(email="async-service@example.com", password="secret"),
+            hashed_password=await password_hasher.hash("secret"),
+        )
+        return (
+            created.id,
+            await service.verify_user_password("async-service@example.com", "secret"),
+            await service.verify_user_password("async-service@example.com", "wrong"),
+        )
+
+    user_id, verified, rejected = run_with_service(work)
+
+    assert verified.id == user_id
+    assert rejected is None
+
+
+def test_in_process_search_builds_and_scores_off_the_event_loop(client, monkeypatch):
+    monkeypatch.setattr(search, "search_backend", "memory")
+    index = InMemorySearchIndex()
+    monkeypatch.setattr(search, "search_index", index)
+    user_id = create_user_id()
+    threads = []
+
+    for name in ("load_user", "search"):
+        method = getattr(index, name)
+
+        def recorded(*args, method=method):
+            threads.append(threading.current_thread())
+            return method(*args)
+
+        monkeypatch.setattr(index, name, recorded)
+
+    async def work(service):
+        entry = await service.create_diary_entry(user_id, "公園を散歩した。", "I took a walk in the park.")
+        found = await service.search_diary_entries(user_id, "散歩", 10, 0)
+        return entry, found
+
+    entry, found = run_with_service(work)
+
+    assert [item.id for item in found] == [entry.id]
+    assert len(threads) == 2
+    assert threading.main_thread() not in threads
@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+from app.auth import User, UserCache, user_cache
+from app.db_service import DatabaseService, open_database_service
+from tests.conftest import register
+
+
+def make_user(user_id: str) -> User:
+    return User(id=user_id, email=f"{user_id}@example.com", created_at="2024-01-01T00:00:00")
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    """Counts user lookups that reach the database."""
+    calls = []
+    original = DatabaseService.get_user_by_id
+
+    def counting(self, user_id):
+        calls.append(user_id)
+        return original(self, user_id)
+
+    monkeypatch.setattr(DatabaseService, "get_user_by_id", counting)
+    return calls
+
+
+def test_cached_user_expires_after_ttl():
+    cache = UserCache(ttl_seconds=0.05)
+    cache.set(make_user("a"))
+
+    assert cache.get("a").id == "a"
+    time.sleep(0.06)
+    assert cache.get("a") is None
+
+
+def test_cache_drops_oldest_users_past_max_entries():
+    cache = UserCache(max_entries=2)
+    for user_id in ("a", "b", "c"):
+        cache.set(make_user(user_id))
+
+    assert cache.get("a") is None
+    assert cache.get("b") is not None and cache.get("c") is not None
+
+
+def test_zero_ttl_disables_the_cache():
+    cache = UserCache(ttl_seconds=0)
+    cache.set(make_user("a"))
+    assert cache.get("a") is None
+
+
+def test_repeat_requests_skip_the_user_lookup(client, lookups):
+    headers = register(client)
+    user_cache.clear()
+
+    for _ in range(3):
+        assert client.get("/auth/me", headers=headers).status_code == 200
+
+    assert len(lookups) == 1
+
+
+def test_updating_a_user_evicts_them(client):
+    headers = register(client)
+    user_id = client.get("/auth/me", headers=headers).json()["id"]
+    assert user_cache.get(user_id) is not None
+
+    with open_database_service() as db_service:
+        db_service.update_user_password_hash(db_service.get_user_by_id(user_id), "rehashed")
+
+    assert user_cache.get(user_id) is None
@@ -0,0 +1,109 @@
+import asyncio
+
+from app.translation import TranslationCache, TranslationService
+from tests.conftest import CountingBackend
+
+
+class FlatteningBackend(CountingBackend):
+    """Joins multi-line requests onto one line, as some translators do."""
+
+    def translate(self, text: str, source: str, target: str) -> str:
+        return super().translate(text, source, target).replace("\n", " ")
+
+
+def make_service(backend):
+    return TranslationService(cache=TranslationCache(session_factory=None), backends=[backend])
+
+
+def test_shared_sentences_are_translated_once_in_one_request():
+    backend = CountingBackend()
+    service = make_service(backend)
+
+    results = service.translate_many(["晴れ。散歩した。", "雨。散歩した。"])
+
+    assert backend.calls == ["晴れ。\n散歩した。\n雨。"]
+    assert [text for text, segments in results] == ["EN<晴れ。> EN<散歩した。>", "EN<雨。> EN<散歩した。>"]
+
+
+def test_cached_sentences_are_skipped():
+    backend = CountingBackend()
+    service = make_service(backend)
+    service.translate("晴れ。", "ja", "en")
+    backend.calls.clear()
+
+    service.translate_many(["晴れ。雨。"])
+
+    assert backend.calls == ["雨。"]
+
+
+def test_wrong_line_count_falls_back_to_one_request_per_sentence():
+    backend = FlatteningBackend()
+    service = make_service(backend)
+
+    [(text, segments)] = service.translate_many(["晴れ。雨。"])
+
+    assert backend.calls == ["晴れ。\n雨。", "晴れ。", "雨。"]
+    assert text == "EN<晴れ。> EN<雨。>"
+
+
+def test_requests_are_packed_up_to_max_chars():
+    chunks = TranslationService._pack(["あ" * 5, "い" * 5, "う" * 5], max_chars=12)
+    assert chunks == [["あ" * 5, "い" * 5], ["う" * 5]]
+
+
+def test_async_batch_marks_only_the_failed_request():
+    backend = CountingBackend(fail_on=["雨"])
+    service = make_service(backend)
+    # Each sentence is long enough to need a request of its own.
+    sunny, rainy = "晴" * 3000 + "。", "雨" * 3000 + "。"
+
+    results = asyncio.run(service.translate_many_async([sunny, rainy]))
+    service.shutdown()
+
+    assert len(backend.calls) == 2
+    assert results[0][0] == f"EN<{sunny}>"
+    assert results[1][1] == [[rainy, None]]
+
+
+def test_failed_request_is_not_retried_sentence_by_sentence():
+    backend = CountingBackend(fail_on=["雨"])
+    service = make_service(backend)
+
+    [(text, segments)] = service.translate_many(["晴れ。雨。"])
+
+    assert backend.calls == ["晴れ。\n雨。"]
+    assert segments == [["晴れ。", None], ["雨。", None]]
+
+
+def test_batch_endpoint_creates_translated_entries(client, auth_headers):
+    response = client.post(
+        "/api/diary/batch",
+        json={"entries": [{"content": "晴れ。"}, {"content": "雨。"}]},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 200, response.text
+    entries = response.json()
+    assert [entry["content"] for entry in entries] == ["晴れ。", "雨。"]
+    assert [entry["translated_content"] for entry in entries] == ["[en] 晴れ。", "[en] 雨。"]
+
+
+def test_batch_entries_with_untranslated_sentences_are_stored_as_failed(client, auth_headers, rain_fails):
+    response = client.post(
+        "/api/diary/batch",
+        # Long enough that each entry is sent in a request of its own.
+        json={"entries": [{"content": "晴" * 3000 + "。"}, {"content": "雨" * 3000 + "。"}]},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 200, response.text
+    assert [entry["translation_status"] for entry in response.json()] == ["completed", "failed"]
+
+
+def test_batch_endpoint_rejects_oversized_batches(client, auth_headers):
+    from app.api import DIARY_BATCH_MAX_ENTRIES
+
+    entries = [{"content": "あ。"}] * (DIARY_BATCH_MAX_ENTRIES + 1)
+    response = client.post("/api/diary/batch", json={"entries": entries}, headers=auth_headers)
+
+    assert response.status_code == 413
@@ -0,0 +1,75 @@
+import asyncio
+import json
+import random
+
+import httpx
+from fastapi.routing import APIRoute
+
+from benchmarks.load import ROUTES, UserContext, compare, import_body, measure, percentile
+from tests.conftest import register
+
+
+def test_every_api_route_is_benchmarked(client):
+    benchmarked = {route.name.split(" (")[0].split("?")[0] for route in ROUTES}
+    served = {
+        f"{method} {route.path}"
+        for route in client.app.routes
+        if isinstance(route, APIRoute) and route.path.startswith(("/api/", "/auth/"))
+        for method in route.methods
+    }
+    # Logout revokes the benchmark user's token, so it is left out on purpose.
+    assert served - benchmarked == {"POST /auth/logout"}
+
+
+def test_percentile_is_nearest_rank():
+    values = [float(i) for i in range(1, 101)]
+
+    assert percentile(values, 0.50) == 50.0
+    assert percentile(values, 0.99) == 99.0
+    assert percentile(values, 1.0) == 100.0
+    assert percentile([], 0.5) == 0.0
+
+
+def test_import_body_is_accepted_by_the_import_route(client, auth_headers):
+    body = import_body(random.Random(1), count=4)
+
+    response = client.post(
+        "/api/diary/import", content=body, headers=dict(auth_headers, **{"Content-Type": "application/x-ndjson"})
+    )
+
+    assert response.json() == {"imported": 4}
+
+
+def test_measure_summarizes_latency_and_statuses(client):
+    headers = register(client)
+    me = client.get("/auth/me", headers=headers).json()
+    ctx = UserContext(0, me["id"], me["email"], headers["Authorization"].split()[1], [])
+    route = next(route for route in ROUTES if route.name == "GET /auth/me")
+
+    async def run():
+        transport = httpx.ASGITransport(app=client.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as bench_client:
+            return await measure(bench_client, route, ctx, concurrency=3, requests=9, rng=random.Random(0))
+
+    result = asyncio.run(run())
+
+    assert result["status"] == {"200": 9}
+    assert result["errors"] == 0
+    latency = result["latency_ms"]
+    assert 0 < latency["p50"] <= latency["p95"] <= latency["p99"] <= latency["max"]
+
+
+def test_compare_prints_relative_changes(tmp_path, capsys):
+    def result(rps, p50):
+        return {
+            "route": "GET /api/diary", "entries": 10, "concurrency": 8, "rps": rps,
+            "latency_ms": {"p50": p50, "p95": p50 * 2, "p99": p50 * 3},
+        }
+
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps({"results": [result(100.0, 10.0)]}))
+
+    compare([result(150.0, 5.0)], str(baseline))
+
+    line = capsys.readouterr().out.strip().splitlines()[-1]
+    assert line.split()[-4:] == ["+50.0%", "-50.0%", "-50.0%", "-50.0%"]
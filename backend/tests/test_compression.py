@@ -0,0 +1,123 @@
+import gzip
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import app.api as api
+from app.compression import CompressionMiddleware, negotiate_encoding
+from app.fast_json import diary_entries_response, dumps
+
+LARGE = {"entries": [{"content": "今日は晴れ。" * 20, "index": i} for i in range(50)]}
+
+
+def large(request):
+    return JSONResponse(LARGE, headers={"ETag": '"v1"'})
+
+
+def small(request):
+    return JSONResponse({"ok": True})
+
+
+def stream(request):
+    async def rows():
+        for i in range(3):
+            yield json.dumps({"row": i}) + "\n"
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+
+def events(request):
+    return Response("data: x\n\n" * 500, media_type="text/event-stream")
+
+
+@pytest.fixture
+def compressed_client():
+    app = Starlette(routes=[
+        Route("/large", large), Route("/small", small), Route("/stream", stream), Route("/events", events),
+    ])
+    app.add_middleware(CompressionMiddleware, minimum_size=500, encodings=["br", "gzip"])
+    return TestClient(app)
+
+
+def test_negotiation_honours_q_values_then_server_preference():
+    assert negotiate_encoding("gzip, br", ["zstd", "br", "gzip"]) == "br"
+    assert negotiate_encoding("gzip;q=1.0, br;q=0.5", ["br", "gzip"]) == "gzip"
+    assert negotiate_encoding("*", ["br", "gzip"]) == "br"
+    assert negotiate_encoding("br;q=0, *;q=0.1", ["br", "gzip"]) == "gzip"
+    assert negotiate_encoding("identity", ["br", "gzip"]) is None
+    assert negotiate_encoding("", ["gzip"]) is None
+
+
+def test_large_json_is_compressed_and_etag_weakened(compressed_client):
+    response = compressed_client.get("/large", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert response.headers["ETag"] == 'W/"v1"'
+    assert response.json() == LARGE
+    assert int(response.headers["Content-Length"]) < len(json.dumps(LARGE, ensure_ascii=False).encode())
+
+
+def test_brotli_when_preferred(compressed_client):
+    pytest.importorskip("brotli")
+    response = compressed_client.get("/large", headers={"Accept-Encoding": "gzip, br"})
+
+    assert response.headers["Content-Encoding"] == "br"
+    assert response.json() == LARGE
+
+
+def test_small_bodies_and_event_streams_are_left_alone(compressed_client):
+    small_response = compressed_client.get("/small", headers={"Accept-Encoding": "gzip"})
+    events_response = compressed_client.get("/events", headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in small_response.headers
+    assert "Content-Encoding" not in events_response.headers
+
+
+def test_streams_are_compressed_chunk_by_chunk(compressed_client):
+    with compressed_client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+        raw = b"".join(response.iter_raw())
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in response.headers
+    assert [json.loads(line) for line in gzip.decompress(raw).decode().splitlines()] == [{"row": i} for i in range(3)]
+
+
+def test_dumps_is_compact_utf8():
+    assert dumps({"text": "晴れ", "n": [1, 2]}) == '{"text":"晴れ","n":[1,2]}'.encode("utf-8")
+
+
+def test_fast_json_list_matches_the_response_model(client, auth_headers, monkeypatch):
+    created = client.post("/api/diary", json={"content": "晴れ。"}, headers=auth_headers).json()
+    client.post(
+        f"/api/diary/{created['id']}/favorite",
+        json={"japanese_text": "晴れ", "english_text": "sunny", "note": None},
+        headers=auth_headers,
+    )
+
+    expected = client.get("/api/diary", headers=auth_headers).json()
+    expected_fields = client.get("/api/diary", params={"fields": "content"}, headers=auth_headers).json()
+    monkeypatch.setattr(api, "FAST_JSON_RESPONSES", True)
+    fast = client.get("/api/diary", headers=auth_headers)
+    fast_fields = client.get("/api/diary", params={"fields": "content"}, headers=auth_headers)
+
+    assert fast.json() == expected
+    assert fast_fields.json() == expected_fields
+    assert "ETag" in fast.headers
+
+
+def test_fast_json_list_keeps_repeated_headers():
+    response = Response()
+    response.headers.append("Set-Cookie", "a=1")
+    response.headers.append("Set-Cookie", "b=2")
+    response.headers["ETag"] = 'W/"1"'
+
+    fast = diary_entries_response([], response)
+
+    assert fast.headers.getlist("set-cookie") == ["a=1", "b=2"]
+    assert fast.headers["etag"] == 'W/"1"'
+    assert fast.headers.getlist("content-length") == ["2"]
@@ -0,0 +1,69 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+import app.db_config as db_config
+from app.db_config import InstrumentedQueuePool, pool_options, pool_stats, prewarm_pool
+
+
+@pytest.fixture
+def make_engine(tmp_path, monkeypatch):
+    """Build SQLite engines on the instrumented pool with small pool settings."""
+    engines = []
+
+    def make(pool_size=2, max_overflow=0, pool_timeout=0.1):
+        monkeypatch.setattr(db_config, "DB_POOL_SIZE", pool_size)
+        monkeypatch.setattr(db_config, "DB_MAX_OVERFLOW", max_overflow)
+        monkeypatch.setattr(db_config, "DB_POOL_TIMEOUT", pool_timeout)
+        engine = create_engine(
+            f"sqlite:///{tmp_path / f'pool{len(engines)}.db'}",
+            connect_args={"check_same_thread": False},
+            **pool_options(InstrumentedQueuePool),
+        )
+        engines.append(engine)
+        return engine
+
+    yield make
+    for engine in engines:
+        engine.dispose()
+
+
+def test_each_engine_gets_its_own_metrics(make_engine):
+    first, second = make_engine(), make_engine()
+    with first.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+    assert pool_stats(first)["checkouts"] == 1
+    assert pool_stats(second)["checkouts"] == 0
+
+
+def test_stats_report_pool_usage(make_engine):
+    engine = make_engine(pool_size=3)
+    with engine.connect():
+        stats = pool_stats(engine)
+
+    assert stats["size"] == 3
+    assert stats["checked_out"] == 1
+    assert pool_stats(engine)["checked_out"] == 0
+
+
+def test_checkout_timeouts_are_counted(make_engine):
+    engine = make_engine(pool_size=1, max_overflow=0, pool_timeout=0.05)
+
+    with engine.connect():
+        with pytest.raises(PoolTimeoutError):
+            engine.connect()
+
+    stats = pool_stats(engine)
+    assert stats["timeouts"] == 1
+    assert stats["wait_seconds_max"] >= 0.05
+
+
+def test_prewarm_leaves_connections_checked_in(make_engine):
+    engine = make_engine(pool_size=2)
+
+    prewarm_pool(engine, connections=5)
+
+    stats = pool_stats(engine)
+    assert stats["checked_in"] == 2
+    assert stats["checked_out"] == 0
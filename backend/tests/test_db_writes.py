@@ -0,0 +1,92 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from app.db_config import SessionLocal, engine
+from app.db_service import DatabaseService
+from tests.conftest import create_user_id
+
+
+@contextmanager
+def recorded_statements():
+    """Collect the SQL statements sent to the database inside the block."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.split()[0].upper())
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+@contextmanager
+def database_service():
+    db = SessionLocal()
+    try:
+        yield DatabaseService(db)
+    finally:
+        db.close()
+
+
+def test_create_is_one_insert_and_needs_no_reload(client):
+    user_id = create_user_id()
+
+    with database_service() as db_service, recorded_statements() as statements:
+        entry = db_service.create_diary_entry(user_id, "晴れ。", "Sunny.")
+        assert entry.id and entry.created_at is not None
+        assert entry.favorite_expressions == []
+
+    assert statements == ["INSERT", "UPDATE"]
+
+
+def test_update_returns_the_new_row_and_bumps_the_version(client):
+    user_id = create_user_id()
+    with database_service() as db_service:
+        entry = db_service.create_diary_entry(user_id, "晴れ。", "Sunny.")
+
+        with recorded_statements() as statements:
+            updated = db_service.update_diary_entry(entry, "雨。", "Rain.")
+
+    assert statements == ["UPDATE", "UPDATE"]
+    assert (updated.content, updated.translated_content) == ("雨。", "Rain.")
+    assert updated.updated_at is not None
+
+
+def test_update_of_a_deleted_entry_returns_none(client):
+    user_id = create_user_id()
+    with database_service() as db_service:
+        entry = db_service.create_diary_entry(user_id, "晴れ。", "Sunny.")
+        assert db_service.delete_diary_entry(entry)
+
+        version = db_service.get_user_data_version(user_id)
+
+        with recorded_statements() as statements:
+            assert db_service.update_diary_entry(entry, "雨。", "Rain.") is None
+            assert not db_service.delete_diary_entry(entry)
+
+    # Nothing changed, so the version (and every ETag derived from it) stays put.
+    assert statements == ["UPDATE", "DELETE", "DELETE"]
+    with database_service() as db_service:
+        assert db_service.get_user_data_version(user_id) == version
+
+
+def test_delete_removes_favorites_added_since_the_entry_was_loaded(client):
+    user_id = create_user_id()
+    with database_service() as db_service:
+        entry = db_service.create_diary_entry(user_id, "雨。", "Rain.")
+
+    with database_service() as db_service:
+        loaded = db_service.get_diary_entry(entry.id)
+        assert loaded.favorite_expressions == []
+        with database_service() as other:
+            other.add_favorite_expression(other.get_diary_entry(entry.id), "雨", "rain")
+
+        with recorded_statements() as statements:
+            assert db_service.delete_diary_entry(loaded)
+
+    assert statements == ["DELETE", "DELETE", "UPDATE"]
+    with database_service() as db_service:
+        assert db_service.get_user_favorite_expressions(user_id) == []
@@ -0,0 +1,93 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from tests.conftest import register
+
+
+def create_entries(client, headers, count):
+    # One batch insert, so several rows may share a created_at.
+    response = client.post(
+        "/api/diary/batch",
+        json={"entries": [{"content": f"日記{i}。"} for i in range(count)]},
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+
+
+def read_all_pages(client, headers, **params):
+    entries, cursor, pages = [], params.pop("cursor", None), 0
+    while True:
+        query = dict(params, **({"cursor": cursor} if cursor else {}))
+        response = client.get("/api/diary", params=query, headers=headers)
+        assert response.status_code == 200, response.text
+        entries.extend(response.json())
+        pages += 1
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return entries, pages
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 1, 12, 30, 0, 123456)
+    assert decode_cursor(encode_cursor(created_at, "entry-1")) == (created_at, "entry-1")
+    assert decode_cursor(None) is None
+
+
+def test_malformed_cursor_is_rejected(client, auth_headers):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor("not a cursor")
+    assert error.value.status_code == 400
+
+    response = client.get("/api/diary", params={"cursor": "%%%"}, headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_pages_cover_every_entry_once_in_order(client, auth_headers):
+    create_entries(client, auth_headers, 7)
+
+    entries, pages = read_all_pages(client, auth_headers, limit=2)
+
+    keys = [(entry["created_at"], entry["id"]) for entry in entries]
+    assert pages == 4
+    assert len(set(keys)) == 7
+    assert keys == sorted(keys, reverse=True)
+
+    ascending, _ = read_all_pages(client, auth_headers, limit=3, order="asc")
+    assert [entry["id"] for entry in ascending] == [entry["id"] for entry in reversed(entries)]
+
+
+def test_new_entries_do_not_shift_later_pages(client, auth_headers):
+    create_entries(client, auth_headers, 4)
+    original, _ = read_all_pages(client, auth_headers)
+    first = client.get("/api/diary", params={"limit": 2}, headers=auth_headers)
+    cursor = first.headers[NEXT_CURSOR_HEADER]
+
+    create_entries(client, auth_headers, 3)
+    rest, _ = read_all_pages(client, auth_headers, limit=2, cursor=cursor)
+
+    # Nothing from the first page repeats and nothing older is skipped. A
+    # new row can only appear if it ties the cursor's created_at.
+    seen = [entry["id"] for entry in first.json() + rest]
+    assert len(seen) == len(set(seen))
+    assert {entry["id"] for entry in original} <= set(seen)
+
+
+def test_fields_projection(client, auth_headers):
+    create_entries(client, auth_headers, 1)
+
+    response = client.get("/api/diary", params={"fields": "content"}, headers=auth_headers)
+    assert response.status_code == 200
+    assert set(response.json()[0]) == {"id", "created_at", "content"}
+
+    response = client.get("/api/diary", params={"fields": "content,password"}, headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_entries_are_scoped_to_their_owner(client, auth_headers):
+    create_entries(client, auth_headers, 2)
+
+    entries, _ = read_all_pages(client, register(client))
+    assert entries == []
@@ -0,0 +1,60 @@
+import uuid
+
+from app.db_service import DatabaseService
+
+
+def test_deleting_an_entry_that_is_already_gone_is_a_404(client, auth_headers, monkeypatch):
+    entry = client.post("/api/diary", json={"content": "消える。"}, headers=auth_headers).json()
+    original = DatabaseService.delete_diary_entry
+
+    def deleted_concurrently(self, db_entry):
+        original(self, db_entry)
+        return original(self, db_entry)
+
+    monkeypatch.setattr(DatabaseService, "delete_diary_entry", deleted_concurrently)
+    response = client.delete(f"/api/diary/{entry['id']}", headers=auth_headers)
+
+    assert response.status_code == 404
+
+
+def test_deleted_entry_is_gone(client, auth_headers):
+    entry = client.post("/api/diary", json={"content": "消える。"}, headers=auth_headers).json()
+
+    assert client.delete(f"/api/diary/{entry['id']}", headers=auth_headers).status_code == 200
+    assert client.get(f"/api/diary/{entry['id']}", headers=auth_headers).status_code == 404
+
+
+def test_entry_with_an_untranslated_sentence_is_stored_as_failed(client, auth_headers, rain_fails):
+    created = client.post("/api/diary", json={"content": "雨。"}, headers=auth_headers).json()
+    assert created["translation_status"] == "failed"
+
+    updated = client.put(f"/api/diary/{created['id']}", json={"content": "晴れ。"}, headers=auth_headers).json()
+    assert updated["translation_status"] == "completed"
+    assert updated["translated_content"] == "EN<晴れ。>"
+
+
+def test_favorite_on_an_entry_deleted_meanwhile_is_a_404(client, auth_headers, monkeypatch):
+    entry = client.post("/api/diary", json={"content": "消える。"}, headers=auth_headers).json()
+
+    def entry_gone(self, db_entry, *args):
+        # What the in-memory store raises once the entry is gone.
+        raise KeyError(db_entry.id)
+
+    monkeypatch.setattr(DatabaseService, "add_favorite_expression", entry_gone)
+    response = client.post(
+        f"/api/diary/{entry['id']}/favorite", json={"japanese_text": "消", "english_text": "gone"}, headers=auth_headers
+    )
+
+    assert response.status_code == 404
+
+
+def test_concurrent_registration_of_one_email_is_a_400(client, monkeypatch):
+    # Both requests pass the existence check before either inserts.
+    monkeypatch.setattr(DatabaseService, "get_user_by_email", lambda self, email: None)
+    email = f"{uuid.uuid4().hex}@example.com"
+
+    first = client.post("/auth/register", json={"email": email, "password": "password"})
+    second = client.post("/auth/register", json={"email": email, "password": "password"})
+
+    assert first.status_code == 200
+    assert second.status_code == 400
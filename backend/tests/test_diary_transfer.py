@@ -0,0 +1,90 @@
+import json
+
+import app.diary_transfer as diary_transfer
+from tests.conftest import register
+
+NDJSON = {"Content-Type": "application/x-ndjson"}
+
+
+def export(client, headers):
+    response = client.get("/api/diary/export", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def import_lines(client, headers, lines):
+    body = "\n".join(line if isinstance(line, str) else json.dumps(line, ensure_ascii=False) for line in lines)
+    return client.post("/api/diary/import", content=body.encode("utf-8"), headers=dict(headers, **NDJSON))
+
+
+def comparable(line):
+    """An exported line without the IDs a new owner's copy gets fresh."""
+    data = {key: value for key, value in line.items() if key != "id"}
+    data["favorite_expressions"] = [
+        {key: value for key, value in favorite.items() if key not in ("id", "diary_entry_id")}
+        for favorite in line["favorite_expressions"]
+    ]
+    return data
+
+
+def test_export_import_round_trip(client, auth_headers):
+    first = client.post("/api/diary", json={"content": "晴れ。散歩した。"}, headers=auth_headers).json()
+    client.post("/api/diary", json={"content": "雨。"}, headers=auth_headers)
+    client.post(
+        f"/api/diary/{first['id']}/favorite",
+        json={"japanese_text": "散歩", "english_text": "walk", "note": "動詞"},
+        headers=auth_headers,
+    )
+    exported = export(client, auth_headers)
+
+    other = register(client)
+    response = import_lines(client, other, exported)
+
+    assert response.json() == {"imported": 2}
+    # Entries created in the same second are ordered by their new IDs.
+    copied = sorted(export(client, other), key=lambda line: line["content"])
+    exported = sorted(exported, key=lambda line: line["content"])
+    assert [comparable(line) for line in copied] == [comparable(line) for line in exported]
+    assert {line["content"] for line in copied} == {"晴れ。散歩した。", "雨。"}
+    assert any(line["favorite_expressions"] for line in copied)
+
+
+def test_untranslated_lines_are_translated_and_blank_lines_skipped(client, auth_headers):
+    response = import_lines(client, auth_headers, [{"content": "晴れ。"}, "", {"content": "雨。"}])
+
+    assert response.json() == {"imported": 2}
+    translations = {line["translated_content"] for line in export(client, auth_headers)}
+    assert translations == {"[en] 晴れ。", "[en] 雨。"}
+
+
+def test_imported_entries_that_fail_to_translate_are_stored_as_failed(client, auth_headers, rain_fails):
+    assert import_lines(client, auth_headers, [{"content": "雨。"}]).json() == {"imported": 1}
+
+    [entry] = client.get("/api/diary", headers=auth_headers).json()
+    assert entry["translation_status"] == "failed"
+
+
+def test_a_bad_line_rejects_the_whole_import(client, auth_headers):
+    response = import_lines(client, auth_headers, [{"content": "晴れ。"}, {"content": 3}])
+
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Line 2:")
+    assert export(client, auth_headers) == []
+
+
+def test_overlong_line_is_rejected(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(diary_transfer, "DIARY_IMPORT_MAX_LINE_BYTES", 64)
+
+    response = import_lines(client, auth_headers, [{"content": "あ" * 100}])
+
+    assert response.status_code == 413
+    assert export(client, auth_headers) == []
+
+
+def test_import_invalidates_list_etags(client, auth_headers):
+    etag = client.get("/api/diary", headers=auth_headers).headers["ETag"]
+
+    import_lines(client, auth_headers, [{"content": "晴れ。", "translated_content": "Sunny."}])
+
+    assert client.get("/api/diary", headers=dict(auth_headers, **{"If-None-Match": etag})).status_code == 200
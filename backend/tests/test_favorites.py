@@ -0,0 +1,73 @@
+from app.db_service import open_database_service
+from app.pagination import NEXT_CURSOR_HEADER
+from tests.conftest import register
+
+
+def add_favorites(client, headers, texts):
+    entry = client.post("/api/diary", json={"content": "".join(japanese for japanese, english in texts) + "。"}, headers=headers).json()
+    for japanese, english in texts:
+        response = client.post(
+            f"/api/diary/{entry['id']}/favorite",
+            json={"japanese_text": japanese, "english_text": english},
+            headers=headers,
+        )
+        assert response.status_code == 200, response.text
+    return entry
+
+
+def read_all(client, headers, **params):
+    favorites, cursor = [], None
+    while True:
+        query = dict(params, **({"cursor": cursor} if cursor else {}))
+        response = client.get("/api/favorites", params=query, headers=headers)
+        assert response.status_code == 200, response.text
+        favorites.extend(response.json())
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return favorites
+
+
+def test_pages_cover_every_favorite_once(client, auth_headers):
+    add_favorites(client, auth_headers, [("晴れ", "sunny"), ("雨", "rain")])
+    add_favorites(client, auth_headers, [("散歩", "walk"), ("読書", "reading"), ("料理", "cooking")])
+
+    favorites = read_all(client, auth_headers, limit=2)
+
+    keys = [(favorite["created_at"], favorite["id"]) for favorite in favorites]
+    assert len(set(keys)) == 5
+    assert keys == sorted(keys, reverse=True)
+    ascending = read_all(client, auth_headers, limit=2, order="asc")
+    assert [favorite["id"] for favorite in ascending] == [favorite["id"] for favorite in reversed(favorites)]
+
+
+def test_prefix_matches_either_language_ignoring_case(client, auth_headers):
+    add_favorites(client, auth_headers, [("散歩", "Walk"), ("歩く", "to walk"), ("100%", "all")])
+
+    by_english = read_all(client, auth_headers, prefix="wal")
+    by_japanese = read_all(client, auth_headers, prefix="散")
+    literal_percent = read_all(client, auth_headers, prefix="10%")
+    wildcard = read_all(client, auth_headers, prefix="%")
+
+    assert [favorite["english_text"] for favorite in by_english] == ["Walk"]
+    assert [favorite["japanese_text"] for favorite in by_japanese] == ["散歩"]
+    assert [favorite["japanese_text"] for favorite in literal_percent] == []
+    assert wildcard == []
+
+
+def test_favorites_carry_their_owner_and_are_private(client, auth_headers):
+    entry = add_favorites(client, auth_headers, [("晴れ", "sunny")])
+
+    with open_database_service() as db_service:
+        [favorite] = db_service.get_diary_entry(entry["id"]).favorite_expressions
+        assert favorite.user_id == db_service.get_diary_entry(entry["id"]).user_id
+
+    assert read_all(client, register(client)) == []
+
+
+def test_deleting_an_entry_removes_its_favorites(client, auth_headers):
+    entry = add_favorites(client, auth_headers, [("晴れ", "sunny")])
+    kept = add_favorites(client, auth_headers, [("雨", "rain")])
+
+    client.delete(f"/api/diary/{entry['id']}", headers=auth_headers)
+
+    assert [favorite["diary_entry_id"] for favorite in read_all(client, auth_headers)] == [kept["id"]]
@@ -0,0 +1,88 @@
+from tests.conftest import register
+
+
+def create_entry(client, headers, content="晴れ。"):
+    response = client.post("/api/diary", json={"content": content}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def conditional(headers, etag):
+    return dict(headers, **{"If-None-Match": etag})
+
+
+def test_list_answers_304_until_the_data_changes(client, auth_headers):
+    create_entry(client, auth_headers)
+    first = client.get("/api/diary", headers=auth_headers)
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "private, no-cache"
+    assert first.headers["Vary"] == "Authorization"
+
+    cached = client.get("/api/diary", headers=conditional(auth_headers, etag))
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["ETag"] == etag
+
+    create_entry(client, auth_headers, "雨。")
+    changed = client.get("/api/diary", headers=conditional(auth_headers, etag))
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert len(changed.json()) == 2
+
+
+def test_etag_depends_on_the_query(client, auth_headers):
+    create_entry(client, auth_headers)
+    etag = client.get("/api/diary", headers=auth_headers).headers["ETag"]
+
+    other_page = client.get("/api/diary", params={"limit": 1}, headers=conditional(auth_headers, etag))
+    assert other_page.status_code == 200
+
+
+def test_weak_and_listed_validators_match(client, auth_headers):
+    create_entry(client, auth_headers)
+    etag = client.get("/api/diary", headers=auth_headers).headers["ETag"]
+
+    assert client.get("/api/diary", headers=conditional(auth_headers, f'"other", W/{etag}')).status_code == 304
+
+
+def test_single_entry_is_invalidated_by_its_update(client, auth_headers):
+    entry = create_entry(client, auth_headers)
+    url = f"/api/diary/{entry['id']}"
+    etag = client.get(url, headers=auth_headers).headers["ETag"]
+    assert client.get(url, headers=conditional(auth_headers, etag)).status_code == 304
+
+    client.put(url, json={"content": "雨。"}, headers=auth_headers)
+
+    updated = client.get(url, headers=conditional(auth_headers, etag))
+    assert updated.status_code == 200
+    assert updated.json()["content"] == "雨。"
+
+
+def test_favorites_are_invalidated_by_a_new_favorite(client, auth_headers):
+    entry = create_entry(client, auth_headers)
+    etag = client.get("/api/favorites", headers=auth_headers).headers["ETag"]
+
+    client.post(
+        f"/api/diary/{entry['id']}/favorite",
+        json={"japanese_text": "晴れ", "english_text": "sunny"},
+        headers=auth_headers,
+    )
+
+    response = client.get("/api/favorites", headers=conditional(auth_headers, etag))
+    assert response.status_code == 200
+    assert [favorite["english_text"] for favorite in response.json()] == ["sunny"]
+
+
+def test_wildcard_does_not_bypass_authorization(client, auth_headers):
+    entry = create_entry(client, auth_headers)
+    stranger = register(client)
+
+    assert client.get(f"/api/diary/{entry['id']}", headers=conditional(stranger, "*")).status_code == 403
+    assert client.get("/api/diary/missing", headers=conditional(auth_headers, "*")).status_code == 404
+
+
+def test_etags_differ_between_users(client, auth_headers):
+    etag = client.get("/api/diary", headers=auth_headers).headers["ETag"]
+    other = register(client)
+
+    assert client.get("/api/diary", headers=conditional(other, etag)).status_code == 200
@@ -0,0 +1,89 @@
+import asyncio
+
+from app.translation import TranslationCache, TranslationService, join_segments, make_cache_key, split_sentences
+from tests.conftest import CountingBackend
+
+
+def make_service(backend):
+    return TranslationService(cache=TranslationCache(session_factory=None), backends=[backend])
+
+
+def test_split_sentences_keeps_terminators_and_newlines():
+    assert split_sentences("晴れ。散歩した！\n\n雨？") == ["晴れ。", "散歩した！", "\n\n", "雨？"]
+
+
+def test_join_segments_marks_failed_sentences():
+    segments = [["晴れ。", "Sunny."], ["\n", "\n"], ["雨。", None]]
+    assert join_segments(segments) == "Sunny.\n[Translation error: segment not translated]"
+
+
+def test_only_changed_sentences_are_retranslated():
+    backend = CountingBackend()
+    service = make_service(backend)
+
+    text, segments = service.translate_incremental("今日は晴れ。散歩した。")
+    assert text == "EN<今日は晴れ。> EN<散歩した。>"
+    backend.calls.clear()
+    service.cache.clear()
+
+    text, segments = service.translate_incremental("今日は雨。散歩した。", segments)
+
+    assert backend.calls == ["今日は雨。"]
+    assert text == "EN<今日は雨。> EN<散歩した。>"
+    assert segments == [["今日は雨。", "EN<今日は雨。>"], ["散歩した。", "EN<散歩した。>"]]
+
+
+def test_failed_sentence_is_retried_on_the_next_edit():
+    backend = CountingBackend(fail_on=["雨"])
+    service = make_service(backend)
+
+    text, segments = service.translate_incremental("晴れ。")
+    text, segments = service.translate_incremental("晴れ。雨。", segments)
+    assert segments[1] == ["雨。", None]
+    assert "[Translation error" in text
+
+    backend.fail_on.clear()
+    backend.calls.clear()
+    text, segments = service.translate_incremental("晴れ。雨。", segments)
+
+    assert backend.calls == ["雨。"]
+    assert text == "EN<晴れ。> EN<雨。>"
+
+
+def test_changed_sentences_share_one_request():
+    backend = CountingBackend()
+    service = make_service(backend)
+
+    text, segments = asyncio.run(service.translate_incremental_async("晴れ。\n散歩した。雨。晴れ。"))
+    service.shutdown()
+
+    assert backend.calls == ["晴れ。\n散歩した。\n雨。"]
+    assert text == "EN<晴れ。>\nEN<散歩した。> EN<雨。> EN<晴れ。>"
+    assert service.cache.get(make_cache_key("雨。", "ja", "en")) == "EN<雨。>"
+
+
+def test_cached_sentences_are_not_sent_again():
+    backend = CountingBackend()
+    service = make_service(backend)
+    service.translate_incremental("晴れ。")
+    backend.calls.clear()
+
+    text, segments = asyncio.run(service.translate_incremental_async("晴れ。雨。"))
+    service.shutdown()
+
+    assert backend.calls == ["雨。"]
+    assert text == "EN<晴れ。> EN<雨。>"
+
+
+def test_wrong_line_count_falls_back_to_one_request_per_sentence():
+    class FlatteningBackend(CountingBackend):
+        def translate(self, text, source, target):
+            return super().translate(text, source, target).replace("\n", " ")
+
+    backend = FlatteningBackend()
+    service = make_service(backend)
+
+    text, segments = service.translate_incremental("晴れ。雨。")
+
+    assert backend.calls == ["晴れ。\n雨。", "晴れ。", "雨。"]
+    assert text == "EN<晴れ。> EN<雨。>"
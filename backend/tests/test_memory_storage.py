@@ -0,0 +1,152 @@
+import os
+import subprocess
+import sys
+import textwrap
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+from app.database import InMemoryDatabase, InMemoryDatabaseService
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def store():
+    return InMemoryDatabase()
+
+
+def add_entries(store, user_id, count):
+    return store.insert_entries(user_id, [
+        {"content": f"日記{i}。", "translated_content": f"Diary {i}.", "created_at": START + timedelta(minutes=i)}
+        for i in range(count)
+    ])
+
+
+def test_emails_are_unique(store):
+    store.add_user("a@example.com", "hash")
+    with pytest.raises(ValueError):
+        store.add_user("a@example.com", "hash")
+
+
+def test_favorite_on_a_deleted_entry_raises_key_error(store):
+    user = store.add_user("a@example.com", "hash")
+    [entry] = add_entries(store, user.id, 1)
+    store.delete_entry(entry.id, user.id)
+
+    with pytest.raises(KeyError):
+        InMemoryDatabaseService(store).add_favorite_expression(entry, "晴れ", "sunny")
+
+
+def test_keyset_pages_in_both_directions(store):
+    user = store.add_user("a@example.com", "hash")
+    entries = add_entries(store, user.id, 5)
+
+    first = store.list_entries(user.id, limit=2)
+    rest = store.list_entries(user.id, after=(first[-1].created_at, first[-1].id))
+    ascending = store.list_entries(user.id, limit=2, after=(entries[1].created_at, entries[1].id), descending=False)
+
+    assert [entry.content for entry in first + rest] == [f"日記{i}。" for i in range(4, -1, -1)]
+    assert [entry.content for entry in ascending] == ["日記2。", "日記3。"]
+
+
+def test_cursor_on_a_deleted_entry_still_works(store):
+    user = store.add_user("a@example.com", "hash")
+    entries = add_entries(store, user.id, 3)
+    cursor = (entries[1].created_at.replace(tzinfo=None), entries[1].id)
+    store.delete_entry(entries[1].id, user.id)
+
+    assert [entry.id for entry in store.list_entries(user.id, after=cursor)] == [entries[0].id]
+
+
+def test_writes_check_ownership_and_never_mutate_read_records(store):
+    owner = store.add_user("a@example.com", "hash")
+    stranger = store.add_user("b@example.com", "hash")
+    [entry] = add_entries(store, owner.id, 1)
+
+    assert store.update_entry(entry.id, stranger.id, content="乗っ取り。") is None
+    assert not store.delete_entry(entry.id, stranger.id)
+
+    updated = store.update_entry(entry.id, owner.id, content="更新。")
+
+    assert entry.content == "日記0。"
+    assert updated.content == "更新。" and updated.updated_at is not None
+    assert store.get_entry(entry.id) is updated
+
+
+def test_favorites_follow_their_entry(store):
+    user = store.add_user("a@example.com", "hash")
+    [entry] = add_entries(store, user.id, 1)
+    store.add_favorite(entry.id, "散歩", "walk")
+    store.add_favorite(entry.id, "晴れ", "sunny")
+
+    assert [favorite.english_text for favorite in store.list_favorites(user.id, prefix="WA")] == ["walk"]
+    assert len(store.get_entry(entry.id).favorite_expressions) == 2
+
+    store.delete_entry(entry.id, user.id)
+
+    assert store.list_favorites(user.id) == []
+    assert store.stats() == {"users": 1, "diary_entries": 0, "favorite_expressions": 0}
+
+
+def test_every_write_bumps_the_data_version(store):
+    user = store.add_user("a@example.com", "hash")
+    [entry] = add_entries(store, user.id, 1)
+    store.update_entry(entry.id, user.id, content="更新。")
+    store.add_favorite(entry.id, "更新", "update")
+    store.delete_entry(entry.id, user.id)
+
+    assert store.data_version(user.id) == 4
+
+
+def test_search_sees_new_and_updated_entries(store):
+    user = store.add_user("a@example.com", "hash")
+    [entry] = add_entries(store, user.id, 1)
+
+    assert store.search(user.id, "日記", 10, 0)[0][0] == entry.id
+    store.update_entry(entry.id, user.id, content="散歩。")
+    assert store.search(user.id, "日記", 10, 0) == []
+
+
+def test_import_is_stored_only_on_finish(store):
+    user = store.add_user("a@example.com", "hash")
+    service = InMemoryDatabaseService(store)
+    row = {"content": "晴れ。", "translated_content": "Sunny.", "translation_status": "completed",
+           "favorite_expressions": [{"japanese_text": "晴れ", "english_text": "sunny"}]}
+
+    service.add_imported_entries(user.id, [row])
+    service.rollback()
+    service.finish_import(user.id)
+    assert store.list_entries(user.id) == []
+
+    [entry_id] = service.add_imported_entries(user.id, [row])
+    service.finish_import(user.id)
+    assert store.get_entry(entry_id).favorite_expressions[0].english_text == "sunny"
+
+
+def test_api_runs_on_the_memory_backend():
+    script = textwrap.dedent("""
+        from fastapi.testclient import TestClient
+        from app.main import app
+
+        with TestClient(app) as client:
+            token = client.post("/auth/register", json={"email": "m@example.com", "password": "pw"}).json()["access_token"]
+            headers = {"Authorization": "Bearer " + token}
+            entry = client.post("/api/diary", json={"content": "晴れ。"}, headers=headers).json()
+            client.post(f"/api/diary/{entry['id']}/favorite", json={"japanese_text": "晴れ", "english_text": "sunny"}, headers=headers)
+            listed = client.get("/api/diary", headers=headers).json()
+            found = client.get("/api/diary/search", params={"q": "晴れ"}, headers=headers).json()
+            assert [item["id"] for item in listed] == [entry["id"]], listed
+            assert listed[0]["favorite_expressions"][0]["english_text"] == "sunny", listed
+            assert [item["id"] for item in found] == [entry["id"]], found
+            print("ok")
+    """)
+    env = dict(os.environ, STORAGE_BACKEND="memory")
+
+    result = subprocess.run(
+        [sys.executable, "-c", script], cwd=Path(__file__).parents[1], env=env, capture_output=True, text=True
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().endswith("ok")
@@ -0,0 +1,107 @@
+from sqlalchemy import create_engine, inspect, text
+
+import app.models  # noqa: F401  (registers every table on Base.metadata)
+from app.db_config import Base
+from app.migrations import load_migrations, status, upgrade
+
+# The schema as it was before the migrations existed.
+LEGACY_SCHEMA = [
+    "CREATE TABLE users (id VARCHAR PRIMARY KEY, email VARCHAR NOT NULL, hashed_password VARCHAR NOT NULL, "
+    "name VARCHAR, picture VARCHAR, created_at DATETIME DEFAULT CURRENT_TIMESTAMP, is_active BOOLEAN)",
+    "CREATE UNIQUE INDEX ix_users_email ON users (email)",
+    "CREATE TABLE diary_entries (id VARCHAR PRIMARY KEY, content TEXT NOT NULL, translated_content TEXT NOT NULL, "
+    "created_at DATETIME DEFAULT CURRENT_TIMESTAMP, updated_at DATETIME, user_id VARCHAR NOT NULL REFERENCES users (id))",
+    "CREATE TABLE favorite_expressions (id VARCHAR PRIMARY KEY, japanese_text TEXT NOT NULL, english_text TEXT NOT NULL, "
+    "note TEXT, created_at DATETIME DEFAULT CURRENT_TIMESTAMP, diary_entry_id VARCHAR NOT NULL REFERENCES diary_entries (id))",
+]
+
+
+def make_engine(tmp_path, name="migrations.db"):
+    return create_engine(f"sqlite:///{tmp_path / name}")
+
+
+def schema(engine):
+    inspector = inspect(engine)
+    return {
+        table: (
+            {column["name"] for column in inspector.get_columns(table)},
+            {index["name"] for index in inspector.get_indexes(table)},
+        )
+        for table in Base.metadata.tables
+    }
+
+
+def detailed_schema(engine):
+    """Columns with type, nullability and default, indexes with their columns, and foreign keys, per table."""
+    inspector = inspect(engine)
+    return {
+        table: (
+            {
+                column["name"]: (str(column["type"]), column["nullable"], (column["default"] or "").strip("'"))
+                for column in inspector.get_columns(table)
+            },
+            {index["name"]: (index["column_names"], bool(index["unique"])) for index in inspector.get_indexes(table)},
+            sorted(
+                (key["constrained_columns"], key["referred_table"], key["referred_columns"])
+                for key in inspector.get_foreign_keys(table)
+            ),
+        )
+        for table in Base.metadata.tables
+    }
+
+
+def test_upgrade_of_an_empty_database_matches_the_models(tmp_path):
+    engine = make_engine(tmp_path)
+    upgrade(engine)
+
+    reference = make_engine(tmp_path, "reference.db")
+    Base.metadata.create_all(bind=reference)
+    migrated, expected = detailed_schema(engine), detailed_schema(reference)
+
+    # SQLite cannot add a NOT NULL column without a default (see 0006); Postgres gets SET NOT NULL.
+    columns = migrated["favorite_expressions"][0]
+    columns["user_id"] = (columns["user_id"][0], False, columns["user_id"][2])
+    assert migrated == expected
+
+
+def test_upgrade_on_top_of_create_all_is_a_no_op_twice(tmp_path):
+    engine = make_engine(tmp_path)
+    Base.metadata.create_all(bind=engine)
+    before = schema(engine)
+
+    assert upgrade(engine) == [revision for revision, module in load_migrations()]
+    assert upgrade(engine) == []
+
+    assert schema(engine) == before
+    assert all(done for revision, description, done in status(engine))
+
+
+def test_upgrade_brings_a_legacy_database_up_to_the_models(tmp_path):
+    engine = make_engine(tmp_path)
+    with engine.begin() as connection:
+        for statement in LEGACY_SCHEMA:
+            connection.execute(text(statement))
+        connection.execute(text("INSERT INTO users (id, email, hashed_password) VALUES ('u1', 'a@example.com', 'x')"))
+        connection.execute(text("INSERT INTO diary_entries (id, content, translated_content, user_id) VALUES ('e1', '晴れ。', 'Sunny.', 'u1')"))
+        connection.execute(text("INSERT INTO favorite_expressions (id, japanese_text, english_text, diary_entry_id) VALUES ('f1', '晴れ', 'sunny', 'e1')"))
+
+    upgrade(engine)
+
+    reference = make_engine(tmp_path, "reference.db")
+    Base.metadata.create_all(bind=reference)
+    assert schema(engine) == schema(reference)
+
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT translation_status FROM diary_entries")).scalar() == "completed"
+        assert connection.execute(text("SELECT data_version FROM users")).scalar() == 0
+        assert connection.execute(text("SELECT user_id FROM favorite_expressions")).scalar() == "u1"
+
+
+def test_status_lists_pending_revisions(tmp_path):
+    engine = make_engine(tmp_path)
+    assert not any(done for revision, description, done in status(engine))
+
+    upgrade(engine)
+    assert [revision for revision, description, done in status(engine) if done] == [
+        revision for revision, module in load_migrations()
+    ]
@@ -0,0 +1,83 @@
+import asyncio
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+
+from app.passwords import PasswordHasher
+
+
+def test_hash_and_verify_in_the_thread_pool():
+    hasher = PasswordHasher(executor="thread", workers=2)
+
+    async def run():
+        hashed = await hasher.hash("secret")
+        return await hasher.verify_and_update("secret", hashed), await hasher.verify_and_update("wrong", hashed)
+
+    (valid, new_hash), (invalid, _) = asyncio.run(run())
+    hasher.shutdown()
+
+    assert valid and new_hash is None
+    assert not invalid
+
+
+def test_hash_in_worker_processes():
+    hasher = PasswordHasher(executor="process", workers=1)
+
+    async def run():
+        hashed = await hasher.hash("secret")
+        return await hasher.verify_and_update("secret", hashed)
+
+    valid, _ = asyncio.run(run())
+    hasher.shutdown()
+    assert valid
+
+
+def test_outdated_hash_is_replaced_on_verify():
+    from passlib.hash import bcrypt
+
+    hasher = PasswordHasher(executor="thread")
+    stale = bcrypt.using(rounds=5).hash("secret")
+
+    valid, new_hash = asyncio.run(hasher.verify_and_update("secret", stale))
+    hasher.shutdown()
+
+    assert valid
+    assert new_hash is not None and new_hash != stale
+
+
+def test_requests_past_max_pending_get_503():
+    hasher = PasswordHasher(executor="thread", max_pending=1, retry_after_seconds=7)
+
+    async def run():
+        return await asyncio.gather(hasher.hash("a"), hasher.hash("b"), return_exceptions=True)
+
+    first, second = asyncio.run(run())
+    hasher.shutdown()
+
+    assert isinstance(first, str)
+    assert isinstance(second, HTTPException)
+    assert second.status_code == 503
+    assert second.headers["Retry-After"] == "7"
+    assert hasher.stats()["rejected"] == 1
+    assert hasher.stats()["pending"] == 0
+
+
+def test_unknown_executor_is_rejected():
+    with pytest.raises(ValueError):
+        PasswordHasher(executor="fiber")
+
+
+def test_workers_are_shared_out_between_server_processes():
+    env = dict(os.environ, WEB_CONCURRENCY=str(10 * (os.cpu_count() or 1)))
+    env.pop("PASSWORD_HASH_WORKERS", None)
+
+    output = subprocess.run(
+        [sys.executable, "-c", "from app.passwords import PASSWORD_HASH_WORKERS; print(PASSWORD_HASH_WORKERS)"],
+        cwd=Path(__file__).parents[1], env=env, capture_output=True, text=True, check=True,
+    ).stdout
+
+    assert output.strip() == "1"
@@ -0,0 +1,184 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from app.rate_limit import (
+    InMemoryTokenBucketStore,
+    RateLimiter,
+    RateLimitMiddleware,
+    TokenBucket,
+    TokenBucketStore,
+    parse_rules,
+)
+from app.translation import TranslationBudgetExceeded, TranslationCache, TranslationService
+from tests.conftest import CountingBackend
+
+
+class MeteredBackend(CountingBackend):
+    name = "metered"
+    metered = True
+
+
+class BrokenStore(TokenBucketStore):
+    async def take(self, buckets, cost=1):
+        raise ConnectionError("store down")
+
+
+def take(store, buckets):
+    return asyncio.run(store.take(buckets))
+
+
+def test_token_bucket_rejects_when_empty_and_refills():
+    bucket = TokenBucket(rate=20, capacity=2)
+
+    assert bucket.acquire() and bucket.acquire()
+    assert not bucket.acquire()
+    # One token refills in 50ms.
+    assert bucket.acquire(timeout=0.2)
+    assert bucket.stats()["rejected"] == 1
+
+
+def test_store_rejects_with_the_wait_until_refill():
+    store = InMemoryTokenBucketStore()
+    bucket = [("k", 2, 10.0)]
+
+    assert take(store, bucket) == [0.0]
+    assert take(store, bucket) == [0.0]
+    [wait] = take(store, bucket)
+    assert 0 < wait <= 0.1
+
+    time.sleep(wait)
+    assert take(store, bucket) == [0.0]
+
+
+def test_a_rejecting_bucket_charges_none_of_them():
+    store = InMemoryTokenBucketStore()
+    take(store, [("tight", 1, 0.01)])
+
+    waits = take(store, [("tight", 1, 0.01), ("wide", 1, 0.01)])
+
+    assert waits[0] > 0 and waits[1] == 0
+    # The wide bucket still has its only token.
+    assert take(store, [("wide", 1, 0.01)]) == [0.0]
+
+
+def test_store_drops_least_recently_used_keys():
+    store = InMemoryTokenBucketStore(max_keys=2)
+    for key in ("a", "b", "c"):
+        take(store, [(key, 1, 0.01)])
+
+    assert store.stats() == {"keys": 2}
+    # "a" was dropped, so it starts full again.
+    assert take(store, [("a", 1, 0.01)]) == [0.0]
+
+
+def test_parse_rules():
+    rules = parse_rules("POST /auth/login=10/60@ip; * /api/*=600/60;")
+
+    assert [(rule.method, rule.path, rule.capacity, rule.by_ip) for rule in rules] == [
+        ("POST", "/auth/login", 10.0, True),
+        ("*", "/api/*", 600.0, False),
+    ]
+    assert rules[1].rate == 10.0
+    assert rules[1].matches("GET", "/api/diary/1")
+
+    with pytest.raises(ValueError):
+        parse_rules("POST /auth/login=ten/60")
+
+
+def test_limits_are_per_user_and_per_ip():
+    limiter = RateLimiter(parse_rules("POST /api/diary=1/60;POST /auth/login=1/60@ip"), InMemoryTokenBucketStore())
+
+    async def run():
+        return [
+            await limiter.check("POST", "/api/diary", "alice", "1.1.1.1"),
+            await limiter.check("POST", "/api/diary", "bob", "1.1.1.1"),
+            await limiter.check("POST", "/api/diary", "alice", "2.2.2.2"),
+            await limiter.check("POST", "/auth/login", "alice", "1.1.1.1"),
+            await limiter.check("POST", "/auth/login", "bob", "1.1.1.1"),
+        ]
+
+    results = [allowed for allowed, retry_after in asyncio.run(run())]
+    assert results == [True, True, False, True, False]
+    assert limiter.stats()["rules"]["POST /api/diary"] == {"allowed": 2, "limited": 1}
+
+
+def test_store_errors_fail_open():
+    limiter = RateLimiter(parse_rules("* /api/*=1/60"), BrokenStore())
+
+    assert asyncio.run(limiter.check("GET", "/api/diary", "alice", "1.1.1.1")) == (True, 0.0)
+    assert limiter.store_errors == 1
+
+
+def test_middleware_answers_429_with_retry_after():
+    limiter = RateLimiter(parse_rules("GET /limited=2/60"), InMemoryTokenBucketStore())
+    app = Starlette(routes=[
+        Route("/limited", lambda request: PlainTextResponse("ok")),
+        Route("/healthz", lambda request: PlainTextResponse("ok")),
+    ])
+    app.add_middleware(RateLimitMiddleware, limiter=limiter)
+    client = TestClient(app)
+
+    statuses = [client.get("/limited").status_code for _ in range(3)]
+    rejected = client.get("/limited")
+
+    assert statuses == [200, 200, 429]
+    assert rejected.headers["Retry-After"] == "30"
+    assert all(client.get("/healthz").status_code == 200 for _ in range(5))
+
+
+def test_spent_translation_budget_fails_over_to_an_unmetered_backend():
+    metered, fallback = MeteredBackend(), CountingBackend()
+    budget = TokenBucket(rate=0.001, capacity=1)
+    service = TranslationService(
+        cache=TranslationCache(session_factory=None), backends=[metered, fallback], call_budget=budget
+    )
+
+    service.translate("晴れ。", "ja", "en")
+    service.translate("雨。", "ja", "en")
+
+    assert metered.calls == ["晴れ。"]
+    assert fallback.calls == ["雨。"]
+
+
+def test_spent_translation_budget_fails_fast_when_no_token_refills_in_time():
+    budget = TokenBucket(rate=0.001, capacity=0)
+    service = TranslationService(
+        cache=TranslationCache(session_factory=None), backends=[MeteredBackend()], call_budget=budget
+    )
+
+    start = time.perf_counter()
+    with pytest.raises(TranslationBudgetExceeded):
+        service.translate("晴れ。", "ja", "en")
+    assert time.perf_counter() - start < 0.1
+    assert service.budget_wait == service.timeout
+    assert TranslationService(cache=service.cache, backends=[], budget_wait=60, timeout=5).budget_wait == 5
+
+
+class MisalignedMeteredBackend(MeteredBackend):
+    """Metered backend that merges the lines of a packed request, forcing one call per sentence."""
+
+    def translate(self, text, source, target):
+        return super().translate(text.replace("\n", " "), source, target)
+
+
+def test_a_long_entry_waits_for_the_call_budget_instead_of_failing(client, auth_headers, monkeypatch):
+    backend = MisalignedMeteredBackend()
+    service = TranslationService(cache=TranslationCache(session_factory=None), backends=[backend])
+    monkeypatch.setattr("app.api.translator", service)
+    content = "".join(f"{i}日目。" for i in range(30))
+
+    try:
+        entry = client.post("/api/diary", json={"content": content}, headers=auth_headers).json()
+    finally:
+        service.shutdown()
+
+    # One packed request, then one per sentence: more calls than the default burst.
+    assert len(backend.calls) == 31 > service.call_budget.capacity
+    assert entry["translation_status"] == "completed"
+    assert entry["translated_content"] == " ".join(f"EN<{i}日目。>" for i in range(30))
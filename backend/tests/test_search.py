@@ -0,0 +1,136 @@
+import app.search as search
+from app.db_config import SessionLocal
+from app.db_service import open_database_service
+from app.search import InMemorySearchIndex, search_like, tokenize
+from tests.conftest import create_user_id
+
+
+def test_tokenize_japanese_into_bigrams_and_english_into_words():
+    assert tokenize("晴れ Sunny") == ["晴", "れ", "晴れ", "sunny"]
+    assert tokenize("晴れた", for_query=True) == ["晴れ", "れた"]
+    assert tokenize("雨", for_query=True) == ["雨"]
+    # Full-width letters fold to ASCII.
+    assert tokenize("ＡＢＣ") == ["abc"]
+
+
+def test_index_matches_every_query_token_and_ranks_by_tf_idf():
+    index = InMemorySearchIndex()
+    index.load_user("u1", [
+        ("e1", "今日は晴れ。", "It is sunny today."),
+        ("e2", "晴れ晴れした気分。", "I feel refreshed."),
+        ("e3", "雨が降った。", "It rained."),
+    ])
+
+    assert [entry_id for entry_id, score in index.search("u1", "晴れ", 10, 0)] == ["e2", "e1"]
+    assert [entry_id for entry_id, score in index.search("u1", "sunny today", 10, 0)] == ["e1"]
+    assert index.search("u1", "晴れ rained", 10, 0) == []
+    assert index.search("someone-else", "晴れ", 10, 0) == []
+
+
+def test_index_follows_writes_for_loaded_users_only():
+    index = InMemorySearchIndex()
+    index.index_entry("e0", "u1", "未読込。", "")
+    index.load_user("u1", [])
+    assert index.search("u1", "未読込", 10, 0) == []
+
+    index.index_entry("e1", "u1", "晴れ。", "Sunny.")
+    assert index.search("u1", "晴れ", 10, 0)[0][0] == "e1"
+
+    index.index_entry("e1", "u1", "雨。", "Rain.")
+    assert index.search("u1", "晴れ", 10, 0) == []
+
+    index.remove_entry("e1", "u1")
+    assert index.search("u1", "雨", 10, 0) == []
+
+
+def test_rows_read_while_the_user_is_written_to_are_not_loaded():
+    index = InMemorySearchIndex()
+    generation = index.begin_load("u1")
+    stale_rows = [("e1", "晴れ。", "")]
+    # Written after the rows were read, while the user is not loaded yet.
+    index.remove_entry("e1", "u1")
+
+    assert index.load_user("u1", stale_rows, generation) is False
+    assert not index.is_loaded("u1")
+
+    assert index.load_user("u1", [], index.begin_load("u1")) is True
+    assert index.search("u1", "晴れ", 10, 0) == []
+    assert index.begin_load("u1") is None
+
+
+class RacingSession:
+    """Returns rows as of each read; a write lands while the first read is in flight."""
+
+    def __init__(self, index):
+        self.index = index
+        self.reads = 0
+
+    def execute(self, statement):
+        self.reads += 1
+        rows = [("e1", "晴れ。", "")]
+        if self.reads == 1:
+            self.index.index_entry("e2", "u1", "雨。", "")
+        else:
+            rows.append(("e2", "雨。", ""))
+        self.rows = rows
+        return self
+
+    def all(self):
+        return self.rows
+
+
+def test_loading_reads_again_after_a_concurrent_write():
+    index = InMemorySearchIndex()
+    session = RacingSession(index)
+
+    index.ensure_user_loaded(session, "u1")
+
+    assert session.reads == 2
+    assert index.search("u1", "雨", 10, 0)[0][0] == "e2"
+
+
+def test_least_recently_searched_user_is_dropped_past_max_users():
+    index = InMemorySearchIndex(max_users=2)
+    index.load_user("a", [("ea", "晴れ。", "")])
+    index.load_user("b", [("eb", "晴れ。", "")])
+    assert index.is_loaded("a")
+
+    index.load_user("c", [("ec", "晴れ。", "")])
+
+    assert not index.is_loaded("b")
+    assert index.is_loaded("a") and index.is_loaded("c")
+    assert index.search("b", "晴れ", 10, 0) == []
+
+
+def test_like_search_escapes_wildcards(client):
+    user_id = create_user_id()
+    with open_database_service() as db_service:
+        percent = db_service.create_diary_entry(user_id, "100%晴れ。", "100% SUNNY.").id
+        db_service.create_diary_entry(user_id, "1000晴れ。", "1000 sunny.")
+
+    with SessionLocal() as db:
+        assert [entry_id for entry_id, score in search_like(db, user_id, "100%", 10, 0)] == [percent]
+        assert len(search_like(db, user_id, "sunny", 10, 0)) == 2
+
+
+def test_auto_backend_avoids_the_process_local_index_with_several_workers(monkeypatch):
+    monkeypatch.setattr(search, "SEARCH_BACKEND", "auto")
+    monkeypatch.setattr(search, "WEB_CONCURRENCY", 1)
+    assert search._resolve_backend() == "memory"
+
+    monkeypatch.setattr(search, "WEB_CONCURRENCY", 4)
+    assert search._resolve_backend() == "like"
+
+
+def test_search_endpoint_follows_edits(client, auth_headers):
+    entry = client.post("/api/diary", json={"content": "公園を散歩した。"}, headers=auth_headers).json()
+    client.post("/api/diary", json={"content": "雨が降った。"}, headers=auth_headers)
+
+    found = client.get("/api/diary/search", params={"q": "散歩"}, headers=auth_headers)
+    assert [item["id"] for item in found.json()] == [entry["id"]]
+
+    client.put(f"/api/diary/{entry['id']}", json={"content": "家で読書した。"}, headers=auth_headers)
+
+    assert client.get("/api/diary/search", params={"q": "散歩"}, headers=auth_headers).json() == []
+    found = client.get("/api/diary/search", params={"q": "読書"}, headers=auth_headers)
+    assert [item["id"] for item in found.json()] == [entry["id"]]
@@ -0,0 +1,131 @@
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+from app.server import Supervisor, available_cpus, rss_megabytes
+
+BACKEND_DIR = Path(__file__).parents[1]
+
+
+def settings_in_subprocess(env_overrides, code):
+    """Run code in a fresh interpreter, where settings are read from env_overrides."""
+    env = dict(os.environ)
+    for name in ("SERVER_WORKERS", "WEB_CONCURRENCY", "PASSWORD_HASH_WORKERS", "SEARCH_BACKEND"):
+        env.pop(name, None)
+    env.update(env_overrides)
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_available_cpus_follows_the_affinity_mask(monkeypatch):
+    if hasattr(os, "sched_getaffinity"):
+        assert available_cpus() == len(os.sched_getaffinity(0))
+        monkeypatch.delattr(os, "sched_getaffinity")
+    assert available_cpus() == (os.cpu_count() or 1)
+
+
+def test_zero_workers_means_one_per_cpu():
+    assert Supervisor(workers=0).worker_count == available_cpus()
+    assert Supervisor(workers=3).worker_count == 3
+
+
+def test_server_workers_default_to_web_concurrency():
+    code = "import json; from app.server import SERVER_WORKERS; print(json.dumps(SERVER_WORKERS))"
+    assert settings_in_subprocess({"WEB_CONCURRENCY": "3"}, code) == 3
+    assert settings_in_subprocess({"WEB_CONCURRENCY": "3", "SERVER_WORKERS": "2"}, code) == 2
+
+
+def test_web_concurrency_shares_out_hash_workers_and_picks_search():
+    code = (
+        "import json, os; from app.passwords import PASSWORD_HASH_WORKERS; from app.search import search_backend; "
+        "print(json.dumps([PASSWORD_HASH_WORKERS, search_backend, os.cpu_count()]))"
+    )
+    workers, backend, cpus = settings_in_subprocess({"WEB_CONCURRENCY": "2", "SEARCH_BACKEND": "auto"}, code)
+    assert workers == max(cpus // 2, 1)
+    assert backend == "like"
+
+    workers, backend, cpus = settings_in_subprocess({"SEARCH_BACKEND": "auto"}, code)
+    assert workers == cpus
+    assert backend == "memory"
+
+
+def test_memory_storage_needs_a_single_worker(monkeypatch):
+    monkeypatch.setattr("app.db_config.STORAGE_BACKEND", "memory")
+
+    assert "SERVER_WORKERS=1" in Supervisor(workers=2)._check_settings()
+    assert Supervisor(workers=1)._check_settings() is None
+
+
+def test_per_process_state_is_warned_about(monkeypatch, capsys):
+    monkeypatch.setattr("app.search.search_backend", "memory")
+    monkeypatch.setattr("app.tokens.TOKEN_REVOCATION_BACKEND", "memory")
+
+    assert Supervisor(workers=2)._check_settings() is None
+
+    output = capsys.readouterr().out
+    assert "SEARCH_BACKEND=memory" in output
+    assert "TOKEN_REVOCATION_BACKEND=memory" in output
+
+
+def test_rss_of_a_running_and_a_missing_process():
+    if not Path("/proc/self/statm").exists():
+        pytest.skip("needs /proc")
+    assert rss_megabytes(os.getpid()) > 1
+    assert rss_megabytes(2 ** 22 + 1) is None
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="the supervisor forks")
+def test_two_workers_serve_and_stop_on_sigterm(tmp_path):
+    port = free_port()
+    env = dict(
+        os.environ,
+        SERVER_WORKERS="2",
+        HOST="127.0.0.1",
+        PORT=str(port),
+        DATABASE_URL=f"sqlite:///{tmp_path}/server.db",
+        SEARCH_BACKEND="like",
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-m", "app.server"], cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/healthz", timeout=1) as response:
+                    assert json.loads(response.read()) == {"status": "ok"}
+                break
+            except OSError:
+                assert process.poll() is None, process.stdout.read()
+                assert time.monotonic() < deadline, "server did not start"
+                time.sleep(0.2)
+
+        process.send_signal(signal.SIGTERM)
+        output, _ = process.communicate(timeout=30)
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.communicate()
+
+    assert process.returncode == 0, output
+    assert "starting 2 workers" in output
+    assert output.count("Started worker") == 2
+    assert "Stopping 2 workers" in output
@@ -0,0 +1,97 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from app.startup import ImportProfiler, StartupReport
+from tests.conftest import ADMIN_HEADERS
+
+
+def run_startup_check(tmp_path, budget: str):
+    env = dict(
+        os.environ,
+        STARTUP_BUDGET_SECONDS=budget,
+        DATABASE_URL=f"sqlite:///{tmp_path}/startup.db",
+    )
+    return subprocess.run(
+        [sys.executable, "-m", "app.startup", "--check"],
+        cwd=Path(__file__).parents[1], env=env, capture_output=True, text=True,
+    )
+
+
+def test_import_profiler_times_modules_imported_while_installed(tmp_path, monkeypatch):
+    (tmp_path / "slow_module_for_profiler.py").write_text("import time\ntime.sleep(0.05)\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    profiler = ImportProfiler()
+
+    profiler.install()
+    try:
+        import slow_module_for_profiler  # noqa: F401
+    finally:
+        profiler.uninstall()
+        sys.modules.pop("slow_module_for_profiler", None)
+
+    assert profiler not in sys.meta_path
+    assert profiler.slowest()["slow_module_for_profiler"] >= 0.05
+
+
+def test_report_checks_the_total_against_the_budget():
+    report = StartupReport(time.perf_counter(), budget_seconds=60)
+    assert report.report()["within_budget"] is None
+
+    with report.phase("init_db"):
+        pass
+    report.finish()
+
+    result = report.report()
+    assert "init_db" in result["phases"]
+    assert result["within_budget"] is True
+
+
+def test_background_failures_are_reported_not_raised():
+    report = StartupReport(time.perf_counter())
+
+    def broken():
+        raise RuntimeError("model missing")
+
+    report.run_in_background("warm_up", broken)
+    report.join()
+
+    result = report.report()
+    assert "RuntimeError" in result["failures"]["warm_up"]
+    assert "warm_up" in result["phases"]
+
+
+def test_startup_check_passes_within_the_budget(tmp_path):
+    result = run_startup_check(tmp_path, "60")
+
+    assert result.returncode == 0, result.stderr
+    report = json.loads(result.stdout[result.stdout.index("{"):])
+    assert report["within_budget"] is True
+    assert "init_db" in report["phases"]
+    assert report["slowest_imports"]
+
+
+def test_startup_check_fails_over_the_budget(tmp_path):
+    result = run_startup_check(tmp_path, "0")
+
+    assert result.returncode == 1
+    assert "over the 0.0s budget" in result.stderr
+
+
+def test_healthz_only_says_ok(client):
+    response = client.get("/healthz")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+
+def test_admin_stats_need_the_admin_token(client):
+    assert client.get("/admin/stats").status_code == 401
+
+    response = client.get("/admin/stats", headers=ADMIN_HEADERS)
+    assert response.status_code == 200
+    stats = response.json()
+    assert stats["startup"]["total_seconds"] is not None
+    assert {"translation_cache", "db_pool", "auth_tokens", "rate_limits"} <= set(stats)
@@ -0,0 +1,213 @@
+import asyncio
+import time
+import uuid
+
+import pytest
+from jose import JWTError
+
+from app.tokens import (
+    InMemoryRevocationStore,
+    KeyRing,
+    RedisRevocationStore,
+    TokenVerifier,
+    VerifiedTokenCache,
+    create_revocation_store,
+    token_digest,
+)
+from tests.conftest import ADMIN_HEADERS, register
+
+
+class FakeRedis:
+    """The two async Redis commands the revocation store uses, over a dict."""
+
+    def __init__(self):
+        self.values = {}
+        self.mgets = 0
+
+    async def mget(self, *keys):
+        self.mgets += 1
+        return [self.values.get(key) for key in keys]
+
+    async def set(self, key, value, ex=None, exat=None):
+        self.values[key] = value
+
+
+def make_verifier(keys=None, active_kid="default", revocations=None):
+    key_ring = KeyRing(keys or {"default": "secret"}, active_kid)
+    return TokenVerifier(
+        key_ring=key_ring,
+        cache=VerifiedTokenCache(),
+        revocations=revocations if revocations is not None else InMemoryRevocationStore(),
+    )
+
+
+def claims(sub="user-1", iat=None, expires_in=3600):
+    now = time.time()
+    return {"sub": sub, "iat": now if iat is None else iat, "exp": int(now + expires_in)}
+
+
+def test_key_ring_parses_keys_on_top_of_the_default():
+    ring = KeyRing.from_settings("2026-10=a, 2027-01=b", active_kid="2027-01")
+    assert ring.keys["2026-10"] == "a"
+    assert ring.keys["2027-01"] == "b"
+    assert "default" in ring.keys
+
+    with pytest.raises(ValueError):
+        KeyRing.from_settings("no-secret")
+    with pytest.raises(ValueError):
+        KeyRing.from_settings("", active_kid="missing")
+    with pytest.raises(ValueError):
+        create_revocation_store("nope")
+
+
+def test_rotated_keys_keep_verifying_older_tokens():
+    old = make_verifier({"default": "secret", "old": "a"}, active_kid="old")
+    old_token = old.encode(claims())
+
+    rotated = make_verifier({"default": "secret", "old": "a", "new": "b"}, active_kid="new")
+    new_token = rotated.encode(claims())
+
+    assert rotated.decode(old_token)[1] == "old"
+    assert rotated.decode(new_token)[1] == "new"
+    # A process that never heard of the new key rejects tokens signed with it.
+    with pytest.raises(JWTError):
+        old.decode(new_token)
+
+
+def test_verified_tokens_skip_the_signature_check():
+    verifier = make_verifier()
+    token = verifier.encode(claims())
+
+    verifier.decode(token)
+    assert len(verifier.cache) == 1
+    # With the key gone, only the cache can still accept the token.
+    verifier.key_ring.keys["default"] = "other"
+    assert verifier.decode(token)[2]["sub"] == "user-1"
+
+
+def test_cached_tokens_are_dropped_once_they_expire():
+    cache = VerifiedTokenCache()
+    cache.set("digest", "default", {"exp": time.time() - 1})
+    assert cache.get("digest") is None
+
+    small = VerifiedTokenCache(max_entries=1)
+    small.set("a", "default", {"exp": time.time() + 60})
+    small.set("b", "default", {"exp": time.time() + 60})
+    assert small.get("a") is None
+    assert small.get("b") is not None
+
+
+def test_revoking_a_token_leaves_the_others_valid():
+    verifier = make_verifier()
+    revoked = verifier.encode(claims())
+    other = verifier.encode(claims(iat=time.time() + 1))
+
+    asyncio.run(verifier.revoke_token(revoked))
+
+    with pytest.raises(JWTError):
+        asyncio.run(verifier.verify(revoked))
+    assert asyncio.run(verifier.verify(other))["sub"] == "user-1"
+
+
+def test_revoking_a_user_rejects_only_tokens_issued_before():
+    verifier = make_verifier()
+    before = verifier.encode(claims(iat=time.time() - 10))
+    other_user = verifier.encode(claims(sub="user-2", iat=time.time() - 10))
+
+    asyncio.run(verifier.revoke_user("user-1"))
+    after = verifier.encode(claims())
+
+    with pytest.raises(JWTError):
+        asyncio.run(verifier.verify(before))
+    assert asyncio.run(verifier.verify(after))["sub"] == "user-1"
+    assert asyncio.run(verifier.verify(other_user))["sub"] == "user-2"
+
+
+def test_revoking_a_kid_rejects_every_token_signed_with_it():
+    verifier = make_verifier({"default": "secret", "leaked": "a"}, active_kid="leaked")
+    leaked = verifier.encode(claims())
+    verifier.key_ring.active_kid = "default"
+    fresh = verifier.encode(claims())
+
+    asyncio.run(verifier.revoke_kid("leaked"))
+
+    with pytest.raises(JWTError):
+        asyncio.run(verifier.verify(leaked))
+    assert asyncio.run(verifier.verify(fresh))["sub"] == "user-1"
+
+
+def test_redis_store_remembers_tokens_found_not_revoked():
+    redis = FakeRedis()
+    verifier = make_verifier(revocations=RedisRevocationStore(client=redis, cache_seconds=60))
+    token = verifier.encode(claims())
+
+    for _ in range(3):
+        asyncio.run(verifier.verify(token))
+    assert redis.mgets == 1
+
+    # A revocation through the same store applies at once.
+    asyncio.run(verifier.revoke_user("user-1", before=time.time() + 1))
+    with pytest.raises(JWTError):
+        asyncio.run(verifier.verify(token))
+    assert redis.mgets == 2
+
+
+def test_redis_store_sees_revocations_made_elsewhere_after_cache_seconds():
+    redis = FakeRedis()
+    verifier = make_verifier(revocations=RedisRevocationStore(client=redis, cache_seconds=0.05))
+    token = verifier.encode(claims())
+    asyncio.run(verifier.verify(token))
+
+    # Another process revokes the token straight in Redis.
+    redis.values[f"revoked:token:{token_digest(token)}"] = 1
+    assert asyncio.run(verifier.verify(token))["sub"] == "user-1"
+    time.sleep(0.06)
+    with pytest.raises(JWTError):
+        asyncio.run(verifier.verify(token))
+
+
+def two_sessions(client):
+    """Headers for two tokens of the same user, as from two devices."""
+    email = f"{uuid.uuid4().hex}@example.com"
+    first = register(client, email=email)
+    response = client.post("/auth/login", json={"email": email, "password": "password"})
+    assert response.status_code == 200, response.text
+    return first, {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_logout_revokes_only_the_current_token(client):
+    first, second = two_sessions(client)
+
+    assert client.post("/auth/logout", headers=first).status_code == 204
+
+    assert client.get("/auth/me", headers=first).status_code == 401
+    assert client.get("/auth/me", headers=second).status_code == 200
+
+
+def test_logout_all_revokes_every_session(client):
+    first, second = two_sessions(client)
+
+    assert client.post("/auth/logout", params={"all": "true"}, headers=first).status_code == 204
+
+    assert client.get("/auth/me", headers=first).status_code == 401
+    assert client.get("/auth/me", headers=second).status_code == 401
+
+
+def test_admin_revokes_a_users_tokens(client, auth_headers):
+    user_id = client.get("/auth/me", headers=auth_headers).json()["id"]
+
+    response = client.post(f"/admin/revocations/users/{user_id}", headers=ADMIN_HEADERS)
+
+    assert response.status_code == 200
+    assert response.json() == {"revoked": "user", "id": user_id, "reach": "process"}
+    assert client.get("/auth/me", headers=auth_headers).status_code == 401
+
+
+def test_admin_routes_need_the_admin_token(client, monkeypatch):
+    bad = {"Authorization": "Bearer wrong"}
+    assert client.post("/admin/revocations/users/someone", headers=bad).status_code == 401
+    assert client.post("/admin/revocations/users/someone").status_code == 401
+    assert client.post("/admin/revocations/kids/unknown", headers=ADMIN_HEADERS).status_code == 404
+
+    monkeypatch.setattr("app.admin_routes.ADMIN_TOKEN", "")
+    assert client.post("/admin/revocations/users/someone", headers=ADMIN_HEADERS).status_code == 404
@@ -0,0 +1,124 @@
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app.db_config import SessionLocal
+from app.metrics import Histogram, MetricsRegistry
+from app.tracing import TRACE_ID_HEADER, TraceExporter, TracedRoute, TracingMiddleware, parse_traceparent, span
+from tests.conftest import ADMIN_HEADERS
+
+
+class RecordingExporter(TraceExporter):
+    def __init__(self):
+        self.traces = []
+
+    def export(self, trace):
+        self.traces.append(trace)
+
+
+def make_traced_app(exporter):
+    router = APIRouter(route_class=TracedRoute)
+
+    @router.get("/items/{item_id}")
+    def read_item(item_id: str):
+        with span("work", item=item_id):
+            with SessionLocal() as db:
+                db.execute(text("SELECT 1"))
+        return {"id": item_id}
+
+    app = FastAPI()
+    app.include_router(router)
+    app.add_middleware(TracingMiddleware, exporter=exporter, sample_rate=1.0)
+    return app
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 5.0):
+        histogram.observe(value)
+
+    snapshot = histogram.snapshot()
+    assert snapshot["buckets"] == {"0.1": 1, "1": 3, "+Inf": 4}
+    assert snapshot["count"] == 4
+    assert snapshot["sum"] == 6.25
+
+
+def test_registry_renders_prometheus_text_with_escaped_labels():
+    registry = MetricsRegistry()
+    registry.counter("jobs_total", "Jobs.", ("queue",)).inc(2, queue='say "hi"')
+    registry.gauge_callback("broken", "Raises.", (), lambda: 1 / 0)
+
+    # The failing gauge callback does not take the scrape down.
+    text_output = registry.render()
+
+    assert "# TYPE jobs_total counter" in text_output
+    assert 'jobs_total{queue="say \\"hi\\""} 2.0' in text_output
+    # Registering the same name again returns the existing family.
+    assert registry.counter("jobs_total", "Jobs.", ("queue",)).labels(queue='say "hi"').value == 2
+
+
+def test_traceparent_parsing():
+    trace_id, parent_id = "4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7"
+
+    assert parse_traceparent(f"00-{trace_id}-{parent_id}-01") == (trace_id, parent_id)
+    assert parse_traceparent(f"00-{'0' * 32}-{parent_id}-01") is None
+    assert parse_traceparent("00-xyz-00f067aa0ba902b7-01") is None
+    assert parse_traceparent(None) is None
+
+
+def test_span_outside_a_request_does_nothing():
+    with span("idle") as recorded:
+        assert recorded is None
+
+
+def test_request_trace_has_endpoint_db_and_serialize_spans():
+    exporter = RecordingExporter()
+    traced = TestClient(make_traced_app(exporter))
+
+    response = traced.get("/items/7")
+
+    [trace] = exporter.traces
+    assert response.headers[TRACE_ID_HEADER] == trace.trace_id
+    assert trace.root.name == "GET /items/{item_id}"
+    assert trace.root.attributes["http.status_code"] == 200
+    assert trace.db_queries == 1
+
+    by_name = {recorded.name: recorded for recorded in trace.spans}
+    assert {"endpoint", "work", "db.query", "serialize"} <= set(by_name)
+    assert by_name["work"].parent_id == by_name["endpoint"].span_id
+    assert by_name["db.query"].parent_id == by_name["work"].span_id
+    assert by_name["work"].attributes == {"item": "7"}
+
+
+def test_incoming_traceparent_is_continued():
+    exporter = RecordingExporter()
+    traced = TestClient(make_traced_app(exporter))
+    trace_id, parent_id = "4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7"
+
+    response = traced.get("/items/1", headers={"traceparent": f"00-{trace_id}-{parent_id}-01"})
+
+    assert response.headers[TRACE_ID_HEADER] == trace_id
+    assert exporter.traces[0].root.parent_id == parent_id
+
+
+def test_metrics_endpoint_labels_requests_by_route_template(client, auth_headers):
+    client.get("/api/diary/does-not-exist", headers=auth_headers)
+
+    body = client.get("/metrics", headers=ADMIN_HEADERS).text
+
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/diary/{entry_id}",status="404"}' in body
+    assert "does-not-exist" not in body
+
+
+def test_metrics_need_the_metrics_or_admin_token(client, monkeypatch):
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+    monkeypatch.setattr("app.admin_routes.METRICS_TOKEN", "scrape")
+    assert client.get("/metrics", headers={"Authorization": "Bearer scrape"}).status_code == 200
+    assert client.get("/metrics", headers=ADMIN_HEADERS).status_code == 200
+    assert client.post("/admin/revocations/users/someone", headers={"Authorization": "Bearer scrape"}).status_code == 401
+
+    monkeypatch.setattr("app.admin_routes.METRICS_TOKEN", "")
+    monkeypatch.setattr("app.admin_routes.ADMIN_TOKEN", "")
+    assert client.get("/metrics").status_code == 404
@@ -0,0 +1,156 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.translation import TranslationCache, TranslationService, TranslationUnavailable
+from app.translation_backends import (
+    BACKENDS,
+    CircuitBreaker,
+    GoogleBackend,
+    LocalModelBackend,
+    create_backends,
+    register_backend,
+)
+from tests.conftest import CountingBackend
+
+
+class FakeGoogleTranslator:
+    """Stands in for deep_translator's GoogleTranslator."""
+
+    instances = []
+
+    def __init__(self, source, target):
+        self.source, self.target = source, target
+        self.in_use = False
+        FakeGoogleTranslator.instances.append(self)
+
+    def translate(self, text):
+        assert not self.in_use, "instance shared between threads"
+        self.in_use = True
+        time.sleep(0.02)
+        self.in_use = False
+        return None if text.strip() == "echo" else f"{self.target}:{text}"
+
+
+class PrimaryBackend(CountingBackend):
+    name = "primary"
+
+
+class FakeLocalModel(LocalModelBackend):
+    def _load(self):
+        return lambda sentences: [{"translation_text": f"EN<{sentence}>"} for sentence in sentences]
+
+
+@pytest.fixture
+def google(monkeypatch):
+    import deep_translator
+
+    FakeGoogleTranslator.instances = []
+    monkeypatch.setattr(deep_translator, "GoogleTranslator", FakeGoogleTranslator)
+    return GoogleBackend(pool_size=2)
+
+
+def make_service(*backends):
+    return TranslationService(cache=TranslationCache(session_factory=None), backends=list(backends))
+
+
+def test_breaker_opens_then_half_opens_for_one_trial():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_failed_trial_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow()
+
+    breaker.record_failure()
+
+    assert breaker.state == "open"
+    assert breaker.opened == 2
+
+
+def test_failover_skips_a_backend_with_an_open_circuit():
+    primary, secondary = PrimaryBackend(fail_on=["。"]), CountingBackend()
+    service = make_service(primary, secondary)
+    service.backends[0].breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60)
+
+    for text in ("一。", "二。", "三。"):
+        assert service.translate(text, "ja", "en") == f"EN<{text}>"
+
+    assert primary.calls == ["一。", "二。"]
+    assert secondary.calls == ["一。", "二。", "三。"]
+    stats = service.backend_stats()["primary"]
+    assert stats["state"] == "open" and stats["skipped"] == 1
+
+
+def test_all_circuits_open_raises_unavailable():
+    service = make_service(CountingBackend())
+    service.backends[0].breaker = CircuitBreaker(failure_threshold=1, reset_seconds=60)
+    service.backends[0].breaker.record_failure()
+
+    with pytest.raises(TranslationUnavailable):
+        service.translate("晴れ。", "ja", "en")
+
+
+def test_backends_are_created_by_name(monkeypatch):
+    monkeypatch.setitem(BACKENDS, "counting", CountingBackend)
+    assert [backend.name for backend in create_backends("stub, counting")] == ["stub", "counting"]
+
+    register_backend("other", CountingBackend)
+    assert BACKENDS.pop("other") is CountingBackend
+
+    with pytest.raises(ValueError):
+        create_backends("nope")
+    with pytest.raises(ValueError):
+        create_backends(" , ")
+
+
+def test_google_backend_never_shares_a_translator_between_threads(google):
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda i: google.translate(f"文{i}", "ja", "en"), range(12)))
+
+    assert results == [f"en:文{i}" for i in range(12)]
+    assert 1 < len(FakeGoogleTranslator.instances) <= 4
+
+
+def test_google_backend_reuses_idle_translators_per_pair(google):
+    google.translate("一", "ja", "en")
+    google.translate("二", "ja", "en")
+    google.translate("三", "ja", "fr")
+
+    assert [(t.source, t.target) for t in FakeGoogleTranslator.instances] == [("ja", "en"), ("ja", "fr")]
+    assert google.translate(" echo ", "ja", "en") == "echo"
+
+
+def test_google_backend_keeps_at_most_pool_size_idle(google):
+    barrier = threading.Barrier(4)
+
+    def translate(i):
+        barrier.wait()
+        return google.translate(f"文{i}", "ja", "en")
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(translate, range(4)))
+
+    assert len(google._idle[("ja", "en")]) == 2
+
+
+def test_local_model_keeps_line_breaks_and_rejects_other_pairs():
+    backend = FakeLocalModel()
+
+    assert backend.translate("晴れ。\n\n雨。", "ja", "en") == "EN<晴れ。>\n\nEN<雨。>"
+    with pytest.raises(ValueError):
+        backend.translate("晴れ。", "ja", "fr")
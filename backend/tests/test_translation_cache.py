@@ -0,0 +1,51 @@
+from app.db_config import SessionLocal
+from app.translation import TranslationCache, TranslationService, make_cache_key
+from tests.conftest import CountingBackend
+
+
+def make_service(backend=None, cache=None):
+    return TranslationService(
+        cache=cache if cache is not None else TranslationCache(session_factory=None),
+        backends=[backend if backend is not None else CountingBackend()],
+    )
+
+
+def test_cache_key_ignores_surrounding_whitespace_and_unicode_form():
+    assert make_cache_key(" 今日は晴れ。\n", "ja", "en") == make_cache_key("今日は晴れ。", "ja", "en")
+    assert make_cache_key("\u30ac", "ja", "en") == make_cache_key("\u30ab\u3099", "ja", "en")
+    assert make_cache_key("今日は晴れ。", "ja", "en") != make_cache_key("今日は晴れ。", "ja", "fr")
+
+
+def test_repeated_text_is_served_from_memory():
+    backend = CountingBackend()
+    service = make_service(backend)
+
+    assert service.translate("今日は晴れ。", "ja", "en") == "EN<今日は晴れ。>"
+    assert service.translate(" 今日は晴れ。 ", "ja", "en") == "EN<今日は晴れ。>"
+
+    assert backend.calls == ["今日は晴れ。"]
+    assert service.cache.stats()["hits"] == 1
+
+
+def test_lru_evicts_oldest_entries_past_max_bytes():
+    cache = TranslationCache(max_bytes=200, session_factory=None)
+    for i in range(10):
+        cache.set(f"key-{i}", "x" * 30, "ja", "en")
+
+    stats = cache.stats()
+    assert stats["bytes"] <= 200
+    assert stats["evictions"] > 0
+    assert cache.get("key-0") is None
+    assert cache.get("key-9") == "x" * 30
+
+
+def test_persistent_tier_survives_a_cold_process(client):
+    key = make_cache_key("永続化のテスト。", "ja", "en")
+    TranslationCache(session_factory=SessionLocal).set(key, "Persistence test.", "ja", "en")
+
+    # A new cache starts with an empty memory tier, like a restarted process.
+    cold = TranslationCache(session_factory=SessionLocal)
+    assert cold.get(key) == "Persistence test."
+    assert cold.stats()["persistent_hits"] == 1
+    assert cold.get(key) == "Persistence test."
+    assert cold.stats()["hits"] == 1
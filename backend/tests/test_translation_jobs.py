@@ -0,0 +1,128 @@
+import asyncio
+
+from app.db_service import open_database_service
+from app.models.diary import TRANSLATION_COMPLETED, TRANSLATION_FAILED, TRANSLATION_PENDING
+from app.translation import TranslationCache, TranslationService
+from app.translation_jobs import LocalTranslationJobQueue, _store_translation
+from tests.conftest import CountingBackend, create_user_id
+
+
+def make_queue(backend, **kwargs):
+    service = TranslationService(cache=TranslationCache(session_factory=None), backends=[backend])
+    queue = LocalTranslationJobQueue(service=service, **kwargs)
+    queue.recover_pending = False
+    return queue
+
+
+def create_pending_entry(content: str, segments=None) -> str:
+    with open_database_service() as db_service:
+        entry = db_service.create_diary_entry(create_user_id(), content, "", segments, translation_status=TRANSLATION_PENDING)
+        return entry.id
+
+
+def load_entry(entry_id: str):
+    with open_database_service() as db_service:
+        return db_service.get_diary_entry(entry_id)
+
+
+def run_jobs(queue, entry_ids, timeout=5.0):
+    async def run():
+        await queue.start()
+        try:
+            for entry_id in entry_ids:
+                await queue.enqueue(entry_id)
+            return [await queue.wait_for(entry_id, timeout) for entry_id in entry_ids]
+        finally:
+            await queue.stop()
+
+    return asyncio.run(run())
+
+
+def test_pending_entry_is_translated_in_the_background(client):
+    entry_id = create_pending_entry("今日は晴れ。散歩した。")
+
+    assert run_jobs(make_queue(CountingBackend()), [entry_id]) == [True]
+
+    entry = load_entry(entry_id)
+    assert entry.translation_status == TRANSLATION_COMPLETED
+    assert entry.translated_content == "EN<今日は晴れ。> EN<散歩した。>"
+
+
+def test_failed_sentence_is_retried_until_it_translates(client):
+    # Edited from "晴れ。", whose translation is kept.
+    entry_id = create_pending_entry("晴れ。雨。", [["晴れ。", "EN<晴れ。>"]])
+    backend = CountingBackend(fail_on=["雨"])
+    queue = make_queue(backend, retry_base_seconds=0.05)
+
+    async def run():
+        await queue.start()
+        await queue.enqueue(entry_id)
+        # The first attempt keeps the translated sentence and stays pending.
+        while load_entry(entry_id).translated_segments != [["晴れ。", "EN<晴れ。>"], ["雨。", None]]:
+            await asyncio.sleep(0.01)
+        pending = load_entry(entry_id)
+        backend.fail_on.clear()
+        done = await queue.wait_for(entry_id, 5.0)
+        await queue.stop()
+        return pending, done
+
+    pending, done = asyncio.run(run())
+
+    assert pending.translation_status == TRANSLATION_PENDING
+    assert done
+    assert "晴れ。" not in backend.calls
+    entry = load_entry(entry_id)
+    assert entry.translation_status == TRANSLATION_COMPLETED
+    assert entry.translated_content == "EN<晴れ。> EN<雨。>"
+
+
+def test_entry_fails_after_max_attempts(client):
+    entry_id = create_pending_entry("雨。")
+    backend = CountingBackend(fail_on=["雨"])
+
+    assert run_jobs(make_queue(backend, max_attempts=2, retry_base_seconds=0.01), [entry_id]) == [True]
+
+    assert backend.calls == ["雨。", "雨。"]
+    assert load_entry(entry_id).translation_status == TRANSLATION_FAILED
+
+
+def test_translation_of_stale_content_is_not_stored(client):
+    entry_id = create_pending_entry("古い内容。")
+    with open_database_service() as db_service:
+        entry = db_service.get_diary_entry(entry_id)
+        db_service.update_diary_entry(entry, "新しい内容。", "", None, TRANSLATION_PENDING)
+
+    assert not _store_translation(entry_id, "古い内容。", "Old content.", [["古い内容。", "Old content."]], TRANSLATION_COMPLETED)
+    assert load_entry(entry_id).translation_status == TRANSLATION_PENDING
+
+
+def test_start_recovers_entries_left_pending(client):
+    entry_id = create_pending_entry("再開。")
+    queue = make_queue(CountingBackend())
+    queue.recover_pending = True
+
+    async def run():
+        await queue.start()
+        done = await queue.wait_for(entry_id, 5.0)
+        await queue.stop()
+        return done
+
+    assert asyncio.run(run())
+    assert load_entry(entry_id).translation_status == TRANSLATION_COMPLETED
+
+
+def test_unexpected_job_error_is_retried_then_marked_failed(client):
+    entry_id = create_pending_entry("晴れ。")
+    queue = make_queue(CountingBackend(), max_attempts=2, retry_base_seconds=0.01)
+    attempts = []
+
+    async def broken(content, previous_segments=None):
+        attempts.append(content)
+        raise RuntimeError("cache unavailable")
+
+    queue.service.translate_incremental_async = broken
+
+    assert run_jobs(queue, [entry_id]) == [True]
+
+    assert attempts == ["晴れ。", "晴れ。"]
+    assert load_entry(entry_id).translation_status == TRANSLATION_FAILED
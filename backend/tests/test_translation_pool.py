@@ -0,0 +1,96 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.translation import TranslationCache, TranslationService
+
+
+class SlowBackend:
+    """Sleeps in the translator thread and records how many calls overlap."""
+
+    name = "slow"
+    metered = False
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.running = 0
+        self.peak = 0
+        self.threads = set()
+        self._lock = threading.Lock()
+
+    def translate(self, text: str, source: str, target: str) -> str:
+        with self._lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            self.threads.add(threading.current_thread().name)
+        time.sleep(self.seconds)
+        with self._lock:
+            self.running -= 1
+        return f"EN<{text}>"
+
+    def close(self) -> None:
+        pass
+
+
+def make_service(backend, **kwargs):
+    return TranslationService(cache=TranslationCache(session_factory=None), backends=[backend], **kwargs)
+
+
+def test_translations_run_on_the_pool_without_blocking_the_loop():
+    backend = SlowBackend(0.2)
+    service = make_service(backend, max_workers=4)
+
+    async def run():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        results = await asyncio.gather(*(service.translate_async(f"文{i}。", "ja", "en") for i in range(4)))
+        ticker.cancel()
+        return results, ticks
+
+    start = time.perf_counter()
+    results, ticks = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    service.shutdown()
+
+    assert results == [f"EN<文{i}。>" for i in range(4)]
+    assert all(name.startswith("translator") for name in backend.threads)
+    # Four 0.2s calls ran side by side while the loop kept ticking.
+    assert elapsed < 0.6
+    assert ticks > 5
+
+
+def test_concurrency_is_capped():
+    backend = SlowBackend(0.05)
+    service = make_service(backend, max_workers=8, max_concurrency=2)
+
+    async def run():
+        await asyncio.gather(*(service.translate_async(f"文{i}。", "ja", "en") for i in range(6)))
+
+    asyncio.run(run())
+    service.shutdown()
+    assert backend.peak == 2
+
+
+def test_slow_call_times_out():
+    service = make_service(SlowBackend(0.5), timeout=0.05)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(service.translate_async("遅い。", "ja", "en"))
+    service.shutdown()
+
+
+def test_async_fallback_text_on_failure():
+    service = make_service(SlowBackend(0.5), timeout=0.05)
+
+    text = asyncio.run(service.translate_japanese_to_english_async("遅い。"))
+    service.shutdown()
+    assert text.startswith("[Translation error")
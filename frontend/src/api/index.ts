@@ -10,13 +10,22 @@ const getAuthHeaders = () => {
 };
 
 export const fetchDiaryEntries = async (): Promise<DiaryEntry[]> => {
-  const response = await fetch(`${DIARY_API_URL}/diary`, {
-    headers: getAuthHeaders(),
-  });
-  if (!response.ok) {
-    throw new Error('Failed to fetch diary entries');
-  }
-  return response.json();
+  const entries: DiaryEntry[] = [];
+  let cursor: string | null = null;
+
+  do {
+    const query: string = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+    const response: Response = await fetch(`${DIARY_API_URL}/diary${query}`, {
+      headers: getAuthHeaders(),
+    });
+    if (!response.ok) {
+      throw new Error('Failed to fetch diary entries');
+    }
+    entries.push(...(await response.json()));
+    cursor = response.headers.get('X-Next-Cursor');
+  } while (cursor);
+
+  return entries;
 };
 
 export const fetchDiaryEntry = async (id: string): Promise<DiaryEntry> => {
@@ -85,11 +94,20 @@ export const addFavoriteExpression = async (
 };
 
 export const fetchFavoriteExpressions = async (): Promise<FavoriteExpression[]> => {
-  const response = await fetch(`${DIARY_API_URL}/favorites`, {
-    headers: getAuthHeaders(),
-  });
-  if (!response.ok) {
-    throw new Error('Failed to fetch favorite expressions');
-  }
-  return response.json();
+  const favorites: FavoriteExpression[] = [];
+  let cursor: string | null = null;
+
+  do {
+    const query: string = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+    const response: Response = await fetch(`${DIARY_API_URL}/favorites${query}`, {
+      headers: getAuthHeaders(),
+    });
+    if (!response.ok) {
+      throw new Error('Failed to fetch favorite expressions');
+    }
+    favorites.push(...(await response.json()));
+    cursor = response.headers.get('X-Next-Cursor');
+  } while (cursor);
+
+  return favorites;
 };
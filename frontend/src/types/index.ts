@@ -2,6 +2,7 @@ export interface DiaryEntry {
   id: string;
   content: string;
   translated_content: string;
+  translation_status?: 'pending' | 'completed' | 'failed';
   created_at: string;
   updated_at: string | null;
   favorite_expressions: FavoriteExpression[];